@@ -1,11 +1,16 @@
-import sys
-import os
+import itertools
 
-# Add parent dir to path to import backend modules if needed, 
-# but here we will replicate the exact logic from backend/main.py to test it isolated.
+import numpy as np
 
-def get_risk_drivers(temp, humidity, wind, veg):
-    """Identify top contributing factors to risk. (Replicated from backend/main.py)"""
+from scoring import normalize
+from drivers import top_drivers, driver_names
+
+# Audits the array-native driver engine (drivers.py) used by the API.
+# The original per-row implementation from backend/main.py is kept below as
+# the reference the engine must match row for row.
+
+def reference_risk_drivers(temp, humidity, wind, veg):
+    """Identify top contributing factors to risk. (Original per-row logic from backend/main.py)"""
     n_temp = min(max(temp / 50.0, 0), 1.0)
     n_hum = min(max(humidity / 100.0, 0), 1.0)
     n_wind = min(max(wind / 100.0, 0), 1.0)
@@ -35,6 +40,27 @@ def get_risk_drivers(temp, humidity, wind, veg):
     drivers = [f[0] for f in sorted_factors]
     return drivers[:3] if drivers else ["Normal Conditions"]
 
+def get_risk_drivers(temp, humidity, wind, veg):
+    """Engine result for a single row."""
+    return driver_names(top_drivers(normalize(np.array([[temp, humidity, wind, veg]]))))[0]
+
+def equivalence_rows(n_random=200_000, seed=0):
+    """Random in-range rows plus a grid hitting the 0.6 / 0.7 / 0.8 edges and contribution ties."""
+    rng = np.random.default_rng(seed)
+    random_rows = rng.uniform([0, 0, 0, 0], [50, 100, 100, 1], size=(n_random, 4))
+    grid = np.array(list(itertools.product(
+        np.arange(0, 50.5, 2.5), np.arange(0, 101, 5), np.arange(0, 101, 5), np.arange(0, 1.01, 0.05))))
+    return np.vstack([random_rows, grid])
+
+def check_equivalence(X):
+    """Number of rows where the engine differs from the reference."""
+    engine = driver_names(top_drivers(normalize(X)))
+    mismatches = 0
+    for row, drivers in zip(X.tolist(), engine):
+        if drivers != reference_risk_drivers(*row):
+            mismatches += 1
+    return mismatches
+
 def main():
     print("--- Auditing Risk Driver Analysis (Refined) ---")
     
@@ -110,6 +136,10 @@ def main():
             print("  ✅ PASS")
             
     print(f"\nSummary: {passed}/{len(scenarios)} Scenarios Validated")
+
+    X = equivalence_rows()
+    mismatches = check_equivalence(X)
+    print(f"\nEngine vs reference: {mismatches} mismatches over {len(X):,} rows")
     
 if __name__ == "__main__":
     main()
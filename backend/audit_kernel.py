@@ -0,0 +1,97 @@
+import itertools
+import time
+
+import numpy as np
+
+import risk_kernel as kernel
+
+# Audits the two backends of the risk kernel (risk_kernel.py) against each
+# other and the two API paths built on them: the scalar /predict path
+# (main.score_features) and the vectorized batch path (scoring.score_batch).
+# Backends must agree bit for bit; API responses must be identical.
+#
+# Usage: python audit_kernel.py
+
+EDGE_OFFSETS = (-1e-9, 0.0, 1e-9)
+
+
+def equivalence_rows(n_random=200_000, seed=0):
+    """Random in-range rows, out-of-range rows and a grid around the interaction / clamp edges."""
+    rng = np.random.default_rng(seed)
+    high = np.array(kernel.FEATURE_SCALE_ROW)
+    in_range = rng.uniform(0.0, high, size=(n_random, 4))
+    out_of_range = rng.uniform(-high, 2 * high, size=(n_random // 4, 4))
+    # temp 40 -> nT 0.8, wind 70 -> nW 0.7, plus the 0 / high clamp points, each nudged either side
+    temp = [t + d for t in (0.0, 40.0, 50.0) for d in EDGE_OFFSETS]
+    wind = [w + d for w in (0.0, 70.0, 100.0) for d in EDGE_OFFSETS]
+    grid = np.array(list(itertools.product(temp, (0.0, 20.0, 100.0), wind, (0.0, 0.1, 1.0))))
+    return np.vstack([in_range, out_of_range, grid])
+
+
+def backend_mismatches(X):
+    """{check: rows where the array backend differs bitwise from the scalar backend}."""
+    n = kernel.normalize(X)
+    baseline = kernel.baseline_scores(n)
+    fallback = kernel.fallback_scores(n, baseline)
+    mask = kernel.interaction_mask(n)
+    counts = {"normalize": 0, "baseline": 0, "interaction": 0, "fallback": 0}
+    for row, n_arr, base, fall, hit in zip(X.tolist(), n.tolist(), baseline.tolist(),
+                                           fallback.tolist(), mask.tolist()):
+        n_row = kernel.normalize_row(*row)
+        counts["normalize"] += n_row != tuple(n_arr)
+        counts["baseline"] += kernel.baseline_row(n_row) != base
+        counts["interaction"] += kernel.interaction_row(n_row) != hit
+        counts["fallback"] += kernel.fallback_row(n_row) != fall
+    return counts
+
+
+def api_mismatches(X, model):
+    """Rows where /predict (score_features) and /predict/batch (score_batch) responses differ."""
+    import main
+    from scoring import score_batch, to_predictions
+
+    batch = to_predictions(score_batch(np.clip(X, 0.0, kernel.FEATURE_SCALE), model))
+    current = main.model
+    main.model = model
+    try:
+        mismatches = 0
+        for row, expected in zip(X.tolist(), batch):
+            features = main.WildfireFeatures(temp=row[0], humidity=row[1], wind=row[2], veg_moisture=row[3])
+            mismatches += main.score_features(features) != expected
+        return mismatches
+    finally:
+        main.model = current
+
+
+def check_equivalence(X, models=(None,)):
+    """All mismatch counts: backend checks, then one "api:<model>" entry per model (None = mock)."""
+    counts = backend_mismatches(X)
+    for model in models:
+        counts[f"api:{type(model).__name__ if model else 'mock'}"] = api_mismatches(X, model)
+    return counts
+
+
+def main():
+    import main as api
+    model, _ = api.load_model()
+
+    X = equivalence_rows()
+    print(f"--- Auditing risk kernel over {len(X):,} rows ---")
+    models = (None, model) if model else (None,)
+    counts = check_equivalence(X, models)
+    for name, count in counts.items():
+        print(f"  {name:<22} {count} mismatches")
+
+    start = time.perf_counter()
+    scalar = [kernel.fallback_row(kernel.normalize_row(*row)) for row in X.tolist()]
+    scalar_s = time.perf_counter() - start
+    start = time.perf_counter()
+    array = kernel.fallback_scores(kernel.normalize(X))
+    array_s = time.perf_counter() - start
+    assert scalar == array.tolist()
+    print(f"\nFallback scoring: scalar {len(X) / scalar_s:,.0f} rows/s, array {len(X) / array_s:,.0f} rows/s")
+    print("✅ PASS" if not any(counts.values()) else "❌ FAIL: backends or API paths disagree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+# Performance benchmark suite.
+#
+# Measures the hot paths that correctness scripts don't: single /predict
+# latency through an in-process ASGI client, batch scoring throughput,
+# forest predict cost per engine (sklearn / flat / surrogate), model load time
+# and artifact size, and end-to-end training time.
+#
+# Results are written as JSON and compared against a stored baseline; any
+# metric that got worse by more than --threshold (relative) is reported as a
+# regression and the script exits non-zero.
+#
+# Usage:
+#   python benchmark.py                         # run all, compare to baseline
+#   python benchmark.py --only forest,batch     # subset
+#   python benchmark.py --save-baseline         # record a new baseline
+#   python benchmark.py --threshold 0.25 --quick
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BACKEND_DIR, "model.pkl")
+RESULTS_PATH = os.path.join(BACKEND_DIR, "benchmark_results.json")
+BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmark_baseline.json")
+
+DEFAULT_THRESHOLD = 0.20
+BATCH_SIZES = (1, 100, 10_000, 100_000)
+SUITES = ("api", "batch", "forest", "load", "train")
+
+
+def metric(value, unit, better="lower"):
+    return {"value": float(value), "unit": unit, "better": better}
+
+
+def time_calls(fn, repeat, warmup=1):
+    """Per-call wall times in seconds (after warmup calls)."""
+    for _ in range(warmup):
+        fn()
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def latency_metrics(prefix, times):
+    ms = times * 1000
+    return {
+        f"{prefix}.p50_ms": metric(np.percentile(ms, 50), "ms"),
+        f"{prefix}.p95_ms": metric(np.percentile(ms, 95), "ms"),
+    }
+
+
+def random_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform([0, 0, 0, 0], [50, 100, 100, 1], size=(n, 4))
+
+
+def feature_dicts(X):
+    return [{"temp": t, "humidity": h, "wind": w, "veg_moisture": v} for t, h, w, v in X.tolist()]
+
+
+# --- Suites ----------------------------------------------------------------
+
+def bench_api(quick):
+    """Single-row /predict and /predict/batch through httpx's ASGI transport."""
+    import httpx
+    import main
+
+    # The lifespan startup phase (model load + warm-up), run synchronously
+    main.startup()
+
+    n_requests = 200 if quick else 1000
+    rows = feature_dicts(random_features(n_requests, seed=1))
+    batch = feature_dicts(random_features(1000, seed=2))
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def timed(path, payload):
+                start = time.perf_counter()
+                resp = await client.post(path, json=payload)
+                resp.raise_for_status()
+                return time.perf_counter() - start
+
+            await timed("/predict", rows[0])
+            # Distinct rows miss the prediction cache; a repeated row hits it
+            cold = np.array([await timed("/predict", row) for row in rows])
+            main.prediction_cache.invalidate(main.model_version)
+            cached = np.array([await timed("/predict", rows[0]) for _ in rows])
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client.post("/predict", json=row) for row in rows))
+            concurrent = time.perf_counter() - start
+
+            batch_times = np.array([await timed("/predict/batch", batch) for _ in range(5 if quick else 20)])
+            return cold, cached, concurrent, batch_times
+
+    cold, cached, concurrent, batch_times = asyncio.run(run())
+    results = {}
+    results.update(latency_metrics("api.predict", cold))
+    results.update(latency_metrics("api.predict_cached", cached))
+    results["api.predict_concurrent.rps"] = metric(n_requests / concurrent, "req/s", "higher")
+    results.update(latency_metrics("api.predict_batch_1000", batch_times))
+    return results
+
+
+def bench_batch(quick, model):
+    """score_batch throughput (model + baseline + levels + drivers) per batch size."""
+    from scoring import score_batch
+
+    results = {}
+    for size in BATCH_SIZES:
+        if quick and size > 10_000:
+            continue
+        X = random_features(size, seed=size)
+        repeat = max(3, min(200, 200_000 // size))
+        times = time_calls(lambda: score_batch(X, model), repeat)
+        results[f"batch.score_batch_{size}.rows_per_s"] = metric(size / np.median(times), "rows/s", "higher")
+    return results
+
+
+def bench_forest(quick, sk_model, flat):
+    """Raw predict cost per engine for one row and a large batch."""
+    from surrogate import GRID_PATH, GridSurrogate
+
+    engines = {"sklearn": sk_model, "flat": flat}
+    if os.path.exists(GRID_PATH):
+        engines["surrogate"] = GridSurrogate.load(GRID_PATH)
+
+    results = {}
+    big = 10_000 if quick else 100_000
+    # model.pkl was fitted on a DataFrame; plain arrays trigger a per-call warning
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    for name, engine in engines.items():
+        if engine is None:
+            continue
+        one = random_features(1, seed=3)
+        times = time_calls(lambda: engine.predict(one), 20 if quick else 100)
+        results[f"forest.{name}.single_us"] = metric(np.median(times) * 1e6, "us")
+
+        X = random_features(big, seed=4)
+        times = time_calls(lambda: engine.predict(X), 3)
+        results[f"forest.{name}.rows_per_s"] = metric(big / np.median(times), "rows/s", "higher")
+    return results
+
+
+def bench_load():
+    """Artifact sizes and cold load times for each model format."""
+    import joblib
+    from forest_engine import FlatForest, load_forest
+
+    results = {}
+    if not os.path.exists(MODEL_PATH):
+        return results
+    results["load.model_pkl.size_mb"] = metric(os.path.getsize(MODEL_PATH) / 2**20, "MB")
+    results["load.joblib.ms"] = metric(np.median(time_calls(lambda: joblib.load(MODEL_PATH), 3, 0)) * 1000, "ms")
+    results["load.flat_from_pkl.ms"] = metric(
+        np.median(time_calls(lambda: load_forest(MODEL_PATH), 3, 0)) * 1000, "ms")
+
+    export_dir = tempfile.mkdtemp(prefix="geofirenet-bench-")
+    try:
+        load_forest(MODEL_PATH).save(export_dir)
+        size = sum(os.path.getsize(os.path.join(export_dir, f)) for f in os.listdir(export_dir))
+        results["load.flat_export.size_mb"] = metric(size / 2**20, "MB")
+        results["load.flat_mmap.ms"] = metric(
+            np.median(time_calls(lambda: FlatForest.load(export_dir, mmap_mode="r"), 5)) * 1000, "ms")
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+
+    from surrogate import GRID_PATH, GridSurrogate
+    if os.path.exists(GRID_PATH):
+        results["load.surrogate.size_mb"] = metric(os.path.getsize(GRID_PATH) / 2**20, "MB")
+        results["load.surrogate.ms"] = metric(
+            np.median(time_calls(lambda: GridSurrogate.load(GRID_PATH), 3)) * 1000, "ms")
+    return results
+
+
+def bench_train():
+    """End-to-end train_model.py run writing to a scratch dir (never touches model.pkl)."""
+    scratch = tempfile.mkdtemp(prefix="geofirenet-train-")
+    try:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "train_model.py"),
+                        "--output", os.path.join(scratch, "model.pkl")],
+                       check=True, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {"train.end_to_end.s": metric(elapsed, "s")}
+
+
+# --- Baseline comparison ---------------------------------------------------
+
+def compare(results, baseline, threshold):
+    """
+    Relative change of each metric against the baseline.
+
+    Returns (rows, regressions); a regression is a change in the "worse"
+    direction larger than `threshold` (0.2 = 20%).
+    """
+    rows, regressions = [], []
+    for name, cur in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or base["value"] == 0:
+            rows.append((name, cur, None, None))
+            continue
+        change = (cur["value"] - base["value"]) / base["value"]
+        worse = change if cur["better"] == "lower" else -change
+        rows.append((name, cur, base, change))
+        if worse > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def environment():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run(suites, quick=False):
+    results = {}
+    sk_model = flat = None
+    if os.path.exists(MODEL_PATH) and {"batch", "forest"} & set(suites):
+        import joblib
+        from forest_engine import FlatForest
+        sk_model = joblib.load(MODEL_PATH)
+        flat = FlatForest.from_sklearn(sk_model)
+
+    for suite in suites:
+        print(f"Running {suite} benchmarks...", file=sys.stderr)
+        if suite == "api":
+            results.update(bench_api(quick))
+        elif suite == "batch":
+            results.update(bench_batch(quick, flat))
+        elif suite == "forest":
+            results.update(bench_forest(quick, sk_model, flat))
+        elif suite == "load":
+            results.update(bench_load())
+        elif suite == "train":
+            results.update(bench_train())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GeoFireNet performance benchmarks")
+    parser.add_argument("--only", help=f"Comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, smaller batches")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown that counts as a regression (default 0.20)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    args = parser.parse_args()
+
+    suites = args.only.split(",") if args.only else list(SUITES)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {sorted(unknown)}")
+
+    results = run(suites, quick=args.quick)
+    report = {"environment": environment(), "quick": args.quick, "metrics": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["metrics"]
+
+    rows, regressions = compare(results, baseline, args.threshold)
+    print(f"\n{'Metric':<45} {'Current':>17} {'Baseline':>14} {'Change':>9}")
+    print("-" * 88)
+    for name, cur, base, change in rows:
+        base_str = f"{base['value']:.4g}" if base else "-"
+        change_str = f"{change:+.1%}" if change is not None else "new"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<45} {cur['value']:>10.4g} {cur['unit']:<6} {base_str:>14} {change_str:>9}{flag}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scoring import FEATURE_NAMES, FEATURE_SCALE, RISK_LEVELS, score_batch
+from drivers import DRIVER_LIST_TABLE, pack_codes
+
+# Streaming bulk scorer for large CSV / NDJSON feature archives.
+#
+# Input is read in fixed-size chunks and each chunk runs through the same
+# vectorized pipeline as /predict/batch (clamping, model, baseline, risk
+# levels, drivers). Chunks are optionally fanned out to worker processes with
+# a bounded in-flight window, and results are written in input order, so
+# memory stays constant however large the input is.
+#
+# Usage:
+#   python bulk_score.py stations.csv scored.csv --chunk-size 200000 --workers 4
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(__file__), "model.pkl")
+# Flat exports of model.pkl, shared with the API server (main.FLAT_CACHE_DIR)
+FLAT_CACHE_DIR = os.environ.get(
+    "GEOFIRENET_FLAT_CACHE_DIR", os.path.join(os.path.dirname(__file__), "model_cache"))
+# Chunks are far above the flat / sklearn crossover (forest_engine.HybridForest)
+SKLEARN_MIN_ROWS = int(os.environ.get("GEOFIRENET_SKLEARN_MIN_ROWS", "1024"))
+
+# Input column aliases (train_model.py names veg_moisture "veg")
+COLUMN_ALIASES = {"veg": "veg_moisture"}
+
+# Packed driver code -> "A|B|C" label string
+_DRIVER_STRINGS = np.array(["|".join(labels) for labels in DRIVER_LIST_TABLE], dtype=object)
+
+_model = None
+
+
+def load_scoring_model(path, sklearn_min_rows=SKLEARN_MIN_ROWS):
+    """
+    Forest from model.pkl (HybridForest, like the server) or an export dir
+    (FlatForest), GridSurrogate from .npz, None -> mock.
+    """
+    if not path or not os.path.exists(path):
+        print(f"Warning: {path} not found. Using mock logic.", file=sys.stderr)
+        return None
+    if path.endswith(".npz"):
+        from surrogate import GridSurrogate
+        return GridSurrogate.load(path)
+    from forest_engine import load_forest, load_serving_forest
+    if os.path.isdir(path):
+        return load_forest(path)
+    forest, _ = load_serving_forest(path, FLAT_CACHE_DIR, sklearn_min_rows)
+    # Every chunk is large: wait for the sklearn half instead of scoring the first ones flat
+    getattr(forest, "wait", lambda: None)()
+    return forest
+
+
+def _init_worker(model_path):
+    global _model
+    _model = load_scoring_model(model_path)
+
+
+def detect_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+def read_chunks(path, fmt, chunk_size):
+    if fmt == "ndjson":
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    for chunk in reader:
+        yield chunk.rename(columns=COLUMN_ALIASES)
+
+
+def score_chunk(chunk, model=None):
+    """
+    Score one input chunk; returns the chunk with result columns appended.
+
+    Rows with a blank, non-numeric, NaN or infinite feature are left
+    unscored (empty result columns) and the rest of the chunk is scored by
+    the model as usual; the API rejects such rows with a 422 instead.
+    """
+    model = model if model is not None else _model
+    missing = [name for name in FEATURE_NAMES if name not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing columns: {missing}")
+
+    X = chunk[list(FEATURE_NAMES)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    valid = np.isfinite(X).all(axis=1)
+    X = np.clip(X[valid], 0.0, FEATURE_SCALE)  # same clamping as the API validators
+    scores = score_batch(X, model)
+
+    packed = pack_codes(scores["drivers"])
+    levels = np.array(RISK_LEVELS, dtype=object)
+
+    def expand(values, fill):
+        column = np.full(len(chunk), fill, dtype=values.dtype)
+        column[valid] = values
+        return column
+
+    out = chunk.copy()
+    # "%.2f" is correctly rounded, i.e. the same value round(x, 2) gives
+    out["risk_score"] = expand(np.char.mod("%.2f", scores["risk_score"]).astype(np.float64), np.nan)
+    out["risk_level"] = expand(levels[scores["risk_level"]], None)
+    out["baseline_score"] = expand(np.char.mod("%.2f", scores["baseline_score"]).astype(np.float64), np.nan)
+    out["baseline_level"] = expand(levels[scores["baseline_level"]], None)
+    out["primary_drivers"] = expand(_DRIVER_STRINGS[packed], None)
+    return out
+
+
+def write_chunk(out, f, fmt, header):
+    if fmt == "ndjson":
+        out = out.assign(primary_drivers=out["primary_drivers"].str.split("|"))
+        out.to_json(f, orient="records", lines=True, double_precision=15)
+    else:
+        out.to_csv(f, index=False, header=header)
+
+
+def run(input_path, output_path, chunk_size=100_000, workers=1, model_path=DEFAULT_MODEL,
+        in_fmt=None, out_fmt=None, report_every=10.0):
+    in_fmt = detect_format(input_path, in_fmt)
+    out_fmt = detect_format(output_path, out_fmt)
+    chunks = read_chunks(input_path, in_fmt, chunk_size)
+
+    rows = unscored = 0
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        label = "Done" if final else "Progress"
+        skipped = f", {unscored:,} unscored (missing or non-finite features)" if unscored else ""
+        print(f"{label}: {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s){skipped}",
+              file=sys.stderr)
+
+    with open(output_path, "w", newline="") as f:
+        if workers <= 1:
+            model = load_scoring_model(model_path)
+            results = (score_chunk(chunk, model) for chunk in chunks)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path,))
+            results = _ordered_parallel(pool, chunks, max_in_flight=2 * workers)
+
+        try:
+            for out in results:
+                write_chunk(out, f, out_fmt, header=(rows == 0))
+                rows += len(out)
+                unscored += int(out["risk_level"].isna().sum())
+                if time.perf_counter() - last_report >= report_every:
+                    report()
+                    last_report = time.perf_counter()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    report(final=True)
+    return rows
+
+
+def _ordered_parallel(pool, chunks, max_in_flight):
+    """Map score_chunk over chunks in worker processes, yielding in input order."""
+    in_flight = deque()
+    for chunk in chunks:
+        in_flight.append(pool.submit(score_chunk, chunk))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream-score a large CSV/NDJSON feature file")
+    parser.add_argument("input", help="CSV or NDJSON with temp, humidity, wind, veg_moisture columns")
+    parser.add_argument("output", help="Output CSV or NDJSON (format from extension)")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (1 = in-process)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="model.pkl, flat export dir or model_grid.npz")
+    parser.add_argument("--input-format", choices=["csv", "ndjson"])
+    parser.add_argument("--output-format", choices=["csv", "ndjson"])
+    args = parser.parse_args()
+
+    run(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers,
+        model_path=args.model, in_fmt=args.input_format, out_fmt=args.output_format)
+
+
+if __name__ == "__main__":
+    main()
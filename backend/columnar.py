@@ -0,0 +1,200 @@
+import io
+import struct
+
+import numpy as np
+
+from metrics import record_clamp
+from scoring import FEATURE_NAMES, FEATURE_SCALE, RISK_LEVELS, DRIVER_LABELS, MAX_DRIVERS
+
+# Columnar binary payloads for bulk scoring.
+#
+# /predict/batch accepts these bodies (by Content-Type) in addition to JSON,
+# and returns one of them when the Accept header asks for it. Features are
+# parsed straight into a (N, 4) float64 matrix: no per-row objects, and
+# clamping to the input contract is one array operation reporting per-column
+# clamp counts (X-Clamp-Counts header, and "clamp_counts" in .npz responses).
+#
+# Request bodies
+#   application/x-npy   one .npy array: (N, 4) in FEATURE_NAMES order, or a
+#                       structured array with fields named after the features
+#   application/x-npz   .npz with one 1-D array per feature name
+#   COLUMNS_MEDIA_TYPE  16-byte header then 4 column blocks of N values:
+#       magic    4s  b"GFC1"
+#       version  B   1
+#       dtype    B   0 = float32, 1 = float64 (little-endian)
+#       columns  H   4 (FEATURE_NAMES order)
+#       rows     Q   N
+#
+# Response bodies
+#   application/x-npz   risk_score, baseline_score (float64), risk_level,
+#                       baseline_level (uint8, index into levels), drivers
+#                       (N x 3 int8, index into driver_labels, -1 = none),
+#                       levels, driver_labels, clamp_counts (per feature)
+#   COLUMNS_MEDIA_TYPE  the same header (dtype 0, columns 7, rows N) followed
+#                       by risk_score f4[N], baseline_score f4[N],
+#                       risk_level u1[N], baseline_level u1[N], drivers i1[N, 3]
+
+MAGIC = b"GFC1"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQ")
+DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f8")}
+RESPONSE_COLUMNS = 7
+
+NPY_MEDIA_TYPE = "application/x-npy"
+NPZ_MEDIA_TYPE = "application/x-npz"
+COLUMNS_MEDIA_TYPE = "application/vnd.geofirenet.columns"
+BINARY_MEDIA_TYPES = (NPY_MEDIA_TYPE, NPZ_MEDIA_TYPE, COLUMNS_MEDIA_TYPE)
+# Response formats (a single .npy cannot carry the mixed-type result)
+RESPONSE_MEDIA_TYPES = (NPZ_MEDIA_TYPE, COLUMNS_MEDIA_TYPE)
+
+
+def media_type(header):
+    """Bare media type of a Content-Type header value."""
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def negotiate(accept):
+    """Binary response media type the Accept header asks for, or None for JSON."""
+    for part in (accept or "").split(","):
+        kind = media_type(part)
+        if kind in RESPONSE_MEDIA_TYPES:
+            return kind
+        if kind in ("application/json", "*/*"):
+            return None
+    return None
+
+
+# --- Requests ------------------------------------------------------------------
+
+def _from_npy(body):
+    arr = np.load(io.BytesIO(body), allow_pickle=False)
+    if arr.dtype.names:
+        missing = [n for n in FEATURE_NAMES if n not in arr.dtype.names]
+        if missing:
+            raise ValueError(f"Missing columns: {missing}")
+        return np.column_stack([arr[n].astype(np.float64).ravel() for n in FEATURE_NAMES])
+    if arr.ndim != 2 or arr.shape[1] != len(FEATURE_NAMES):
+        raise ValueError(f"Expected an (N, {len(FEATURE_NAMES)}) array, got {arr.shape}")
+    return arr.astype(np.float64)
+
+
+def _from_npz(body):
+    with np.load(io.BytesIO(body), allow_pickle=False) as data:
+        missing = [n for n in FEATURE_NAMES if n not in data.files]
+        if missing:
+            raise ValueError(f"Missing columns: {missing}")
+        cols = [np.asarray(data[n]).ravel() for n in FEATURE_NAMES]
+    if len({len(c) for c in cols}) != 1:
+        raise ValueError("Columns differ in length")
+    X = np.empty((len(cols[0]), len(FEATURE_NAMES)), dtype=np.float64)
+    for i, col in enumerate(cols):
+        X[:, i] = col
+    return X
+
+
+def _from_columns(body):
+    if len(body) < HEADER.size:
+        raise ValueError("Truncated header")
+    magic, version, dtype_code, n_cols, n_rows = HEADER.unpack_from(body)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a GeoFireNet column payload")
+    if dtype_code not in DTYPES or n_cols != len(FEATURE_NAMES):
+        raise ValueError(f"Unsupported dtype {dtype_code} / column count {n_cols}")
+    dtype = DTYPES[dtype_code]
+    if len(body) != HEADER.size + n_cols * n_rows * dtype.itemsize:
+        raise ValueError(f"Body size does not match {n_rows} rows of {dtype.name}")
+    cols = np.frombuffer(body, dtype=dtype, offset=HEADER.size).reshape(n_cols, n_rows)
+    # Column blocks -> row matrix in one strided copy
+    return cols.T.astype(np.float64)
+
+
+PARSERS = {NPY_MEDIA_TYPE: _from_npy, NPZ_MEDIA_TYPE: _from_npz, COLUMNS_MEDIA_TYPE: _from_columns}
+
+
+def parse_features(body, content_type):
+    """(N, 4) float64 feature matrix from a binary body; raises ValueError if malformed."""
+    kind = media_type(content_type)
+    try:
+        X = PARSERS[kind](body)
+    except ValueError:
+        raise
+    except Exception as e:
+        # Truncated / corrupt .npy and .npz bodies surface as EOFError, zipfile.BadZipFile,
+        # zlib.error, tokenize errors from the .npy header parser, ...: all client errors
+        raise ValueError(f"Malformed {kind} body ({type(e).__name__}: {e})") from e
+    if not np.isfinite(X).all():
+        raise ValueError("Features must be finite")
+    return X
+
+
+def clamp_features(X):
+    """
+    Clamp to the input contract in place, like the WildfireFeatures validators.
+    Returns {feature: number of clamped values}.
+    """
+    low = X < 0.0
+    high = X > FEATURE_SCALE
+    counts = (low | high).sum(axis=0)
+    np.clip(X, 0.0, FEATURE_SCALE, out=X)
+    result = {}
+    for i, (name, count) in enumerate(zip(FEATURE_NAMES, counts.tolist())):
+        result[name] = count
+        if count:
+            record_clamp(name, f"{count} values", 0, FEATURE_SCALE[i].item(), count=count)
+    return result
+
+
+def clamp_header(counts):
+    return ",".join(f"{name}={count}" for name, count in counts.items())
+
+
+# --- Responses -------------------------------------------------------------------
+
+def encode_columns(X, dtype_code=0):
+    """Feature matrix -> COLUMNS_MEDIA_TYPE request body (client helper)."""
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+    header = HEADER.pack(MAGIC, VERSION, dtype_code, len(FEATURE_NAMES), len(X))
+    return header + np.ascontiguousarray(X.T, dtype=DTYPES[dtype_code]).tobytes()
+
+
+def encode_scores(scores, clamp_counts, kind):
+    """score_batch output -> binary response body of media type `kind`."""
+    if kind == NPZ_MEDIA_TYPE:
+        out = io.BytesIO()
+        np.savez(out,
+                 risk_score=scores["risk_score"],
+                 baseline_score=scores["baseline_score"],
+                 risk_level=scores["risk_level"].astype(np.uint8),
+                 baseline_level=scores["baseline_level"].astype(np.uint8),
+                 drivers=scores["drivers"],
+                 levels=np.array(RISK_LEVELS),
+                 driver_labels=np.array(DRIVER_LABELS),
+                 clamp_counts=np.array([clamp_counts[n] for n in FEATURE_NAMES], dtype=np.int64))
+        return out.getvalue()
+    n = len(scores["risk_score"])
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, 0, RESPONSE_COLUMNS, n),
+        scores["risk_score"].astype("<f4").tobytes(),
+        scores["baseline_score"].astype("<f4").tobytes(),
+        scores["risk_level"].astype(np.uint8).tobytes(),
+        scores["baseline_level"].astype(np.uint8).tobytes(),
+        np.ascontiguousarray(scores["drivers"], dtype=np.int8).tobytes(),
+    ])
+
+
+def decode_scores(body):
+    """Inverse of encode_scores for COLUMNS_MEDIA_TYPE responses (client helper)."""
+    magic, version, _, n_cols, n = HEADER.unpack_from(body)
+    if magic != MAGIC or version != VERSION or n_cols != RESPONSE_COLUMNS:
+        raise ValueError("Not a GeoFireNet score payload")
+    offset = HEADER.size
+    out = {}
+    for name, dtype, width in (("risk_score", "<f4", 1), ("baseline_score", "<f4", 1),
+                               ("risk_level", "u1", 1), ("baseline_level", "u1", 1),
+                               ("drivers", "i1", MAX_DRIVERS)):
+        count = n * width
+        out[name] = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+        if width > 1:
+            out[name] = out[name].reshape(n, width)
+        offset += count * np.dtype(dtype).itemsize
+    return out
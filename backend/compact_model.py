@@ -0,0 +1,264 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from forest_engine import FlatForest, file_sha256, load_forest
+from model_artifact import DEFAULT_ARTIFACT, write_artifact
+from train_model import assemble, file_chunks, synthetic_chunks
+
+# Model compaction: shrink model.pkl within an accuracy budget.
+#
+# The full-depth forest is converted to flat arrays and candidate forests are
+# derived from it by
+#   - capping depth (nodes at the cap become leaves holding their node mean),
+#   - keeping only the first k trees,
+#   - merging sibling leaves whose values differ by at most a tolerance,
+#   - storing thresholds / leaf values as float32 and features as int8.
+# Every candidate is scored on a holdout set (MAE vs the original model's
+# predictions, and vs the labels), timed and saved; the smallest candidate
+# whose MAE vs the original stays within --budget is written out as a drop-in
+# model.pkl replacement (a pickled FlatForest plus its manifest).
+#
+# Usage:
+#   python compact_model.py --budget 0.5
+#   python compact_model.py --budget 1.0 --holdout archive.csv --output model.pkl
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_compact.pkl")
+
+DEPTHS = (None, 16, 14, 12, 10, 8)
+TREE_COUNTS = (100, 50, 25, 10)
+MERGE_TOLERANCES = (0.0, 0.25)
+
+
+# --- Forest transforms -------------------------------------------------------
+
+def _is_leaf(forest):
+    return ~np.isfinite(forest.threshold)
+
+
+def node_depths(forest):
+    """Depth of every node reachable from the roots; -1 for unreachable nodes."""
+    depth = np.full(forest.n_nodes, -1, dtype=np.int32)
+    leaf = _is_leaf(forest)
+    frontier = forest.roots.astype(np.intp)
+    d = 0
+    while frontier.size:
+        depth[frontier] = d
+        internal = frontier[~leaf[frontier]]
+        frontier = np.concatenate([forest.children[2 * internal], forest.children[2 * internal + 1]])
+        d += 1
+    return depth
+
+
+def _with_leaves(forest, mask):
+    """Copy of the forest with the nodes in `mask` turned into leaves."""
+    idx = np.flatnonzero(mask)
+    feature, threshold, children = forest.feature.copy(), forest.threshold.copy(), forest.children.copy()
+    feature[idx] = 0
+    threshold[idx] = np.inf
+    children[2 * idx] = idx
+    children[2 * idx + 1] = idx
+    return FlatForest(feature, threshold, children, forest.value.copy(), forest.roots.copy(),
+                      forest.max_depth, forest.n_features)
+
+
+def prune_unreachable(forest):
+    """Drop nodes no root can reach and renumber the rest."""
+    depth = node_depths(forest)
+    keep = depth >= 0
+    new_index = np.cumsum(keep, dtype=np.int64) - 1
+    children = forest.children.reshape(-1, 2)[keep]
+    return FlatForest(
+        feature=forest.feature[keep],
+        threshold=forest.threshold[keep],
+        children=new_index[children].astype(np.int32).ravel(),
+        value=forest.value[keep],
+        roots=new_index[forest.roots].astype(np.int32),
+        max_depth=int(depth.max()) if keep.any() else 0,
+        n_features=forest.n_features,
+    )
+
+
+def truncate_depth(forest, max_depth):
+    """Make every internal node at `max_depth` a leaf."""
+    depth = node_depths(forest)
+    return prune_unreachable(_with_leaves(forest, (depth == max_depth) & ~_is_leaf(forest)))
+
+
+def keep_trees(forest, n_trees):
+    """First n_trees trees (forest trees are exchangeable)."""
+    kept = FlatForest(forest.feature, forest.threshold, forest.children, forest.value,
+                      forest.roots[:n_trees], forest.max_depth, forest.n_features)
+    return prune_unreachable(kept)
+
+
+def merge_leaves(forest, tolerance):
+    """Collapse internal nodes whose two children are leaves within `tolerance` of each other."""
+    if tolerance <= 0:
+        return forest
+    while True:
+        leaf = _is_leaf(forest)
+        left, right = forest.children[0::2], forest.children[1::2]
+        mergeable = (~leaf & leaf[left] & leaf[right]
+                     & (np.abs(forest.value[left] - forest.value[right]) <= tolerance))
+        if not mergeable.any():
+            return prune_unreachable(forest)
+        forest = _with_leaves(forest, mergeable)
+
+
+def to_float32(forest):
+    """
+    float32 thresholds / values and int8 features.
+
+    Thresholds are rounded down to the nearest float32, which keeps every
+    split decision on float32 inputs exactly as before (x <= t64 iff
+    x <= floor32(t64)); only the leaf values lose precision.
+    """
+    t32 = forest.threshold.astype(np.float32)
+    rounded_up = t32.astype(np.float64) > forest.threshold
+    t32[rounded_up] = np.nextafter(t32[rounded_up], np.float32(-np.inf))
+    feature = forest.feature.astype(np.int8) if forest.n_features <= 127 else forest.feature
+    return FlatForest(feature, t32, forest.children, forest.value.astype(np.float32),
+                      forest.roots, forest.max_depth, forest.n_features)
+
+
+def compact(forest, max_depth=None, n_trees=None, merge_tolerance=0.0, float32=False):
+    if n_trees is not None and n_trees < forest.n_trees:
+        forest = keep_trees(forest, n_trees)
+    if max_depth is not None and max_depth < forest.max_depth:
+        forest = truncate_depth(forest, max_depth)
+    forest = merge_leaves(forest, merge_tolerance)
+    return to_float32(forest) if float32 else forest
+
+
+# --- Evaluation ----------------------------------------------------------------
+
+def measure(forest, X, y, reference, scratch):
+    """Artifact size, load time, latency and holdout error for one forest."""
+    import joblib
+
+    path = os.path.join(scratch, "candidate.pkl")
+    joblib.dump(forest, path)
+    size = os.path.getsize(path)
+    load_times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        joblib.load(path)
+        load_times.append(time.perf_counter() - start)
+
+    one = X[:1]
+    forest.predict(one)
+    single = []
+    for _ in range(50):
+        start = time.perf_counter()
+        forest.predict(one)
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pred = forest.predict(X)
+    batch_s = time.perf_counter() - start
+    return {
+        "size_mb": size / 2**20,
+        "load_ms": float(np.median(load_times)) * 1000,
+        "single_us": float(np.median(single)) * 1e6,
+        "rows_per_s": len(X) / batch_s,
+        "n_trees": forest.n_trees,
+        "n_nodes": forest.n_nodes,
+        "max_depth": forest.max_depth,
+        "mae_vs_original": float(np.mean(np.abs(pred - reference))),
+        "max_err_vs_original": float(np.max(np.abs(pred - reference))),
+        "mae_vs_labels": float(np.mean(np.abs(pred - y))) if y is not None else None,
+    }
+
+
+def candidate_grid(depths=DEPTHS, tree_counts=TREE_COUNTS, tolerances=MERGE_TOLERANCES):
+    for depth, trees, tol, f32 in itertools.product(depths, tree_counts, tolerances, (False, True)):
+        yield {"max_depth": depth, "n_trees": trees, "merge_tolerance": tol, "float32": f32}
+
+
+def choose(results, budget):
+    """Smallest candidate within the MAE budget (ties: faster single-row predict)."""
+    within = [r for r in results if r["mae_vs_original"] <= budget]
+    if not within:
+        return None
+    return min(within, key=lambda r: (r["size_mb"], r["single_us"]))
+
+
+def load_holdout(path, target, n_samples, seed):
+    if path:
+        X, y = assemble(file_chunks(path, target))
+    else:
+        # Seed distinct from training so the holdout is unseen data
+        X, y = assemble(synthetic_chunks(n_samples, seed), n_samples)
+    return X.astype(np.float64), y
+
+
+def _fmt(value):
+    return "full" if value is None else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shrink model.pkl within an accuracy budget")
+    parser.add_argument("--model", default=DEFAULT_ARTIFACT)
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="Max MAE vs the original model on the holdout (risk points)")
+    parser.add_argument("--holdout", help="CSV / .npz holdout (default: synthetic)")
+    parser.add_argument("--target", default="risk")
+    parser.add_argument("--holdout-samples", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the chosen model")
+    parser.add_argument("--report", help="Also write every candidate's metrics as JSON")
+    args = parser.parse_args()
+
+    original = load_forest(args.model)
+    X, y = load_holdout(args.holdout, args.target, args.holdout_samples, args.seed)
+    reference = original.predict(X)
+    print(f"Original: {original.n_trees} trees, {original.n_nodes:,} nodes, depth {original.max_depth}; "
+          f"holdout {len(X):,} rows, budget MAE {args.budget}")
+
+    results = []
+    header = (f"{'depth':>5} {'trees':>5} {'merge':>5} {'f32':>3} | {'size MB':>8} {'load ms':>8} "
+              f"{'1-row us':>8} {'rows/s':>9} | {'MAE orig':>8} {'max err':>7} {'MAE lbl':>7}")
+    print(header)
+    print("-" * len(header))
+    with tempfile.TemporaryDirectory() as scratch:
+        for params in candidate_grid():
+            forest = compact(original, **params)
+            r = {**params, **measure(forest, X, y, reference, scratch)}
+            results.append(r)
+            print(f"{_fmt(r['max_depth']):>5} {r['n_trees']:>5} {r['merge_tolerance']:>5} "
+                  f"{'y' if r['float32'] else 'n':>3} | {r['size_mb']:>8.2f} {r['load_ms']:>8.1f} "
+                  f"{r['single_us']:>8.0f} {r['rows_per_s']:>9,.0f} | {r['mae_vs_original']:>8.3f} "
+                  f"{r['max_err_vs_original']:>7.2f} {r['mae_vs_labels']:>7.3f}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=4)
+
+    best = choose(results, args.budget)
+    if best is None:
+        print(f"\nNo candidate within MAE {args.budget}; nothing written.")
+        return None
+
+    forest = compact(original, best["max_depth"], best["n_trees"], best["merge_tolerance"], best["float32"])
+    metadata = {
+        "compacted_from": {"artifact": os.path.basename(args.model), "sha256": file_sha256(args.model)},
+        "compaction": {k: best[k] for k in ("max_depth", "n_trees", "merge_tolerance", "float32")},
+        "holdout": {"rows": len(X), "mae_vs_original": best["mae_vs_original"],
+                    "max_err_vs_original": best["max_err_vs_original"], "budget": args.budget},
+    }
+    sha = write_artifact(forest, args.output, metadata)
+    print(f"\nChosen: depth {_fmt(best['max_depth'])}, {best['n_trees']} trees, "
+          f"merge {best['merge_tolerance']}, float32 {best['float32']} -> "
+          f"{best['size_mb']:.2f} MB, MAE {best['mae_vs_original']:.3f} vs original")
+    print(f"Written to {args.output} (sha256 {sha[:12]})")
+    return best
+
+
+if __name__ == "__main__":
+    main()
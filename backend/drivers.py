@@ -0,0 +1,74 @@
+import numpy as np
+
+from risk_kernel import WEIGHTS, INTERACTION_BOOST, interaction_mask
+
+# Array-native risk-driver attribution.
+#
+# Drivers are computed for N normalized rows at once as compact int8 codes
+# (index into DRIVER_LABELS, -1 = no driver in that slot). Strings are only
+# produced at the JSON edge through the shared label tables below, so batch
+# and grid scoring never touch per-row dicts or sorting.
+#
+# Codes match get_risk_drivers in main.py row for row: ties keep the
+# insertion order of the original dict (stable sort), at most MAX_DRIVERS are
+# returned and rows with none map to [NORMAL_CONDITIONS].
+
+DRIVER_LABELS = (
+    "High Temperature",
+    "Strong Winds",
+    "Low Humidity",
+    "Dry Vegetation",
+    "Heat+Wind Interaction",
+)
+NORMAL_CONDITIONS = "Normal Conditions"
+MAX_DRIVERS = 3
+NO_DRIVER = -1
+
+# Packed code of a (3,) driver row: each slot shifted by +1 in base 6
+_BASE = len(DRIVER_LABELS) + 1
+
+
+def driver_contributions(n):
+    """(N, 5) contribution matrix in DRIVER_LABELS order; -inf where inactive."""
+    n_temp, n_hum, n_wind, n_veg = n[:, 0], n[:, 1], n[:, 2], n[:, 3]
+    contribs = np.full((n.shape[0], len(DRIVER_LABELS)), -np.inf)
+    # Each driver's share of the linear heuristic (risk_kernel weights)
+    contribs[:, 0] = np.where(n_temp > 0.6, WEIGHTS["temp"] * n_temp, -np.inf)
+    contribs[:, 1] = np.where(n_wind > 0.6, WEIGHTS["wind"] * n_wind, -np.inf)
+    contribs[:, 2] = np.where((1.0 - n_hum) > 0.6, -WEIGHTS["humidity"] * (1.0 - n_hum), -np.inf)
+    contribs[:, 3] = np.where((1.0 - n_veg) > 0.6, -WEIGHTS["veg"] * (1.0 - n_veg), -np.inf)
+    contribs[:, 4] = np.where(interaction_mask(n), float(INTERACTION_BOOST), -np.inf)
+    return contribs
+
+
+def top_drivers(n):
+    """(N, MAX_DRIVERS) int8 driver codes, padded with NO_DRIVER.
+
+    A stable sort on the negated contributions keeps insertion order for ties,
+    matching sorted(..., reverse=True) in get_risk_drivers.
+    """
+    contribs = driver_contributions(n)
+    order = np.argsort(-contribs, axis=1, kind="stable")[:, :MAX_DRIVERS]
+    active = np.take_along_axis(contribs, order, axis=1) > -np.inf
+    return np.where(active, order, NO_DRIVER).astype(np.int8)
+
+
+def pack_codes(codes):
+    """One integer per row identifying its driver triple (index into the tables below)."""
+    shifted = codes.astype(np.intp) + 1
+    return (shifted[:, 0] * _BASE + shifted[:, 1]) * _BASE + shifted[:, 2]
+
+
+def _labels_for(packed):
+    slots = (packed // (_BASE * _BASE), packed // _BASE % _BASE, packed % _BASE)
+    labels = [DRIVER_LABELS[s - 1] for s in slots if s > 0]
+    return labels if labels else [NORMAL_CONDITIONS]
+
+
+# Label table: packed code -> primary_drivers list (shared, do not mutate)
+DRIVER_LIST_TABLE = tuple(tuple(_labels_for(p)) for p in range(_BASE ** MAX_DRIVERS))
+
+
+def driver_names(codes):
+    """JSON edge: (N, 3) codes -> list of primary_drivers lists."""
+    return [list(DRIVER_LIST_TABLE[p]) for p in pack_codes(np.atleast_2d(codes)).tolist()]
@@ -0,0 +1,175 @@
+import math
+
+import numpy as np
+
+from risk_kernel import (FEATURE_SCALE, normalize, linear_scores, baseline_scores, interaction_boost,
+                         fallback_scores)
+
+# Shared NumPy evaluation core for evaluate_model.py, calibrate_thresholds.py
+# and validate_temporal.py.
+#
+# Samples are generated N at a time, scored as one batch (heuristic,
+# simulated model or the real model.pkl) and every threshold's confusion
+# matrix comes out of a single sort of the scores, so full ROC / PR curves
+# cost O(n log n) instead of one pass per threshold. The risk formula itself
+# comes from risk_kernel.py, the same code the API scores with.
+
+FEATURE_LOW = np.array([0.0, 0.0, 0.0, 0.0])
+FEATURE_HIGH = FEATURE_SCALE
+
+
+# --- Data generation -------------------------------------------------------
+
+def uniform_samples(n, rng):
+    """(n, 4) temp, humidity, wind, veg rows uniform over the contract ranges."""
+    return rng.uniform(FEATURE_LOW, FEATURE_HIGH, size=(n, 4))
+
+
+def seasonal_samples(month_idx, rng):
+    """Vectorized validate_temporal.get_seasonal_conditions for an array of months."""
+    month_idx = np.asarray(month_idx)
+    n = month_idx.shape[0]
+    is_fire_season = (month_idx >= 5) & (month_idx <= 9)
+
+    base_temp = 15 + 15 * np.sin(month_idx / 12 * 2 * math.pi) + np.where(is_fire_season, 10, 0)
+    base_hum = 60 + 20 * np.cos(month_idx / 12 * 2 * math.pi) - np.where(is_fire_season, 30, 0)
+
+    temp = np.clip(rng.normal(base_temp, 5), 0, 50)
+    hum = np.clip(rng.normal(base_hum, 10), 0, 100)
+    wind = rng.uniform(0, 1, n) * np.where(is_fire_season, 100, 60)
+    veg = np.where(is_fire_season, rng.uniform(0.1, 0.9, n), rng.uniform(0.4, 1.0, n))
+    return np.column_stack([temp, hum, wind, veg])
+
+
+# --- Scoring ---------------------------------------------------------------
+
+def truth_scores(X):
+    """Ground-truth risk: linear formula plus the Heat+Wind interaction."""
+    return fallback_scores(normalize(X))
+
+
+def heuristic_scores(X):
+    """Linear heuristic baseline on clipped inputs."""
+    return baseline_scores(normalize(X))
+
+
+def simulated_model_scores(X, rng, noise="uniform"):
+    """
+    The scripts' simulated ML model: heuristic + interaction boost + noise.
+    noise="uniform": U(-5, 5); noise="irwin_hall": 2 * (sum of 12 U(0,1) - 6).
+    """
+    n = normalize(X)
+    score = linear_scores(n) + interaction_boost(n)
+    if noise == "irwin_hall":
+        score = score + 2 * (rng.uniform(0, 1, (X.shape[0], 12)).sum(axis=1) - 6)
+    else:
+        score = score + rng.uniform(-5, 5, X.shape[0])
+    return np.clip(score, 0, 100)
+
+
+def model_scores(X, model_path):
+    """Scores from the trained model.pkl (flat engine), clipped to 0-100."""
+    from forest_engine import load_forest
+    return np.clip(load_forest(model_path).predict(X), 0, 100)
+
+
+# --- Metrics ---------------------------------------------------------------
+
+def threshold_curve(scores, labels):
+    """
+    Confusion counts for every distinct threshold in one sorted pass.
+
+    A row is predicted positive when score >= threshold. Returns a dict of
+    arrays ordered by ascending threshold: threshold, tp, fp, tn, fn.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels).astype(bool)
+    order = np.argsort(scores, kind="stable")
+    s, y = scores[order], labels[order]
+
+    thresholds, first = np.unique(s, return_index=True)
+    # Rows at index >= first[k] have score >= thresholds[k]
+    pos_below = np.concatenate([[0], np.cumsum(y)])[first]
+    neg_below = first - pos_below
+    total_pos = int(y.sum())
+    total_neg = len(y) - total_pos
+
+    tp = total_pos - pos_below
+    fp = total_neg - neg_below
+    return {"threshold": thresholds, "tp": tp, "fp": fp,
+            "tn": total_neg - fp, "fn": total_pos - tp,
+            "positives": total_pos, "negatives": total_neg}
+
+
+def counts_at(curve, thresholds, strict=False):
+    """
+    Confusion counts at arbitrary thresholds looked up on a threshold_curve.
+    strict=True predicts positive for score > threshold instead of >=.
+    """
+    t = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+    if strict:
+        t = np.nextafter(t, np.inf)
+    # Index of the first distinct score >= t; the appended 0 covers thresholds
+    # above every score (nothing predicted positive)
+    k = np.searchsorted(curve["threshold"], t, side="left")
+    tp = np.append(curve["tp"], 0)[k]
+    fp = np.append(curve["fp"], 0)[k]
+    return {"tp": tp, "fp": fp,
+            "tn": curve["negatives"] - fp, "fn": curve["positives"] - tp}
+
+
+def _ratio(num, den):
+    num, den = np.asarray(num, dtype=np.float64), np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def rates(counts):
+    """Accuracy, precision, recall, F1 and FP rate (arrays) from confusion counts."""
+    tp, fp, tn, fn = (np.asarray(counts[k], dtype=np.float64) for k in ("tp", "fp", "tn", "fn"))
+    precision = _ratio(tp, tp + fp)
+    recall = _ratio(tp, tp + fn)
+    return {
+        "accuracy": _ratio(tp + tn, tp + fp + tn + fn),
+        "precision": precision,
+        "recall": recall,
+        "f1_score": _ratio(2 * precision * recall, precision + recall),
+        "fp_rate": _ratio(fp, fp + tn),
+    }
+
+
+def confusion_metrics(tp, fp, tn, fn):
+    """evaluation_results.json-style metrics from one confusion matrix."""
+    r = rates({"tp": [tp], "fp": [fp], "tn": [tn], "fn": [fn]})
+    return {
+        "confusion_matrix": {"TP": int(tp), "TN": int(tn), "FP": int(fp), "FN": int(fn)},
+        "accuracy": float(r["accuracy"][0]),
+        "precision": float(r["precision"][0]),
+        "recall": float(r["recall"][0]),
+        "f1_score": float(r["f1_score"][0]),
+    }
+
+
+def binary_metrics(scores, labels, threshold, strict=False):
+    """evaluation_results.json-style metrics for one threshold."""
+    counts = counts_at(threshold_curve(scores, labels), threshold, strict)
+    return confusion_metrics(*(counts[k][0] for k in ("tp", "fp", "tn", "fn")))
+
+
+def roc_curve(curve):
+    """(fpr, tpr) from high to low threshold, starting at (0, 0)."""
+    pos = curve["tp"] + curve["fn"]
+    neg = curve["fp"] + curve["tn"]
+    tpr = np.concatenate([[0.0], _ratio(curve["tp"], pos)[::-1]])
+    fpr = np.concatenate([[0.0], _ratio(curve["fp"], neg)[::-1]])
+    return fpr, tpr
+
+
+def pr_curve(curve):
+    """(recall, precision) from high to low threshold."""
+    r = rates(curve)
+    return r["recall"][::-1], r["precision"][::-1]
+
+
+def roc_auc(curve):
+    fpr, tpr = roc_curve(curve)
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
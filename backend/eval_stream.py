@@ -0,0 +1,225 @@
+import numpy as np
+
+from eval_core import (uniform_samples, truth_scores, heuristic_scores,
+                       simulated_model_scores, confusion_metrics)
+
+# Streaming, mergeable evaluation accumulators.
+#
+# Each accumulator consumes scored chunks (update) and combines with another
+# instance of the same configuration (merge), holding only fixed-size state:
+# confusion counts at one threshold, fixed-bin score histograms per label,
+# absolute / squared error sums and calibration bins. Evaluation is split
+# into shards, each with its own RNG streams derived from one SeedSequence,
+# so shards can run in separate processes; partials are merged in shard
+# order, so the result depends only on (seed, shards), not on worker count
+# or scheduling. The chunk size changes neither the data nor any count (float
+# error sums only in the last bits).
+
+HISTOGRAM_BINS = 20
+CALIBRATION_BINS = 10
+CHUNK_ROWS = 100_000
+
+
+class ConfusionAccumulator:
+    """TP / FP / TN / FN at one threshold (score >= threshold, or > when strict)."""
+
+    def __init__(self, threshold, strict=False):
+        self.threshold = threshold
+        self.strict = strict
+        self.tp = self.fp = self.tn = self.fn = 0
+
+    def update(self, scores, labels):
+        predicted = scores > self.threshold if self.strict else scores >= self.threshold
+        labels = np.asarray(labels, dtype=bool)
+        tp = int(np.count_nonzero(predicted & labels))
+        fp = int(np.count_nonzero(predicted)) - tp
+        fn = int(np.count_nonzero(labels)) - tp
+        self.tp += tp
+        self.fp += fp
+        self.fn += fn
+        self.tn += len(labels) - tp - fp - fn
+
+    def merge(self, other):
+        self.tp += other.tp
+        self.fp += other.fp
+        self.tn += other.tn
+        self.fn += other.fn
+        return self
+
+    def metrics(self):
+        return confusion_metrics(self.tp, self.fp, self.tn, self.fn)
+
+
+class ScoreHistogram:
+    """Counts of 0-100 scores in fixed bins, split by label (row 0 = negatives)."""
+
+    def __init__(self, bins=HISTOGRAM_BINS):
+        self.edges = np.linspace(0.0, 100.0, bins + 1)
+        self.counts = np.zeros((2, bins), dtype=np.int64)
+
+    def update(self, scores, labels):
+        idx = np.clip(np.searchsorted(self.edges, scores, side="right") - 1, 0, len(self.edges) - 2)
+        self.counts += np.bincount(np.asarray(labels, dtype=np.intp) * (len(self.edges) - 1) + idx,
+                                   minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def metrics(self):
+        """Bin edges and per-bin counts of negatives / positives (evaluation_results.json)."""
+        return {
+            "bin_edges": self.edges.tolist(),
+            "negatives": self.counts[0].tolist(),
+            "positives": self.counts[1].tolist(),
+        }
+
+
+class ErrorAccumulator:
+    """MAE / RMSE of scores against reference scores."""
+
+    def __init__(self):
+        self.n = 0
+        self.abs_sum = 0.0
+        self.sq_sum = 0.0
+
+    def update(self, scores, reference):
+        err = np.asarray(scores, dtype=np.float64) - reference
+        self.n += len(err)
+        self.abs_sum += float(np.abs(err).sum())
+        self.sq_sum += float(np.square(err).sum())
+
+    def merge(self, other):
+        self.n += other.n
+        self.abs_sum += other.abs_sum
+        self.sq_sum += other.sq_sum
+        return self
+
+    def metrics(self):
+        if not self.n:
+            return {"mae": 0.0, "rmse": 0.0}
+        return {"mae": self.abs_sum / self.n, "rmse": float(np.sqrt(self.sq_sum / self.n))}
+
+
+class CalibrationAccumulator:
+    """Mean score / 100 vs observed positive rate per fixed score bin."""
+
+    def __init__(self, bins=CALIBRATION_BINS):
+        self.bins = bins
+        self.count = np.zeros(bins, dtype=np.int64)
+        self.positives = np.zeros(bins, dtype=np.int64)
+        self.score_sum = np.zeros(bins)
+
+    def update(self, scores, labels):
+        idx = np.clip((np.asarray(scores) / 100.0 * self.bins).astype(np.intp), 0, self.bins - 1)
+        self.count += np.bincount(idx, minlength=self.bins)
+        self.positives += np.bincount(idx, weights=np.asarray(labels, dtype=np.float64),
+                                      minlength=self.bins).astype(np.int64)
+        self.score_sum += np.bincount(idx, weights=scores, minlength=self.bins)
+
+    def merge(self, other):
+        self.count += other.count
+        self.positives += other.positives
+        self.score_sum += other.score_sum
+        return self
+
+    def metrics(self):
+        """Per-bin mean predicted probability / observed rate and the expected calibration error."""
+        filled = self.count > 0
+        predicted = np.divide(self.score_sum / 100.0, self.count, out=np.zeros(self.bins), where=filled)
+        observed = np.divide(self.positives, self.count, out=np.zeros(self.bins), where=filled)
+        total = max(int(self.count.sum()), 1)
+        return {
+            "predicted": predicted.tolist(),
+            "observed": observed.tolist(),
+            "count": self.count.tolist(),
+            "ece": float(np.sum(self.count * np.abs(predicted - observed)) / total),
+        }
+
+
+class ScorerAccumulator:
+    """Every accumulator for one scorer (model or heuristic baseline)."""
+
+    def __init__(self, threshold, strict=False):
+        self.confusion = ConfusionAccumulator(threshold, strict)
+        self.histogram = ScoreHistogram()
+        self.errors = ErrorAccumulator()
+        self.calibration = CalibrationAccumulator()
+
+    def update(self, scores, truth, labels):
+        self.confusion.update(scores, labels)
+        self.histogram.update(scores, labels)
+        self.errors.update(scores, truth)
+        self.calibration.update(scores, labels)
+
+    def merge(self, other):
+        self.confusion.merge(other.confusion)
+        self.histogram.merge(other.histogram)
+        self.errors.merge(other.errors)
+        self.calibration.merge(other.calibration)
+        return self
+
+
+# --- Sharded evaluation --------------------------------------------------------
+
+def shard_sizes(n_samples, shards):
+    """Rows per shard (the first n % shards shards get one extra)."""
+    return [n_samples // shards + (k < n_samples % shards) for k in range(shards)]
+
+
+def evaluate_shard(entropy, shard, n_rows, threshold, scorer="simulated", model_path=None,
+                   chunk_rows=CHUNK_ROWS):
+    """
+    Stream one shard's samples through the accumulators; returns
+    {"model": ScorerAccumulator, "heuristic": ScorerAccumulator}.
+
+    Features and model noise come from separate streams spawned for this
+    shard, drawn sequentially, so the chunk size does not change the data.
+    """
+    features_rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(shard, 0)))
+    noise_rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(shard, 1)))
+    forest = None
+    if scorer == "model":
+        from forest_engine import load_forest
+        forest = load_forest(model_path)
+
+    acc = {"model": ScorerAccumulator(threshold), "heuristic": ScorerAccumulator(threshold)}
+    for start in range(0, n_rows, chunk_rows):
+        X = uniform_samples(min(chunk_rows, n_rows - start), features_rng)
+        truth = truth_scores(X)
+        labels = truth > threshold
+        if forest is not None:
+            scores = np.clip(forest.predict(X), 0, 100)
+        else:
+            scores = simulated_model_scores(X, noise_rng, noise="irwin_hall")
+        acc["model"].update(scores, truth, labels)
+        acc["heuristic"].update(heuristic_scores(X), truth, labels)
+    return acc
+
+
+def _run_shard(args):
+    return evaluate_shard(*args)
+
+
+def evaluate_sharded(n_samples, threshold, seed=None, shards=1, workers=1, scorer="simulated",
+                     model_path=None, chunk_rows=CHUNK_ROWS):
+    """
+    Evaluate n_samples rows split into `shards` independent shards on up to
+    `workers` processes; partial accumulators are merged in shard order.
+    Returns (merged accumulators, root entropy used).
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    tasks = [(entropy, k, rows, threshold, scorer, model_path, chunk_rows)
+             for k, rows in enumerate(shard_sizes(n_samples, shards))]
+    if workers > 1 and shards > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, shards)) as pool:
+            parts = list(pool.map(_run_shard, tasks))
+    else:
+        parts = [_run_shard(t) for t in tasks]
+
+    merged = parts[0]
+    for part in parts[1:]:
+        for name in merged:
+            merged[name].merge(part[name])
+    return merged, entropy
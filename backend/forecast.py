@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from scoring import FEATURE_NAMES, score_batch
+
+# Multi-horizon forecast scoring.
+#
+# A forecast is a zones x hours tensor of the four features. The first
+# submission of a forecast is scored in one vectorized pass; the result is
+# kept alongside the inputs, and later submissions under the same forecast id
+# are diffed against them so only cells whose features changed go back
+# through score_batch. Rows are scored independently, so an incremental
+# refresh is bit-identical to a full one.
+#
+# State is dropped (and the next refresh is a full pass) when the tensor
+# shape or the served model version changes. The store is bounded by total
+# bytes as well as by count (one 1M-cell forecast keeps about 70 MB of inputs
+# and scores), and refreshes of one forecast id are serialised so concurrent
+# submissions diff against each other instead of both rescoring in full.
+
+
+class ForecastState:
+    """Inputs and scores of one forecast: (Z, H, 4) features -> (Z, H) tensors."""
+
+    def __init__(self, X, scores, version):
+        self.X = X
+        self.scores = scores
+        self.version = version
+
+    @property
+    def nbytes(self):
+        return self.X.nbytes + sum(v.nbytes for v in self.scores.values())
+
+    @classmethod
+    def full(cls, X, model, version):
+        zones, hours = X.shape[:2]
+        flat = score_batch(X.reshape(-1, len(FEATURE_NAMES)), model)
+        scores = {k: v.reshape((zones, hours) + v.shape[1:]) for k, v in flat.items()}
+        return cls(X, scores, version)
+
+    def changed_cells(self, X):
+        """(Z, H) mask of cells whose features differ from the stored tensor."""
+        return np.any(X != self.X, axis=-1)
+
+    def update(self, X, model, changed):
+        """Rescore only the `changed` cells in place."""
+        if changed.any():
+            fresh = score_batch(X[changed], model)
+            for k, v in fresh.items():
+                self.scores[k][changed] = v
+        self.X = X
+
+
+class ForecastStore:
+    """
+    LRU of forecast states keyed by forecast id, bounded by count and total bytes.
+    Thread-safe; states are replaced wholesale, never shared across ids.
+    """
+
+    def __init__(self, maxsize=64, max_bytes=256 << 20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._states = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._id_locks = {}  # forecast id -> [lock, holders + waiters]
+        self.full_refreshes = 0
+        self.incremental_refreshes = 0
+        self.cells_scored = 0
+        self.evictions = 0
+
+    def _id_lock(self, forecast_id):
+        with self._lock:
+            entry = self._id_locks.setdefault(forecast_id, [threading.Lock(), 0])
+            entry[1] += 1
+        return entry
+
+    def _release_id_lock(self, forecast_id, entry):
+        with self._lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._id_locks[forecast_id]
+
+    def score(self, forecast_id, X, model, version):
+        """
+        Score a (Z, H, 4) feature tensor for `forecast_id`.
+        Returns (scores dict of (Z, H[, 3]) arrays, number of cells scored, mode).
+        """
+        entry = self._id_lock(forecast_id)
+        try:
+            with entry[0]:
+                return self._score(forecast_id, X, model, version)
+        finally:
+            self._release_id_lock(forecast_id, entry)
+
+    def _score(self, forecast_id, X, model, version):
+        with self._lock:
+            state = self._states.pop(forecast_id, None)
+            if state is not None:
+                self._bytes -= state.nbytes
+        if state is None or state.X.shape != X.shape or state.version != version:
+            state = ForecastState.full(X, model, version)
+            n_scored, mode = X.shape[0] * X.shape[1], "full"
+        else:
+            changed = state.changed_cells(X)
+            state.update(X, model, changed)
+            n_scored, mode = int(changed.sum()), "incremental"
+        scores = {k: v.copy() for k, v in state.scores.items()}
+        with self._lock:
+            self._states[forecast_id] = state
+            self._bytes += state.nbytes
+            # A single state over max_bytes is dropped too: its next refresh is a full pass
+            while self._states and (len(self._states) > self.maxsize or self._bytes > self.max_bytes):
+                _, evicted = self._states.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+            if mode == "full":
+                self.full_refreshes += 1
+            else:
+                self.incremental_refreshes += 1
+            self.cells_scored += n_scored
+        return scores, n_scored, mode
+
+    def invalidate(self, version=None):
+        """Drop every stored forecast (e.g. after a model swap)."""
+        with self._lock:
+            self._states.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "forecasts": len(self._states),
+                "max_forecasts": self.maxsize,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "full_refreshes": self.full_refreshes,
+                "incremental_refreshes": self.incremental_refreshes,
+                "cells_scored": self.cells_scored,
+            }
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+# Flat-array inference engine for the trained RandomForestRegressor.
+#
+# All trees are concatenated into contiguous per-node arrays. Leaves are
+# encoded as self-loops (threshold=+inf, both children pointing to the leaf)
+# so a batch of rows can walk every tree in lockstep for max_depth steps with
+# plain vectorized indexing, no per-tree Python loop and no sklearn overhead.
+# That wins on small batches; HybridForest hands large ones back to sklearn.
+
+ARRAY_NAMES = ("feature", "threshold", "children", "value", "roots")
+META_FILE = "meta.json"
+
+# Rows traversed together; bounds the (n_trees, rows) working set
+CHUNK_ROWS = 4096
+# Batches of at least this many rows go to sklearn's compiled traversal when
+# the sklearn forest is at hand (see HybridForest); 0 keeps every batch flat.
+# Off by default: the sklearn forest is a private heap copy in every process,
+# unlike the shared mmap of the flat arrays. serve.py turns it on, since its
+# workers fork after the load and share that copy too.
+SKLEARN_MIN_ROWS = int(os.environ.get("GEOFIRENET_SKLEARN_MIN_ROWS", "0"))
+# Default under serve.py
+PREFORK_SKLEARN_MIN_ROWS = 1024
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features):
+        # Compacted forests (compact_model.py) store int8 features and
+        # float32 thresholds / values; traversal works with either
+        self.feature = feature        # int32  (n_nodes,)   split feature per node
+        self.threshold = threshold    # float64 (n_nodes,)  go left if x <= threshold
+        self.children = children      # int32  (2*n_nodes,) [left, right] per node
+        self.value = value            # float64 (n_nodes,)  node mean (leaf output)
+        self.roots = roots            # int32  (n_trees,)   root node of each tree
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.sha256 = None            # digest of the model.pkl it came from (load_shared_forest)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Export a fitted sklearn forest (or single tree) into flat arrays."""
+        if isinstance(model, cls):
+            return model
+        estimators = getattr(model, "estimators_", [model])
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            ids = np.arange(n)
+            is_leaf = tree.children_left == -1
+
+            left = np.where(is_leaf, ids, tree.children_left) + offset
+            right = np.where(is_leaf, ids, tree.children_right) + offset
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.stack([left, right], axis=1).ravel())
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+        )
+
+    def save(self, directory):
+        """Write one .npy per array plus meta.json (loadable with mmap)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        meta = {
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "n_trees": self.n_trees,
+            "n_nodes": self.n_nodes,
+        }
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump(meta, f, indent=4)
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        # np.asarray drops the memmap subclass (and its per-op overhead) but
+        # keeps the mapped buffer
+        arrays = {
+            name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode))
+            for name in ARRAY_NAMES
+        }
+        return cls(max_depth=meta["max_depth"], n_features=meta["n_features"], **arrays)
+
+    def _apply_chunk(self, X32):
+        """Leaf index per (tree, row) for one chunk of float32 rows."""
+        n = X32.shape[0]
+        flat_x = X32.ravel()
+        row_base = (np.arange(n, dtype=np.int32) * self.n_features)[None, :]
+        node = np.repeat(self.roots[:, None], n, axis=1)
+
+        for _ in range(self.max_depth):
+            x = flat_x.take(row_base + self.feature.take(node))
+            go_right = x > self.threshold.take(node)
+            node = self.children.take(2 * node + go_right)
+        return node
+
+    def _chunks(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+
+        # sklearn compares float32 inputs against float64 thresholds
+        X32 = X.astype(np.float32)
+        for start in range(0, X32.shape[0], CHUNK_ROWS):
+            yield start, X32[start:start + CHUNK_ROWS]
+
+    def apply(self, X):
+        """Leaf node index reached in every tree, shape (n_trees, N)."""
+        parts = [self._apply_chunk(chunk) for _, chunk in self._chunks(X)]
+        if not parts:
+            return np.empty((self.n_trees, 0), dtype=np.int32)
+        return np.concatenate(parts, axis=1)
+
+    def predict(self, X):
+        """Mean leaf value over all trees.
+
+        Leaf values are accumulated tree by tree with cumsum (never pairwise,
+        even for a single row), the same order sklearn uses, so results match
+        it bit for bit.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start, chunk in self._chunks(X):
+            leaves = self._apply_chunk(chunk)
+            out[start:start + chunk.shape[0]] = self.value.take(leaves).cumsum(axis=0, dtype=np.float64)[-1]
+        return out / self.n_trees
+
+
+class HybridForest:
+    """
+    FlatForest for small batches, the sklearn forest it was exported from for
+    large ones; predictions are bit-identical either way.
+
+    The lockstep walk always runs max_depth steps although most rows reach a
+    leaf at about half that depth, so from roughly a thousand rows on
+    sklearn's compiled per-tree traversal is faster (about 2x at 100k rows).
+    Below that sklearn's per-call overhead dominates and the flat walk is
+    3-30x faster, which is what /predict and micro-batches see.
+
+    Importing sklearn takes seconds, so its forest is loaded on a background
+    thread; every batch is scored flat until it is there (see wait()).
+    Bit-identity needs sklearn to sum the trees in order, so a forest with
+    parallel prediction (n_jobs other than None / 1) is refused.
+    """
+
+    def __init__(self, flat, load_sklearn, sklearn_min_rows=SKLEARN_MIN_ROWS):
+        self.flat = flat
+        self.model = None
+        self.feature_names = None
+        self.sklearn_min_rows = sklearn_min_rows
+        self._loader = threading.Thread(target=self._load, args=(load_sklearn,), daemon=True,
+                                        name="sklearn-forest-loader")
+        self._loader.start()
+
+    def _load(self, load_sklearn):
+        try:
+            model = load_sklearn()
+        except Exception as e:
+            print(f"Warning: sklearn forest unavailable, scoring every batch flat ({e})")
+            return
+        if model is not None:
+            self.feature_names = getattr(model, "feature_names_in_", None)
+            self.model = model
+
+    def wait(self, timeout=None):
+        """Block until the sklearn forest is loaded (serve.py does before forking)."""
+        self._loader.join(timeout)
+
+    def __getattr__(self, name):
+        # n_trees, apply, nbytes, sha256, ... come from the flat arrays
+        flat = self.__dict__.get("flat")
+        if flat is None:
+            raise AttributeError(name)
+        return getattr(flat, name)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.flat.n_features)
+        model = self.model
+        if model is None or len(X) < self.sklearn_min_rows:
+            return self.flat.predict(X)
+        # Same contract as the flat walk (sklearn may route NaN down a branch)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+        if self.feature_names is not None:
+            # Fitted on a DataFrame: pass one too, or sklearn warns on every call
+            import pandas as pd
+            X = pd.DataFrame(X, columns=self.feature_names)
+        return model.predict(X)
+
+
+def load_forest(path, mmap_mode=None):
+    """Load a FlatForest from an export directory or a joblib model.pkl.
+
+    model.pkl may hold a fitted sklearn forest or a pickled (e.g. compacted)
+    FlatForest.
+    """
+    if os.path.isdir(path):
+        return FlatForest.load(path, mmap_mode=mmap_mode)
+    import joblib
+    return FlatForest.from_sklearn(joblib.load(path))
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prune_exports(cache_dir, keep):
+    """Delete all but the `keep` most recently used exports in cache_dir.
+
+    Safe while other processes still map old files: unlinked mappings stay
+    valid until they are closed.
+    """
+    exports = [os.path.join(cache_dir, d) for d in os.listdir(cache_dir)
+               if not d.startswith(".") and os.path.isdir(os.path.join(cache_dir, d))]
+    exports.sort(key=os.path.getmtime, reverse=True)
+    for stale in exports[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def load_shared_forest(model_path, cache_dir, keep=3):
+    """
+    Load model.pkl as a memory-mapped FlatForest.
+
+    The flat export is cached under cache_dir/<content sha256>/ and opened
+    read-only with mmap, so every worker process serving the same artifact
+    shares one physical copy of the node arrays through the page cache.
+    Returns (forest, sha256).
+    """
+    sha = file_sha256(model_path)
+    export_dir = os.path.join(cache_dir, sha)
+    if not os.path.exists(os.path.join(export_dir, META_FILE)):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Export into a private temp dir, then rename: concurrent workers
+        # never see a half-written export
+        tmp_dir = tempfile.mkdtemp(prefix=f".{sha[:12]}-", dir=cache_dir)
+        try:
+            load_forest(model_path).save(tmp_dir)
+            os.rename(tmp_dir, export_dir)
+        except OSError:
+            if not os.path.exists(os.path.join(export_dir, META_FILE)):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.utime(export_dir)
+    prune_exports(cache_dir, keep)
+    forest = FlatForest.load(export_dir, mmap_mode="r")
+    forest.sha256 = sha
+    return forest, sha
+
+
+def _sklearn_forest(data):
+    """Unpickled sklearn forest from model.pkl bytes, None for a pickled FlatForest."""
+    import io
+    import joblib
+    model = joblib.load(io.BytesIO(data))
+    if not hasattr(model, "estimators_"):
+        return None
+    if getattr(model, "n_jobs", None) not in (None, 1):
+        # Threads add tree outputs in completion order: not bit-identical to the flat walk
+        raise ValueError(f"n_jobs={model.n_jobs}, expected None or 1 (train_model.py resets it)")
+    return model
+
+
+def load_serving_forest(model_path, cache_dir, sklearn_min_rows=SKLEARN_MIN_ROWS):
+    """
+    load_shared_forest, wrapped in a HybridForest that picks up the sklearn
+    forest from the same model.pkl bytes. Returns (forest, sha256).
+    """
+    forest, sha = load_shared_forest(model_path, cache_dir)
+    if sklearn_min_rows <= 0:
+        return forest, sha
+    with open(model_path, "rb") as f:
+        data = f.read()
+    if hashlib.sha256(data).hexdigest() != sha:
+        # Replaced since it was exported; the reload that follows picks it up
+        return forest, sha
+    return HybridForest(forest, lambda: _sklearn_forest(data), sklearn_min_rows), sha
+
+
+def export_forest(model_path, out_dir):
+    forest = load_forest(model_path)
+    forest.save(out_dir)
+    print(f"Exported {forest.n_trees} trees / {forest.n_nodes} nodes "
+          f"({forest.nbytes / 1e6:.1f} MB) to {out_dir}")
+    return forest
+
+
+if __name__ == "__main__":
+    # Usage: python forest_engine.py [model.pkl] [out_dir]
+    here = os.path.dirname(__file__)
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "model.pkl")
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.join(here, "model_flat")
+    export_forest(src, dst)
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from validate_temporal import get_seasonal_conditions
+
+# Concurrent HTTP load generator for the FastAPI service.
+#
+# Drives /predict and/or /predict/batch on a running server (or one started
+# here from backend/main.py) with N concurrent clients, either closed-loop
+# (as fast as responses come back) or open-loop at a fixed request rate.
+# Open-loop latency is measured from each request's scheduled send time, so
+# a server falling behind shows up as latency instead of silently lowering
+# the offered load. Every --interval seconds a line with throughput, error
+# rate and p50/p95/p99/max latency is printed; --report writes the windows
+# and the run summary as JSON.
+#
+# Usage:
+#   python load_test.py --start --duration 30 --concurrency 32
+#   python load_test.py --url http://host:8000 --rate 500 --inputs seasonal
+#   python load_test.py --start --route batch --batch-size 256 --inputs out-of-range
+#   python load_test.py --start --workers 4 --concurrency 64   # preforked (serve.py)
+
+FEATURE_HIGH = {"temp": 50.0, "humidity": 100.0, "wind": 100.0, "veg_moisture": 1.0}
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+READY_TIMEOUT = 60.0
+
+
+# --- Input distributions -----------------------------------------------------
+
+def uniform_row(rng):
+    return {name: rng.uniform(0.0, high) for name, high in FEATURE_HIGH.items()}
+
+
+def seasonal_row(rng):
+    # get_seasonal_conditions draws from the `random` module, seeded in main()
+    temp, humidity, wind, veg = get_seasonal_conditions(rng.randrange(12))
+    return {"temp": temp, "humidity": humidity, "wind": wind, "veg_moisture": veg}
+
+
+def out_of_range_row(rng, fraction=0.5):
+    """Uniform row with each feature pushed outside its contract range with probability `fraction`."""
+    row = uniform_row(rng)
+    for name, high in FEATURE_HIGH.items():
+        if rng.random() < fraction:
+            overshoot = rng.uniform(0.01, 1.0) * high
+            row[name] = high + overshoot if rng.random() < 0.5 else -overshoot
+    return row
+
+
+INPUTS = {"uniform": uniform_row, "seasonal": seasonal_row, "out-of-range": out_of_range_row}
+
+
+# --- Measurement ---------------------------------------------------------------
+
+class Window:
+    """Requests completed in one reporting interval."""
+
+    def __init__(self, start):
+        self.start = start
+        self.latencies = []
+        self.rows = 0
+        self.errors = {}
+
+    def record(self, latency, rows, error=None):
+        self.latencies.append(latency)
+        if error is None:
+            self.rows += rows
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, elapsed):
+        n = len(self.latencies)
+        n_errors = sum(self.errors.values())
+        pct = np.percentile(self.latencies, [50, 95, 99]) * 1000 if n else [0.0, 0.0, 0.0]
+        return {
+            "t": round(self.start, 3),
+            "requests": n,
+            "req_per_s": n / elapsed if elapsed > 0 else 0.0,
+            "rows_per_s": self.rows / elapsed if elapsed > 0 else 0.0,
+            "error_rate": n_errors / n if n else 0.0,
+            "errors": dict(self.errors),
+            "p50_ms": float(pct[0]),
+            "p95_ms": float(pct[1]),
+            "p99_ms": float(pct[2]),
+            "max_ms": max(self.latencies) * 1000 if n else 0.0,
+        }
+
+
+def print_window(s):
+    print(f"{s['t']:>7.1f}s {s['req_per_s']:>9.1f} {s['rows_per_s']:>10.1f} {s['error_rate']:>7.2%} "
+          f"{s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.2f}")
+
+
+WINDOW_HEADER = (f"{'time':>8} {'req/s':>9} {'rows/s':>10} {'errors':>7} "
+                 f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+
+
+# --- Load generation -------------------------------------------------------------
+
+async def run_load(client, duration, concurrency=16, rate=0.0, inputs="uniform", route="predict",
+                   batch_size=64, interval=5.0, seed=None, out_of_range_fraction=0.5, on_window=None):
+    """
+    Drive the service through `client` (an httpx.AsyncClient) for `duration` seconds.
+    Returns (per-interval summaries, overall summary).
+    """
+    make_row = INPUTS[inputs]
+    if inputs == "out-of-range":
+        make_row = lambda r: out_of_range_row(r, out_of_range_fraction)  # noqa: E731
+    routes = ("predict", "batch") if route == "both" else (route,)
+
+    started = time.perf_counter()
+    deadline = started + duration
+    windows, current = [], [Window(0.0)]
+    overall = Window(0.0)
+    sent = [0]
+
+    def roll(now):
+        # Close every interval that ended before `now`
+        while now - started >= current[0].start + interval:
+            windows.append(current[0].summary(interval))
+            if on_window:
+                on_window(windows[-1])
+            current[0] = Window(current[0].start + interval)
+
+    async def worker(k):
+        rng = random.Random(None if seed is None else seed * 1_000_003 + k)
+        while True:
+            i = sent[0]
+            sent[0] += 1
+            if rate > 0:
+                scheduled = started + i / rate
+                if scheduled >= deadline:
+                    return
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    return
+            which = routes[i % len(routes)]
+            if which == "batch":
+                path, body, rows = "/predict/batch", [make_row(rng) for _ in range(batch_size)], batch_size
+            else:
+                path, body, rows = "/predict", make_row(rng), 1
+            error = None
+            try:
+                r = await client.post(path, json=body)
+                if r.status_code != 200:
+                    error = f"HTTP {r.status_code}"
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            now = time.perf_counter()
+            roll(now)
+            current[0].record(now - scheduled, rows, error)
+            overall.record(now - scheduled, rows, error)
+
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    roll(time.perf_counter())
+    if current[0].latencies:
+        windows.append(current[0].summary(elapsed - current[0].start))
+        if on_window:
+            on_window(windows[-1])
+    return windows, overall.summary(elapsed)
+
+
+# --- Local server ------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, extra_env=None, workers=1):
+    """Start backend/main.py under uvicorn (or serve.py with workers > 1) and wait for /readyz."""
+    env = {**os.environ, **(extra_env or {})}
+    if workers > 1:
+        command = ["serve.py", "--workers", str(workers), "--memory-interval", "0"]
+    else:
+        command = ["-m", "uvicorn", "main:app"]
+    proc = subprocess.Popen(
+        [sys.executable, *command, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/readyz", timeout=1.0).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"Server not ready after {READY_TIMEOUT:.0f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the risk API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start", action="store_true", help="Start backend/main.py locally on a free port")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="With --start: preforked workers (serve.py) instead of one uvicorn process")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Total requests/s (open loop); 0 = closed loop, as fast as possible")
+    parser.add_argument("--inputs", choices=sorted(INPUTS), default="uniform")
+    parser.add_argument("--out-of-range-fraction", type=float, default=0.5,
+                        help="Per-feature probability of an out-of-range value (--inputs out-of-range)")
+    parser.add_argument("--route", choices=["predict", "batch", "both"], default="predict")
+    parser.add_argument("--batch-size", type=int, default=64, help="Rows per /predict/batch request")
+    parser.add_argument("--interval", type=float, default=5.0, help="Reporting window in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--report", help="Write windows and summary as JSON")
+    args = parser.parse_args(argv)
+
+    # get_seasonal_conditions uses the global `random` state
+    random.seed(args.seed)
+    proc, url = start_server(free_port(), workers=args.workers) if args.start else (None, args.url)
+    print(f"Load test: {url} route={args.route} inputs={args.inputs} concurrency={args.concurrency} "
+          f"rate={'max' if args.rate <= 0 else args.rate} duration={args.duration:.0f}s")
+    print(WINDOW_HEADER)
+
+    async def run():
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+            return await run_load(client, args.duration, args.concurrency, args.rate, args.inputs, args.route,
+                                  args.batch_size, args.interval, args.seed, args.out_of_range_fraction,
+                                  on_window=print_window)
+
+    try:
+        windows, summary = asyncio.run(run())
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print("-" * len(WINDOW_HEADER))
+    print(f"Total: {summary['requests']} requests, {summary['req_per_s']:.1f} req/s, "
+          f"{summary['rows_per_s']:.1f} rows/s, errors {summary['error_rate']:.2%} {summary['errors'] or ''}")
+    print(f"Latency ms: p50 {summary['p50_ms']:.2f}  p95 {summary['p95_ms']:.2f}  "
+          f"p99 {summary['p99_ms']:.2f}  max {summary['max_ms']:.2f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"config": vars(args), "windows": windows, "summary": summary}, f, indent=4)
+        print(f"Report written to {args.report}")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
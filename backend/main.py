@@ -1,11 +1,78 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, field_validator
-import joblib
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import hashlib
+import io
+import math
+import signal
+import threading
+import traceback
+from contextlib import asynccontextmanager
+from typing import Annotated, Literal
+from fastapi import Depends, FastAPI, HTTPException, Header, Request, Response
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
 import os
 import numpy as np
+from functools import partial
 from fastapi.middleware.cors import CORSMiddleware
+from scoring import (score_batch, to_predictions, risk_scores, normalize, as_feature_matrix, RISK_LEVELS,
+                     FEATURE_NAMES, DRIVER_LABELS)
+from drivers import top_drivers, driver_names
+import risk_kernel
+from metrics import (REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, STAGE_LATENCY, BATCH_ROWS,
+                     MODEL_FALLBACKS, RISK_LEVELS_SERVED, RequestMetricsMiddleware, record_clamp, record_fallback,
+                     warnings_log)
+from forest_engine import SKLEARN_MIN_ROWS, file_sha256, load_serving_forest
+from model_artifact import verify_artifact
+from surrogate import GridSurrogate, GRID_PATH
+from prediction_cache import PredictionCache
+from micro_batcher import MicroBatcher
+from model_registry import ModelRegistry
+from raster import build_feature_matrix, encode_raster, RASTER_MEDIA_TYPE
+from forecast import ForecastStore
+from zones import ZoneRegistry, ZONES_PATH as DEFAULT_ZONES_PATH
+from columnar import (BINARY_MEDIA_TYPES, media_type, negotiate, parse_features, clamp_features,
+                      clamp_header, encode_scores)
+from tiles import (TileCache, TileRenderer, WeatherSource, GridInputs, ZoneInputs, valid_tile,
+                   not_modified)
+from sensitivity import (SurfaceEngine, feature_grid, DEFAULT_POINTS, MAX_POINTS, DEFAULT_BACKGROUND_ROWS,
+                         MAX_BACKGROUND_ROWS, MAX_SURFACE_ROWS)
+from email.utils import formatdate
+from starlette.concurrency import run_in_threadpool
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load + warm up off the event loop: the server accepts connections (and
+    # answers /livez) right away, /readyz flips to 200 once the model is warm
+    def start_serving():
+        startup()
+        model_registry.start()
+
+    loader = asyncio.get_running_loop().run_in_executor(None, start_serving)
+    loader.add_done_callback(startup_done)
+    yield
+    await asyncio.wait([loader])
+    model_registry.stop()
+    # Report warning counts still inside their rate-limit window
+    warnings_log.flush()
+
+# Set when the background startup raised: the worker can never become ready,
+# so /livez fails too and the orchestrator restarts it
+startup_error = None
 
-app = FastAPI(title="GeoFireNet Risk API")
+def startup_done(loader):
+    global startup_error
+    if loader.cancelled() or loader.exception() is None:
+        return
+    startup_error = loader.exception()
+    print("ERROR: Startup failed; /livez now answers 503 so the worker gets restarted")
+    traceback.print_exception(startup_error)
+
+app = FastAPI(title="GeoFireNet Risk API", lifespan=lifespan)
 
 # Allow CORS for React Dashboard
 app.add_middleware(
@@ -15,31 +82,126 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Load Model
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "model.pkl")
-model = None
+# Inference engine: "flat" (vectorized FlatForest arrays; with
+# SKLEARN_MIN_ROWS > 0 sklearn for large batches, see forest_engine.HybridForest)
+# or "sklearn"
+FOREST_ENGINE = os.environ.get("GEOFIRENET_ENGINE", "flat")
+# Scoring mode: "forest" (exact) or "surrogate" (lookup grid, see surrogate.py)
+SCORING_MODE = os.environ.get("GEOFIRENET_SCORING_MODE", "forest")
+# Memory-mapped flat exports of model.pkl, one directory per content hash
+FLAT_CACHE_DIR = os.environ.get(
+    "GEOFIRENET_FLAT_CACHE_DIR", os.path.join(os.path.dirname(__file__), "model_cache"))
+# Seconds between artifact checks for hot reload (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.environ.get("GEOFIRENET_MODEL_WATCH_INTERVAL", "5"))
+# Optional shared secret for /admin routes (X-Admin-Token header)
+ADMIN_TOKEN = os.environ.get("GEOFIRENET_ADMIN_TOKEN")
+# Set by serve.py in preforked workers: model reloads go through the parent
+supervisor_pid = None
 
-try:
-    if os.path.exists(MODEL_PATH):
-        model = joblib.load(MODEL_PATH)
-        print(f"Loaded model from {MODEL_PATH}")
-    else:
+def artifact_version(path):
+    """Identify a model artifact on disk by mtime and size."""
+    st = os.stat(path)
+    return f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+def load_model():
+    """
+    Load the scoring model for the configured mode.
+    Returns (model, version); model is None when falling back to mock logic.
+    """
+    if SCORING_MODE == "surrogate":
+        if not os.path.exists(GRID_PATH):
+            print("Warning: model_grid.npz not found. Falling back to forest scoring.")
+        else:
+            surrogate = GridSurrogate.load(GRID_PATH)
+            # Without model.pkl the grid is the only model; otherwise it must come from it
+            if os.path.exists(MODEL_PATH) and not surrogate.built_from(file_sha256(MODEL_PATH)):
+                print(f"Warning: {GRID_PATH} was not built from {MODEL_PATH} "
+                      "(rebuild it with surrogate.py). Falling back to forest scoring.")
+            else:
+                report = surrogate.error_report
+                print(f"Loaded surrogate grid from {GRID_PATH} "
+                      f"(max abs error {report.get('max_abs_error', float('nan')):.2f}, "
+                      f"mean {report.get('mean_abs_error', float('nan')):.3f})")
+                return surrogate, artifact_version(GRID_PATH)
+
+    if not os.path.exists(MODEL_PATH):
         print("Warning: model.pkl not found. API will use mock logic.")
-except Exception as e:
-    print(f"Error loading model: {e}")
+        return None, "mock"
+
+    if FOREST_ENGINE == "flat":
+        forest, sha = load_serving_forest(MODEL_PATH, FLAT_CACHE_DIR, SKLEARN_MIN_ROWS)
+        version = f"model.pkl:{sha[:12]}"
+        try:
+            verify_artifact(MODEL_PATH, sha)
+        except ValueError as e:
+            print(f"Warning: {e}")
+    else:
+        # Deferred: only the sklearn engine needs joblib at load time
+        import joblib
+        with open(MODEL_PATH, "rb") as f:
+            data = f.read()
+        forest = joblib.load(io.BytesIO(data))
+        # Pins sensitivity pool workers to these exact bytes (see model_spec)
+        forest.sha256 = hashlib.sha256(data).hexdigest()
+        version = artifact_version(MODEL_PATH)
+    print(f"Loaded model from {MODEL_PATH} ({FOREST_ENGINE} engine, version {version})")
+    return forest, version
+
+def active_artifact_path():
+    """Artifact the hot-reload watcher follows for the configured mode."""
+    if SCORING_MODE == "surrogate" and os.path.exists(GRID_PATH):
+        return GRID_PATH
+    return MODEL_PATH
+
+model = None
+model_version = "mock"
+# (model, version) as one reference: paths that key stored results by version
+# read this once, so they never pair one model's scores with another's version
+served = (model, model_version)
+
+# Callables invoked with the new version whenever the served model changes
+model_listeners = []
+
+def set_model(new_model, version):
+    """
+    Swap the served model and fire the model-change hooks.
+    A single reference assignment: request paths read `model` once and use
+    that reference throughout, so no request mixes two models.
+    """
+    global model, model_version, served
+    served = (new_model, version)
+    model = new_model
+    model_version = version
+    for listener in model_listeners:
+        listener(version)
+
+# Prediction cache (0 disables); keys quantized to CACHE_QUANTUM of each range
+CACHE_SIZE = int(os.environ.get("GEOFIRENET_CACHE_SIZE", "50000"))
+CACHE_QUANTUM = float(os.environ.get("GEOFIRENET_CACHE_QUANTUM", "1e-4"))
+prediction_cache = PredictionCache(maxsize=CACHE_SIZE, quantum=CACHE_QUANTUM)
+model_listeners.append(prediction_cache.invalidate)
+
+model_registry = ModelRegistry(load_model, set_model, active_artifact_path,
+                               poll_interval=MODEL_WATCH_INTERVAL)
+
+# NaN / inf are rejected (422) rather than clamped: they have no place in any range
+FiniteFloat = Annotated[float, Field(allow_inf_nan=False)]
 
 class WildfireFeatures(BaseModel):
-    temp: float
-    humidity: float
-    wind: float
-    veg_moisture: float
+    temp: FiniteFloat
+    humidity: FiniteFloat
+    wind: FiniteFloat
+    veg_moisture: FiniteFloat
 
     @field_validator('temp')
     @classmethod
     def clamp_temp(cls, v):
         if v < 0.0 or v > 50.0:
-            print(f"WARNING: Clamping temperature input {v} to [0, 50]")
+            record_clamp("temp", v, 0, 50)
             return max(0.0, min(v, 50.0))
         return v
 
@@ -47,7 +209,7 @@ class WildfireFeatures(BaseModel):
     @classmethod
     def clamp_humidity(cls, v):
         if v < 0.0 or v > 100.0:
-            print(f"WARNING: Clamping humidity input {v} to [0, 100]")
+            record_clamp("humidity", v, 0, 100)
             return max(0.0, min(v, 100.0))
         return v
 
@@ -55,7 +217,7 @@ class WildfireFeatures(BaseModel):
     @classmethod
     def clamp_wind(cls, v):
         if v < 0.0 or v > 100.0:
-            print(f"WARNING: Clamping wind input {v} to [0, 100]")
+            record_clamp("wind", v, 0, 100)
             return max(0.0, min(v, 100.0))
         return v
 
@@ -63,10 +225,18 @@ class WildfireFeatures(BaseModel):
     @classmethod
     def clamp_veg(cls, v):
         if v < 0.0 or v > 1.0:
-            print(f"WARNING: Clamping veg_moisture input {v} to [0, 1]")
+            record_clamp("veg_moisture", v, 0, 1)
             return max(0.0, min(v, 1.0))
         return v
 
+@app.exception_handler(RequestValidationError)
+async def validation_error(request, exc):
+    """Default 422 body, with NaN / inf inputs echoed as strings so the error itself is valid JSON."""
+    errors = [{**err, "input": str(err["input"])}
+              if isinstance(err.get("input"), float) and not math.isfinite(err["input"]) else err
+              for err in exc.errors()]
+    return await request_validation_exception_handler(request, RequestValidationError(errors))
+
 class RiskPrediction(BaseModel):
     risk_score: float
     risk_level: str
@@ -81,72 +251,149 @@ def get_risk_level(score):
     return "Extreme"
 
 def get_risk_drivers(temp, humidity, wind, veg):
-    """Identify top contributing factors to risk."""
-    n_temp = min(temp / 50.0, 1.0)
-    n_hum = min(humidity / 100.0, 1.0)
-    n_wind = min(wind / 100.0, 1.0)
-    n_veg = min(veg, 1.0)
-    
-    contribs = {}
-    
-    # Only list as a driver if it's actually contributing significantly to *risk* (high value)
-    # Threshold 0.6 -> e.g. Temp > 30C, Wind > 60kmh
-    if n_temp > 0.6:
-        contribs["High Temperature"] = 40 * n_temp
-    
-    if n_wind > 0.6:
-        contribs["Strong Winds"] = 20 * n_wind
-        
-    if (1.0 - n_hum) > 0.6: # Humidity < 40%
-        contribs["Low Humidity"] = 30 * (1.0 - n_hum)
-        
-    if (1.0 - n_veg) > 0.6: # Veg Moisture < 0.4
-        contribs["Dry Vegetation"] = 30 * (1.0 - n_veg)
-    
-    # Interaction
-    if n_temp > 0.8 and n_wind > 0.7:
-        contribs["Heat+Wind Interaction"] = 20
-        
-    # Sort by contribution
-    sorted_factors = sorted(contribs.items(), key=lambda x: x[1], reverse=True)
-    
-    # Return top factors
-    drivers = [f[0] for f in sorted_factors]
-    return drivers[:3] if drivers else ["Normal Conditions"]
+    """Identify top contributing factors to risk (see drivers.py)."""
+    n = normalize(as_feature_matrix([temp, humidity, wind, veg]))
+    return driver_names(top_drivers(n))[0]
 
-@app.post("/predict", response_model=RiskPrediction)
+def record_levels(level_codes):
+    counts = np.bincount(level_codes, minlength=len(RISK_LEVELS)).tolist()
+    for level, count in zip(RISK_LEVELS, counts):
+        if count:
+            RISK_LEVELS_SERVED.inc(level, amount=count)
+
+def score_rows(rows, source="predict_batch"):
+    """Score a list of WildfireFeatures with one vectorized model call."""
+    BATCH_ROWS.observe(len(rows), source)
+    X = np.array(
+        [[r.temp, r.humidity, r.wind, r.veg_moisture] for r in rows],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    with STAGE_LATENCY.time("score_batch"):
+        scores = score_batch(X, model)
+    record_levels(scores["risk_level"])
+    with STAGE_LATENCY.time("to_predictions"):
+        return to_predictions(scores)
+
+# Micro-batching of concurrent /predict calls (max size <= 1 disables)
+MICROBATCH_MAX_SIZE = int(os.environ.get("GEOFIRENET_MICROBATCH_MAX_SIZE", "64"))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("GEOFIRENET_MICROBATCH_MAX_WAIT_MS", "2"))
+predict_batcher = MicroBatcher(partial(score_rows, source="microbatch"), max_batch_size=MICROBATCH_MAX_SIZE,
+                               max_wait_ms=MICROBATCH_MAX_WAIT_MS)
+
+async def compute_prediction(features):
+    if MICROBATCH_MAX_SIZE > 1:
+        # Queue wait plus the shared batch's scoring time
+        with STAGE_LATENCY.time("microbatch"):
+            return await predict_batcher.submit(features)
+    return await run_in_threadpool(score_features, features)
+
+# --- Startup / readiness ------------------------------------------------------
+
+# Seconds a scoring request waits for a still-loading worker before a 503
+READY_TIMEOUT = float(os.environ.get("GEOFIRENET_READY_TIMEOUT", "30"))
+
+_ready = threading.Event()
+_startup_lock = threading.Lock()
+startup_timings = {}
+
+# Rows touching every branch of the request path (drivers, levels, clamping)
+WARMUP_ROWS = [
+    {"temp": 45.0, "humidity": 5.0, "wind": 90.0, "veg_moisture": 0.1},
+    {"temp": 20.0, "humidity": 60.0, "wind": 10.0, "veg_moisture": 0.8},
+    {"temp": 30.0, "humidity": 20.0, "wind": 40.0, "veg_moisture": 0.3},
+]
+
+def warm_up():
+    """Run the scoring path once (model, drivers, pydantic) without touching metrics."""
+    rows = [WildfireFeatures(**row) for row in WARMUP_ROWS]
+    X = np.array([[r.temp, r.humidity, r.wind, r.veg_moisture] for r in rows])
+    for prediction in to_predictions(score_batch(X, model)):
+        RiskPrediction(**prediction)
+    get_risk_drivers(rows[0].temp, rows[0].humidity, rows[0].wind, rows[0].veg_moisture)
+
+def startup():
+    """Load the model, warm up and mark the worker ready (idempotent, blocking)."""
+    with _startup_lock:
+        if _ready.is_set():
+            return
+        start = time.perf_counter()
+        model_registry.reload()
+        load_zones()
+        loaded = time.perf_counter()
+        warm_up()
+        warmed = time.perf_counter()
+        startup_timings.update(load_s=round(loaded - start, 4), warmup_s=round(warmed - loaded, 4))
+        _ready.set()
+    print(f"Startup: imports {startup_timings['import_s']:.2f}s, model load "
+          f"{startup_timings['load_s']:.2f}s, warm-up {startup_timings['warmup_s']:.3f}s")
+
+async def require_ready():
+    """Scoring routes wait (bounded) for the model instead of serving a cold worker."""
+    if not _ready.is_set():
+        if startup_error is not None:
+            raise HTTPException(status_code=503, detail="Startup failed")
+        if not await run_in_threadpool(_ready.wait, READY_TIMEOUT):
+            raise HTTPException(status_code=503, detail="Model is still loading")
+
+@app.get("/livez")
+async def liveness():
+    """Process is up and serving the event loop, and startup has not failed."""
+    if startup_error is not None:
+        return JSONResponse(status_code=503, content={"status": "startup failed", "error": repr(startup_error)})
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """200 only once the model is loaded and warmed; load balancers route on this."""
+    if not _ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "failed" if startup_error else "starting"})
+    return {"status": "ready", "model_version": model_version, "startup": startup_timings, "pid": os.getpid()}
+
+@app.post("/predict", response_model=RiskPrediction, dependencies=[Depends(require_ready)])
 async def predict_risk(features: WildfireFeatures):
-    # 1. Calculate Heuristic Baseline (Linear)
-    n_temp = min(features.temp / 50.0, 1.0)
-    n_hum = min(features.humidity / 100.0, 1.0)
-    n_wind = min(features.wind / 100.0, 1.0)
-    n_veg = min(features.veg_moisture, 1.0)
-    
-    baseline_score = (40 * n_temp) + (20 * n_wind) - (30 * n_hum) - (30 * n_veg) + 40
-    baseline_score = max(0.0, min(baseline_score, 100.0))
+    if not prediction_cache.enabled:
+        return await compute_prediction(features)
+
+    key = prediction_cache.key(features.temp, features.humidity, features.wind, features.veg_moisture)
+    result = prediction_cache.get(key)
+    if result is None:
+        version = model_version
+        result = await compute_prediction(features)
+        # Dropped if the model was swapped while this request was scoring
+        prediction_cache.put(key, result, version)
+    else:
+        RISK_LEVELS_SERVED.inc(result["risk_level"])
+    return result
+
+def score_features(features):
+    """Score one validated feature row (uncached path of /predict)."""
+    # 1. Calculate Heuristic Baseline (Linear), scalar backend of risk_kernel
+    n = risk_kernel.normalize_row(features.temp, features.humidity, features.wind, features.veg_moisture)
+    baseline_score = risk_kernel.baseline_row(n)
     
     # 2. Calculate ML Prediction (Primary Source of Truth)
-    if model:
+    current_model = model
+    if current_model:
         # Use trained model
         input_vector = [[features.temp, features.humidity, features.wind, features.veg_moisture]]
         try:
             # Model trained to predict 0-100 score directly
             # verify using verify_scenarios.py if it outputs probability or score
             # Based on view_file of train_model.py, it's a Regressor predicting 0-100 score.
-            raw_score = float(model.predict(input_vector)[0])
+            raw_score = float(current_model.predict(input_vector)[0])
             ml_score = max(0.0, min(raw_score, 100.0))
         except Exception as e:
-            print(f"Model prediction failed: {e}")
+            record_fallback("exception", e)
             # Fallback to heuristic if model fails purely
             ml_score = baseline_score
     else:
         # Fallback Mock ML logic (Simulates model behavior)
-        ml_score = baseline_score
+        MODEL_FALLBACKS.inc("no_model")
         # Add non-linear boost to simulate ML "insight"
-        if n_temp > 0.8 and n_wind > 0.7:
-            ml_score += 20
-            
+        ml_score = risk_kernel.fallback_row(n, baseline_score)
+
     ml_score = max(0.0, min(ml_score, 100.0))
+    RISK_LEVELS_SERVED.inc(get_risk_level(ml_score))
 
     return {
         "risk_score": round(ml_score, 2),
@@ -156,6 +403,475 @@ async def predict_risk(features: WildfireFeatures):
         "primary_drivers": get_risk_drivers(features.temp, features.humidity, features.wind, features.veg_moisture)
     }
 
+# Upper bound on rows per batch call (keeps request bodies/memory bounded)
+MAX_BATCH_ROWS = 100_000
+# Columnar binary bodies skip per-row objects, so they may be far larger
+MAX_BINARY_ROWS = int(os.environ.get("GEOFIRENET_MAX_BINARY_ROWS", "2000000"))
+
+_batch_rows = TypeAdapter(list[WildfireFeatures])
+
+def score_columns(X, response_kind):
+    """Score a clamped (N, 4) matrix from a columnar body; returns (body, clamp counts)."""
+    BATCH_ROWS.observe(len(X), "columnar")
+    with STAGE_LATENCY.time("clamp"):
+        clamped = clamp_features(X)
+    with STAGE_LATENCY.time("score_batch"):
+        scores = score_batch(X, model)
+    record_levels(scores["risk_level"])
+    with STAGE_LATENCY.time("encode"):
+        if response_kind is None:
+            return to_predictions(scores), clamped
+        return encode_scores(scores, clamped, response_kind), clamped
+
+def score_rows_binary(rows, response_kind):
+    """JSON rows in, columnar binary out."""
+    BATCH_ROWS.observe(len(rows), "predict_batch")
+    X = np.array([[r.temp, r.humidity, r.wind, r.veg_moisture] for r in rows], dtype=np.float64).reshape(-1, 4)
+    with STAGE_LATENCY.time("score_batch"):
+        scores = score_batch(X, model)
+    record_levels(scores["risk_level"])
+    zero = {name: 0 for name in FEATURE_NAMES}
+    with STAGE_LATENCY.time("encode"):
+        return encode_scores(scores, zero, response_kind)
+
+_BATCH_OPENAPI = {"requestBody": {"required": True, "content": {
+    "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/WildfireFeatures"}}},
+    **{kind: {"schema": {"type": "string", "format": "binary"}} for kind in BINARY_MEDIA_TYPES},
+}}}
+
+@app.post("/predict/batch", response_model=list[RiskPrediction], dependencies=[Depends(require_ready)],
+          openapi_extra=_BATCH_OPENAPI)
+async def predict_risk_batch(request: Request):
+    """Score N feature rows with one vectorized forest call.
+
+    Each element of the JSON response is identical to what /predict returns
+    for the same row. Columnar binary bodies (.npy, .npz or the GFC1 column
+    format, see columnar.py) are accepted by Content-Type and answered in
+    binary when the Accept header asks for .npz or GFC1; clamping then runs
+    on whole columns and X-Clamp-Counts reports clamped values per feature.
+    """
+    body = await request.body()
+    content_type = media_type(request.headers.get("content-type"))
+    response_kind = negotiate(request.headers.get("accept"))
+
+    if content_type in BINARY_MEDIA_TYPES:
+        try:
+            X = parse_features(body, content_type)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        limit = MAX_BINARY_ROWS if response_kind else MAX_BATCH_ROWS
+        if len(X) > limit:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {limit} rows")
+        result, clamped = await run_in_threadpool(score_columns, X, response_kind)
+        headers = {"X-Clamp-Counts": clamp_header(clamped)}
+        if response_kind is None:
+            return JSONResponse(result, headers=headers)
+        return Response(content=result, media_type=response_kind, headers=headers)
+
+    try:
+        rows = _batch_rows.validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    if len(rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} rows")
+    if response_kind:
+        result = await run_in_threadpool(score_rows_binary, rows, response_kind)
+        return Response(content=result, media_type=response_kind)
+    return await run_in_threadpool(score_rows, rows)
+
+# Largest raster accepted by /raster (cells = width * height)
+MAX_RASTER_CELLS = 4_000_000
+
+class RasterRequest(BaseModel):
+    bbox: tuple[FiniteFloat, FiniteFloat, FiniteFloat, FiniteFloat] = Field(
+        description="min_lon, min_lat, max_lon, max_lat")
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+    # Scalar value per feature, used where no per-cell field is given
+    base: dict[str, float] = {}
+    # Per-cell absolute values / offsets: base64 little-endian float32 or lists
+    fields: dict[str, str | list[float]] = {}
+    offsets: dict[str, str | list[float]] = {}
+    format: Literal["float32", "class"] = "float32"
+    # Force the exact forest even when a lookup-grid surrogate is available
+    precise: bool = False
+
+_raster_surrogate = {"mtime": None, "model": None}
+
+def raster_model(current, precise):
+    """
+    Model used for rasters: the lookup-grid surrogate (O(1) per cell) when
+    model_grid.npz exists, was built from the served forest `current` and
+    precise scoring was not requested, otherwise `current` itself.
+    Returns (model, engine name).
+    """
+    if isinstance(current, GridSurrogate):
+        return current, "surrogate"
+    if precise or not os.path.exists(GRID_PATH):
+        return current, "model"
+    mtime = os.stat(GRID_PATH).st_mtime_ns
+    if _raster_surrogate["mtime"] != mtime:
+        _raster_surrogate.update(mtime=mtime, model=GridSurrogate.load(GRID_PATH))
+    surrogate = _raster_surrogate["model"]
+    if not surrogate.built_from(getattr(current, "sha256", None)):
+        return current, "model"
+    return surrogate, "surrogate"
+
+def engine_key(scorer, engine):
+    """Engine part of cache keys: a rebuilt surrogate grid is a different engine."""
+    if engine == "surrogate":
+        return f"surrogate-{scorer.fingerprint}"
+    return engine
+
+def engine_artifact(engine):
+    """File the scores of `engine` come from (its mtime bounds Last-Modified)."""
+    return GRID_PATH if engine == "surrogate" else MODEL_PATH
+
+def render_raster(req):
+    X = build_feature_matrix(req.width, req.height, req.base, req.fields, req.offsets)
+    scorer, engine = raster_model(served[0], req.precise)
+    with STAGE_LATENCY.time("raster_score"):
+        scores = risk_scores(X, scorer)
+    return encode_raster(scores, req.width, req.height, req.bbox, req.format), engine
+
+@app.post("/raster", response_class=Response, dependencies=[Depends(require_ready)])
+async def predict_raster(req: RasterRequest):
+    """
+    Score a whole grid of weather fields in one vectorized pass.
+
+    Returns the binary raster format documented in raster.py: a 48-byte
+    header plus float32 scores or uint8 risk classes, row 0 = north.
+    """
+    if req.width * req.height > MAX_RASTER_CELLS:
+        raise HTTPException(status_code=413, detail=f"Raster exceeds {MAX_RASTER_CELLS} cells")
+    try:
+        body, engine = await run_in_threadpool(render_raster, req)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return Response(content=body, media_type=RASTER_MEDIA_TYPE, headers={"X-Risk-Engine": engine})
+
+# Forecast tensors: cells per request and forecasts kept for incremental refresh
+MAX_FORECAST_CELLS = 1_000_000
+FORECAST_STORE_SIZE = int(os.environ.get("GEOFIRENET_FORECAST_STORE_SIZE", "64"))
+# Memory kept for stored forecasts, per worker process
+FORECAST_STORE_MB = float(os.environ.get("GEOFIRENET_FORECAST_STORE_MB", "256"))
+forecast_store = ForecastStore(maxsize=FORECAST_STORE_SIZE, max_bytes=int(FORECAST_STORE_MB * 2**20))
+model_listeners.append(forecast_store.invalidate)
+
+class ForecastRequest(BaseModel):
+    # Re-submitting under the same id only rescores cells that changed
+    forecast_id: str = Field(min_length=1, max_length=128)
+    zones: int = Field(gt=0)
+    hours: int = Field(gt=0)
+    # Scalar value per feature, used where no zones x hours field is given
+    base: dict[str, float] = {}
+    # zones x hours values per feature, row-major (zone-major): base64
+    # little-endian float32, a flat list or nested [zone][hour] lists
+    fields: dict[str, str | list[float] | list[list[float]]] = {}
+
+def render_forecast(req):
+    X = build_feature_matrix(req.hours, req.zones, req.base, req.fields)
+    # One snapshot: the stored state must hold the scores of the version it is keyed by
+    scorer, version = served
+    with STAGE_LATENCY.time("forecast_score"):
+        scores, n_scored, mode = forecast_store.score(
+            req.forecast_id, X.reshape(req.zones, req.hours, len(FEATURE_NAMES)), scorer, version)
+    BATCH_ROWS.observe(n_scored, "forecast")
+    record_levels(scores["risk_level"].ravel())
+    return {
+        "forecast_id": req.forecast_id,
+        "model_version": version,
+        "zones": req.zones,
+        "hours": req.hours,
+        "mode": mode,
+        "cells_scored": n_scored,
+        "risk_score": np.round(scores["risk_score"], 2).tolist(),
+        "risk_level": scores["risk_level"].tolist(),
+        "drivers": scores["drivers"].tolist(),
+        "levels": RISK_LEVELS,
+        "driver_labels": DRIVER_LABELS,
+    }
+
+@app.post("/forecast", dependencies=[Depends(require_ready)])
+async def predict_forecast(req: ForecastRequest):
+    """
+    Score a zones x hours forecast tensor.
+
+    Returns [zone][hour] tensors: risk_score, risk_level (index into levels)
+    and drivers ([zone][hour][3] indices into driver_labels, -1 = none; all -1
+    means Normal Conditions). The first submission of a forecast_id is one
+    full vectorized pass; later ones rescore only the cells whose features
+    changed (see forecast.py), reported as mode / cells_scored.
+    """
+    if req.zones * req.hours > MAX_FORECAST_CELLS:
+        raise HTTPException(status_code=413, detail=f"Forecast exceeds {MAX_FORECAST_CELLS} cells")
+    try:
+        return await run_in_threadpool(render_forecast, req)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/forecast/stats")
+async def forecast_stats():
+    """Stored forecasts and full / incremental refresh counters."""
+    return forecast_store.stats()
+
+# Management zones (GeoJSON) for point -> zone risk lookups; loaded at startup
+ZONES_PATH = os.environ.get("GEOFIRENET_ZONES_PATH", DEFAULT_ZONES_PATH)
+MAX_LOOKUP_POINTS = 100_000
+# Current zone conditions shared by all workers (and kept across restarts)
+ZONE_CONDITIONS_PATH = os.environ.get(
+    "GEOFIRENET_ZONE_CONDITIONS_PATH", os.path.join(os.path.dirname(__file__), "zone_state", "conditions.npz"))
+zone_registry = ZoneRegistry()
+
+def load_zones():
+    global zone_registry
+    zone_registry = ZoneRegistry.load(ZONES_PATH, ZONE_CONDITIONS_PATH)
+
+class ZoneLookupRequest(BaseModel):
+    # [lon, lat] pairs (GeoJSON order)
+    points: list[tuple[float, float]]
+
+class ZoneConditions(WildfireFeatures):
+    zone_id: str
+
+def lookup_zones(points):
+    coords = np.array(points, dtype=np.float64).reshape(-1, 2)
+    # One snapshot: zone risk tables are kept per version
+    current, version = served
+    with STAGE_LATENCY.time("zone_lookup"):
+        return zone_registry.lookup(coords[:, 0], coords[:, 1], current, version)
+
+@app.post("/zones/lookup", dependencies=[Depends(require_ready)])
+async def zone_lookup(req: ZoneLookupRequest):
+    """
+    Zone containing each [lon, lat] point and that zone's current risk.
+
+    Parallel lists, one entry per point; None where the point is in no zone
+    (or the zone has no current conditions). Uses the grid index in zones.py.
+    """
+    if len(req.points) > MAX_LOOKUP_POINTS:
+        raise HTTPException(status_code=413, detail=f"Lookup exceeds {MAX_LOOKUP_POINTS} points")
+    return await run_in_threadpool(lookup_zones, req.points)
+
+@app.post("/zones/conditions", dependencies=[Depends(require_ready)])
+async def update_zone_conditions(rows: list[ZoneConditions]):
+    """Set current conditions for zones (shared with every worker); only those zones are rescored."""
+    registry = zone_registry
+    unknown = sorted({r.zone_id for r in rows} - registry.index_of.keys())
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown zones: {unknown[:10]}")
+    X = [[r.temp, r.humidity, r.wind, r.veg_moisture] for r in rows]
+    updated = await run_in_threadpool(registry.update_conditions, [r.zone_id for r in rows], X)
+    return {"updated": updated}
+
+@app.get("/zones")
+async def zone_stats():
+    """Registry size and index shape."""
+    registry = zone_registry
+    await run_in_threadpool(registry.sync)
+    return {"zones": len(registry), "grid": list(registry.grid_shape),
+            "with_conditions": int((~np.isnan(registry.conditions).any(axis=1)).sum())}
+
+# Sensitivity / partial-dependence surfaces (see sensitivity.py)
+sensitivity_engine = SurfaceEngine()
+model_listeners.append(sensitivity_engine.invalidate)
+
+class SensitivityRequest(BaseModel):
+    # One feature (curve) or two (surface, first feature along rows)
+    features: list[Literal["temp", "humidity", "wind", "veg_moisture"]] = Field(min_length=1, max_length=2)
+    kind: Literal["whatif", "pd"] = "whatif"
+    # Grid points: one count for every axis or one per feature
+    points: int | list[int] = DEFAULT_POINTS
+    # Optional (low, high) per feature; defaults to the contract range
+    ranges: dict[str, tuple[FiniteFloat, FiniteFloat]] = {}
+    # Scenario for "whatif" (features not on the grid are held here)
+    base: WildfireFeatures | None = None
+    # Background sample for "pd"
+    background_rows: int = Field(default=DEFAULT_BACKGROUND_ROWS, ge=1, le=MAX_BACKGROUND_ROWS)
+    seed: int = 0
+    # Force the exact forest even when a lookup-grid surrogate is available
+    precise: bool = False
+
+def model_spec(scorer):
+    """
+    How a sensitivity pool worker loads the served forest itself, pinned to
+    the sha256 of the bytes this process loaded (see sensitivity.load_scorer).
+    None scores in-process: the mock heuristic and the lookup-grid surrogate
+    are cheap, and forests of unknown origin cannot be reloaded faithfully.
+    """
+    sha = getattr(scorer, "sha256", None)
+    if scorer is None or isinstance(scorer, GridSurrogate) or sha is None:
+        return None
+    if FOREST_ENGINE == "flat":
+        return ("flat", MODEL_PATH, sha, FLAT_CACHE_DIR)
+    return ("sklearn", MODEL_PATH, sha)
+
+def render_sensitivity(req, grids):
+    current, version = served
+    scorer, engine = raster_model(current, req.precise)
+    base = req.base.model_dump() if req.base else None
+    # Cached by version and engine_key: a rebuilt surrogate grid fires no model listener
+    result = sensitivity_engine.surface(scorer, version, engine_key(scorer, engine), req.features, grids, base,
+                                        req.kind, req.background_rows, req.seed, model_spec(scorer))
+    response = {
+        "features": req.features,
+        "kind": req.kind,
+        "grid": {name: np.round(g, 4).tolist() for name, g in zip(req.features, grids)},
+        "values": np.round(result["values"], 2).tolist(),
+        "engine": engine,
+        "model_version": version,
+        "rows_scored": result["rows_scored"],
+        "seconds": result["seconds"],
+        "cached": result["cached"],
+    }
+    if req.kind == "pd":
+        response["std"] = np.round(result["std"], 2).tolist()
+    else:
+        response["base"] = base
+    return response
+
+@app.post("/sensitivity", dependencies=[Depends(require_ready)])
+async def sensitivity(req: SensitivityRequest):
+    """
+    What-if or partial-dependence curve / surface of the risk model over a
+    grid of one or two features, scored in one vectorized (or pooled) pass.
+    """
+    if len(set(req.features)) != len(req.features):
+        raise HTTPException(status_code=422, detail="Features must be distinct")
+    points = [req.points] * len(req.features) if isinstance(req.points, int) else req.points
+    if len(points) != len(req.features) or not all(2 <= n <= MAX_POINTS for n in points):
+        raise HTTPException(status_code=422,
+                            detail=f"points: one count per feature, each between 2 and {MAX_POINTS}")
+    if req.kind == "whatif" and req.base is None:
+        raise HTTPException(status_code=422, detail="A what-if surface needs a base scenario")
+    unknown = set(req.ranges) - set(req.features)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"ranges given for features not on the grid: {sorted(unknown)}")
+    try:
+        grids = [feature_grid(name, n, *req.ranges.get(name, (None, None))) for name, n in zip(req.features, points)]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    rows = math.prod(points) * (req.background_rows if req.kind == "pd" else 1)
+    if rows > MAX_SURFACE_ROWS:
+        raise HTTPException(status_code=413, detail=f"Surface needs {rows} rows (max {MAX_SURFACE_ROWS})")
+    with STAGE_LATENCY.time("sensitivity"):
+        return await run_in_threadpool(render_sensitivity, req, grids)
+
+@app.get("/sensitivity/stats")
+async def sensitivity_stats():
+    """Surface cache and process-pool counters."""
+    return sensitivity_engine.stats()
+
+# Risk tiles: disk cache bound, browser cache lifetime, weather snapshot file
+TILE_CACHE_DIR = os.environ.get(
+    "GEOFIRENET_TILE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "tile_cache"))
+TILE_CACHE_MB = float(os.environ.get("GEOFIRENET_TILE_CACHE_MB", "256"))
+TILE_MAX_AGE = int(os.environ.get("GEOFIRENET_TILE_MAX_AGE", "60"))
+tile_renderer = TileRenderer(TileCache(TILE_CACHE_DIR, int(TILE_CACHE_MB * 2**20)))
+model_listeners.append(tile_renderer.invalidate)
+weather_source = WeatherSource(os.path.join(TILE_CACHE_DIR, "weather.npz"))
+
+class TileWeatherRequest(BaseModel):
+    bbox: tuple[FiniteFloat, FiniteFloat, FiniteFloat, FiniteFloat] = Field(
+        description="min_lon, min_lat, max_lon, max_lat")
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+    # Same field encodings as /raster
+    base: dict[str, float] = {}
+    fields: dict[str, str | list[float]] = {}
+    offsets: dict[str, str | list[float]] = {}
+
+def tile_inputs(current):
+    """
+    (inputs, scorer, engine) for the served model `current`: the weather grid
+    if one is set, else the zone conditions.
+    """
+    grid = weather_source.current()
+    if grid is not None:
+        scorer, engine = raster_model(current, False)
+        return grid, scorer, engine
+    # Zone risk is shared with /zones/lookup, so it uses the served model
+    return ZoneInputs(zone_registry), current, "model"
+
+@app.get("/tiles/{z}/{x}/{y}", response_class=Response, dependencies=[Depends(require_ready)],
+         responses={200: {"content": {"image/png": {}}}, 304: {"description": "Not modified"}})
+async def risk_tile(z: int, x: int, y: int, request: Request):
+    """
+    256 x 256 PNG risk tile (Web Mercator XYZ) from the current inputs and model.
+
+    ETag / Last-Modified change only when the model, the inputs or the tile
+    format do; revalidations are answered with 304 without rendering.
+    """
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    current, version = served
+    inputs, scorer, engine = tile_inputs(current)
+    key = tile_renderer.key(version, engine_key(scorer, engine), inputs)
+    etag = tile_renderer.etag(key, z, x, y)
+    last_modified = tile_renderer.last_modified(inputs, engine_artifact(engine))
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={TILE_MAX_AGE}",
+        "X-Tile-Inputs": inputs.kind,
+    }
+    if not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    with STAGE_LATENCY.time("tile"):
+        body = await run_in_threadpool(tile_renderer.tile, key, inputs, scorer, version, z, x, y)
+    return Response(content=body, media_type="image/png", headers=headers)
+
+@app.post("/tiles/weather")
+async def set_tile_weather(req: TileWeatherRequest):
+    """Set the gridded weather snapshot tiles are rendered from (shared by all workers)."""
+    min_lon, min_lat, max_lon, max_lat = req.bbox
+    if not (min_lon < max_lon and min_lat < max_lat):
+        raise HTTPException(status_code=422, detail="bbox must be min_lon, min_lat, max_lon, max_lat")
+    if req.width * req.height > MAX_RASTER_CELLS:
+        raise HTTPException(status_code=413, detail=f"Grid exceeds {MAX_RASTER_CELLS} cells")
+    try:
+        X = build_feature_matrix(req.width, req.height, req.base, req.fields, req.offsets)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    grid = await run_in_threadpool(weather_source.set, GridInputs(X, req.width, req.height, req.bbox))
+    return {"inputs": grid.key, "cells": req.width * req.height}
+
+@app.delete("/tiles/weather")
+async def clear_tile_weather():
+    """Drop the weather snapshot: tiles fall back to the zone conditions."""
+    await run_in_threadpool(weather_source.clear)
+    return {"inputs": tile_inputs(model)[0].key}
+
+@app.get("/tiles/stats")
+async def tile_stats():
+    """Disk cache and rendering counters of this worker."""
+    return {**tile_renderer.stats(), "inputs": tile_inputs(model)[0].key}
+
+@app.post("/admin/reload")
+async def reload_model(x_admin_token: str | None = Header(default=None)):
+    """Load, smoke-test and atomically swap in the current model artifact."""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if supervisor_pid:
+        # Preforked: the parent loads the artifact once and recycles every
+        # worker onto it, so the new model is shared too
+        os.kill(supervisor_pid, signal.SIGHUP)
+        return {"swapped": None, "rolling_restart": True, **model_registry.stats()}
+    swapped = await run_in_threadpool(model_registry.reload)
+    return {"swapped": swapped, **model_registry.stats()}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Prediction cache counters (hits, misses, evictions) for sizing."""
+    return prediction_cache.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+startup_timings["import_s"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,363 @@
+import bisect
+import os
+import threading
+import time
+
+import numpy as np
+
+# In-process metrics for the API, exposed at /metrics in the Prometheus text
+# format.
+#
+# Counters and fixed-bucket histograms are plain Python ints behind one lock
+# per metric, so updating them on the request path costs a dict lookup and an
+# increment rather than a stdout write. Warnings that used to be printed per
+# request (input clamping, model fallbacks) go through RateLimitedLog, which
+# prints at most one aggregated line per key and interval. A gauge reports the
+# process's own RSS / PSS, so each preforked worker (serve.py) can be checked
+# for how much of the model it shares.
+#
+# Values are per process. Every exported series carries a pid label, so the
+# scrapes of different preforked workers never look like one counter going
+# up and down; sum over pid for the service totals.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans cache hits (~10 us) to large batches (seconds)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384, 65536)
+
+
+def _format_labels(names, values, extra=(), const=()):
+    pairs = list(const) + list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally keyed by a fixed tuple of label names."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self, const=()):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name + "_total", _format_labels(self.labelnames, labels, const=const), value
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative buckets on export, like Prometheus)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._bounds = np.asarray(self.buckets, dtype=np.float64)
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # labels -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def _get(self, labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return series
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._get(labels)
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_many(self, values, *labels):
+        """Vectorized observe for a batch of values."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        counts = np.bincount(np.searchsorted(self._bounds, values, side="left"),
+                             minlength=len(self.buckets) + 1).tolist()
+        total = float(values.sum())
+        with self._lock:
+            series = self._get(labels)
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += values.size
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self, const=()):
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                yield (self.name + "_bucket",
+                       _format_labels(self.labelnames, labels, [("le", _format_value(bound))], const),
+                       cumulative)
+            yield self.name + "_sum", _format_labels(self.labelnames, labels, const=const), total
+            yield self.name + "_count", _format_labels(self.labelnames, labels, const=const), count
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Gauge:
+    """Values sampled at render time from `collect() -> {label values: value}`."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, collect, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+
+    def samples(self, const=()):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, _format_labels(self.labelnames, labels, const=const), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self._register(Histogram(name, help_text, buckets, labelnames))
+
+    def gauge(self, name, help_text, collect, labelnames=()):
+        return self._register(Gauge(name, help_text, collect, labelnames))
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4); every series labelled with this pid."""
+        const = [("pid", os.getpid())]
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples(const):
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RateLimitedLog:
+    """
+    Aggregating warning log: at most one line per key every `interval` seconds.
+
+    Events in between are counted and reported with the next line, e.g.
+    "WARNING: Clamping temp input to [0, 50] x1532 in the last 10.0s (last: 71.2)".
+    A window that ends in silence is reported by a timer when it closes, and
+    flush() reports whatever is still pending (at shutdown).
+    """
+
+    def __init__(self, interval=10.0, emit=print):
+        self.interval = interval
+        self.emit = emit
+        self._pending = {}  # key -> [count, last detail, window start, message]
+        self._lock = threading.Lock()
+
+    def warn(self, key, message, detail=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                # First event of a window is reported immediately
+                self._pending[key] = [0, None, now, message]
+                line = f"WARNING: {message}" + (f" ({detail})" if detail is not None else "")
+            else:
+                entry[0] += 1
+                entry[1] = detail
+                entry[3] = message
+                if now - entry[2] < self.interval:
+                    if entry[0] == 1:
+                        self._schedule(key, entry, entry[2] + self.interval - now)
+                    return
+                line = self._summary(entry, now)
+                self._pending[key] = [0, None, now, message]
+        self.emit(line)
+
+    def _schedule(self, key, entry, delay):
+        timer = threading.Timer(delay, self._close_window, (key, entry))
+        timer.daemon = True
+        timer.start()
+
+    def _close_window(self, key, entry):
+        """Timer: report the window's count unless a later event already did."""
+        with self._lock:
+            if self._pending.get(key) is not entry or not entry[0]:
+                return
+            del self._pending[key]
+            line = self._summary(entry, time.monotonic())
+        self.emit(line)
+
+    def flush(self):
+        """Report every pending count now and start fresh windows."""
+        now = time.monotonic()
+        with self._lock:
+            lines = [self._summary(entry, now) for entry in self._pending.values() if entry[0]]
+            self._pending.clear()
+        for line in lines:
+            self.emit(line)
+
+    @staticmethod
+    def _summary(entry, now):
+        count, detail, start, message = entry
+        suffix = f" (last: {detail})" if detail is not None else ""
+        return f"WARNING: {message} x{count} in the last {now - start:.1f}s{suffix}"
+
+
+# --- Service metrics -------------------------------------------------------
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "geofirenet_request_duration_seconds", "HTTP request latency by route",
+    labelnames=("method", "route", "status"))
+STAGE_LATENCY = REGISTRY.histogram(
+    "geofirenet_stage_duration_seconds", "Latency of internal scoring stages",
+    labelnames=("stage",))
+BATCH_ROWS = REGISTRY.histogram(
+    "geofirenet_batch_rows", "Rows per vectorized scoring call",
+    buckets=BATCH_SIZE_BUCKETS, labelnames=("source",))
+CLAMPS = REGISTRY.counter(
+    "geofirenet_input_clamped", "Input values clamped to the contract range",
+    labelnames=("feature",))
+MODEL_FALLBACKS = REGISTRY.counter(
+    "geofirenet_model_fallback", "Model predictions that fell back to the heuristic",
+    labelnames=("reason",))
+RISK_LEVELS_SERVED = REGISTRY.counter(
+    "geofirenet_predictions", "Predictions served by risk level",
+    labelnames=("level",))
+
+
+# /proc/<pid>/smaps_rollup field -> reported name. PSS charges each shared
+# page 1/N to each of the N processes mapping it, so summing PSS over the
+# workers gives their real combined footprint, unlike summing RSS.
+MEMORY_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+}
+
+
+def process_memory(pid="self"):
+    """RSS / PSS breakdown of a process in bytes (Linux); {} where unavailable."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+    usage = {}
+    for line in lines:
+        key, _, rest = line.partition(":")
+        if key in MEMORY_FIELDS:
+            usage[MEMORY_FIELDS[key]] = int(rest.split()[0]) * 1024  # kB
+    return usage
+
+
+PROCESS_MEMORY = REGISTRY.gauge(
+    "geofirenet_process_memory_bytes", "Memory of the serving process (RSS / PSS breakdown)",
+    lambda: {(kind,): value for kind, value in process_memory().items()},
+    labelnames=("kind",))
+
+warnings_log = RateLimitedLog()
+
+
+def record_clamp(feature, value, low, high, count=1):
+    CLAMPS.inc(feature, amount=count)
+    warnings_log.warn(("clamp", feature), f"Clamping {feature} input to [{low}, {high}]", value)
+
+
+def record_fallback(reason, error, count=1):
+    MODEL_FALLBACKS.inc(reason, amount=count)
+    warnings_log.warn(("fallback", reason), f"Model prediction failed, using heuristic [{reason}]", error)
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Route templates keep label cardinality bounded
+            path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], path, str(status[0]))
@@ -0,0 +1,92 @@
+import asyncio
+from collections import deque
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-row requests into one vectorized call.
+
+    `submit(item)` queues the item and waits. A collector task takes up to
+    `max_batch_size` queued items, waiting at most `max_wait_ms` after the
+    first one for more to arrive, and runs `score_fn(items) -> results` in a
+    worker thread so the event loop never blocks on the model. Each caller's
+    future is resolved with its own row's result.
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=2.0, max_in_flight=2):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_in_flight = max_in_flight
+        self.batches = 0
+        self.rows = 0
+        self._loop = None
+        self._collector = None
+
+    def _ensure_collector(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._collector is not None and not self._collector.done():
+            return
+        # (Re)bind to the running loop, e.g. first request or a new test client
+        self._loop = loop
+        self._pending = deque()
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._collector = loop.create_task(self._collect())
+
+    async def submit(self, item):
+        self._ensure_collector()
+        future = self._loop.create_future()
+        self._pending.append((item, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _collect(self):
+        while True:
+            await self._has_items.wait()
+            if len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [self._pending.popleft()
+                     for _ in range(min(self.max_batch_size, len(self._pending)))]
+            if len(self._pending) < self.max_batch_size:
+                self._batch_full.clear()
+            if not self._pending:
+                self._has_items.clear()
+
+            await self._slots.acquire()
+            self._loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        try:
+            items = [item for item, _ in batch]
+            try:
+                results = await self._loop.run_in_executor(None, self.score_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+import time
+
+from forest_engine import file_sha256
+
+# The trained model is written once, as backend/model.pkl, next to a small
+# manifest recording its SHA-256 and how it was produced. Consumers (the API,
+# the prototype dashboard, tools) load that single file and reference it by
+# hash instead of keeping their own copies.
+
+DEFAULT_ARTIFACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+
+
+def manifest_path(artifact_path):
+    """<name>_manifest.json next to the artifact (model.pkl -> model_manifest.json)."""
+    stem = os.path.splitext(os.path.abspath(artifact_path))[0]
+    return f"{stem}_manifest.json"
+
+
+def _atomic_write(path, write_fn, mode="wb"):
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write_fn(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_artifact(model, artifact_path=DEFAULT_ARTIFACT, metadata=None):
+    """
+    Serialize `model` once, atomically, and record its hash in the manifest.
+    Returns the artifact's SHA-256.
+    """
+    import joblib
+    os.makedirs(os.path.dirname(os.path.abspath(artifact_path)), exist_ok=True)
+    _atomic_write(artifact_path, lambda f: joblib.dump(model, f))
+    sha = file_sha256(artifact_path)
+    manifest = {
+        "artifact": os.path.basename(artifact_path),
+        "sha256": sha,
+        "size_bytes": os.path.getsize(artifact_path),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **(metadata or {}),
+    }
+    _atomic_write(manifest_path(artifact_path), lambda f: json.dump(manifest, f, indent=4), mode="w")
+    return sha
+
+
+def read_manifest(artifact_path=DEFAULT_ARTIFACT):
+    """Manifest dict for the artifact, or None if it was not written by train_model.py."""
+    path = manifest_path(artifact_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("artifact") != os.path.basename(artifact_path):
+        return None
+    return manifest
+
+
+def verify_artifact(artifact_path=DEFAULT_ARTIFACT, sha=None):
+    """
+    Check the artifact against its manifest hash.
+    Returns the manifest (None if there is none); raises ValueError on mismatch.
+    """
+    manifest = read_manifest(artifact_path)
+    if manifest is None:
+        return None
+    sha = sha or file_sha256(artifact_path)
+    if sha != manifest["sha256"]:
+        raise ValueError(f"{artifact_path} (sha256 {sha[:12]}) does not match "
+                         f"{os.path.basename(manifest_path(artifact_path))} (sha256 {manifest['sha256'][:12]})")
+    return manifest
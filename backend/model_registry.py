@@ -0,0 +1,124 @@
+import os
+import threading
+
+import numpy as np
+
+# Fixed inputs every candidate model must score sanely before it is served:
+# the verify_scenarios.py scenarios plus the corners of the input contract.
+SMOKE_ROWS = np.array([
+    [45.0, 5.0, 60.0, 0.05],    # Extreme Drought
+    [15.0, 80.0, 10.0, 0.9],    # Wet Season
+    [25.0, 40.0, 20.0, 0.5],    # Medium Transition
+    [50.0, 0.0, 100.0, 0.0],    # Max Disaster
+    [0.0, 100.0, 0.0, 1.0],     # Absolute Zero Risk
+    [30.0, 20.0, 40.0, 0.3],
+])
+
+
+def validate_model(model, rows=SMOKE_ROWS):
+    """Raise ValueError unless the model returns one finite 0-100 score per row."""
+    if model is None:
+        return
+    scores = np.asarray(model.predict(rows), dtype=np.float64)
+    if scores.shape != (len(rows),):
+        raise ValueError(f"Smoke test: expected {len(rows)} scores, got shape {scores.shape}")
+    if not np.isfinite(scores).all():
+        raise ValueError("Smoke test: model returned non-finite scores")
+    if scores.min() < 0.0 or scores.max() > 100.0:
+        raise ValueError(f"Smoke test: scores outside [0, 100]: {scores.min():.2f}..{scores.max():.2f}")
+
+
+class ModelRegistry:
+    """
+    Background reloading of the served model.
+
+    `load_fn() -> (model, version)` builds a candidate, `validate_model`
+    smoke-tests it, and only then `swap_fn(model, version)` publishes it with
+    a single reference assignment. Requests read the model reference once,
+    so each one runs entirely on the old or entirely on the new model.
+
+    With a poll interval > 0 a daemon thread watches `artifact_path` and
+    reloads once a changed file has stopped changing (writer finished).
+    """
+
+    def __init__(self, load_fn, swap_fn, artifact_path, poll_interval=5.0):
+        self.load_fn = load_fn
+        self.swap_fn = swap_fn
+        self.artifact_path = artifact_path
+        self.poll_interval = poll_interval
+        self.version = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.artifact_path())
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def reload(self):
+        """Load, validate and swap in the current artifact. Returns True if swapped."""
+        with self._lock:
+            self._signature = self._stat()
+            try:
+                model, version = self.load_fn()
+                if version == self.version:
+                    return False
+                validate_model(model)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Model reload rejected, keeping version {self.version}: {e}")
+                return False
+
+            self.swap_fn(model, version)
+            self.version = version
+            self.reloads += 1
+            self.last_error = None
+            print(f"Model swapped to version {version}")
+            return True
+
+    def check_for_update(self):
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        # Wait one more poll if the file is still being written
+        self._stop.wait(min(self.poll_interval, 1.0))
+        if self._stat() != signature:
+            return False
+        return self.reload()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                print(f"Model watcher error: {e}")
+
+    def start(self):
+        if self.poll_interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watching": bool(self._thread and self._thread.is_alive()),
+            "poll_interval": self.poll_interval,
+        }
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+from scoring import FEATURE_SCALE
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache for /predict responses.
+
+    Keys are the (temp, humidity, wind, veg_moisture) tuple quantized to
+    `quantum` of each feature's contract range, so stations re-sending the
+    same (or nearly the same) readings skip the forest and driver work.
+    Rows falling in one bucket share the first computed response.
+    """
+
+    def __init__(self, maxsize=50_000, quantum=1e-4):
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self._inv_step = tuple(1.0 / (s * quantum) for s in FEATURE_SCALE) if quantum > 0 else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def key(self, temp, humidity, wind, veg_moisture):
+        """Quantized cache key; values must be finite (WildfireFeatures rejects NaN / inf)."""
+        values = (temp, humidity, wind, veg_moisture)
+        if self._inv_step is None:
+            return values
+        return tuple(round(v * inv) for v, inv in zip(values, self._inv_step))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        """Store a response; skipped if it was computed for a stale model version."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, version=None):
+        """Drop every entry; called whenever the served model changes."""
+        with self._lock:
+            self._entries.clear()
+            self.version = version
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "quantum": self.quantum,
+                "model_version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
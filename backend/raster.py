@@ -0,0 +1,93 @@
+import base64
+import struct
+
+import numpy as np
+
+from scoring import FEATURE_NAMES, FEATURE_SCALE, risk_level_codes
+
+# Compact binary risk rasters.
+#
+# Layout (little-endian): a 48-byte header followed by height * width cells in
+# row-major order, row 0 being the northern edge of the bbox.
+#
+#   magic      4s   b"GFR1"
+#   version    B    1
+#   dtype      B    0 = float32 risk scores, 1 = uint8 risk classes
+#                   (index into RISK_LEVELS: Low, Moderate, High, Extreme)
+#   reserved   H
+#   width      I
+#   height     I
+#   bbox       4d   min_lon, min_lat, max_lon, max_lat
+
+MAGIC = b"GFR1"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHII4d")
+DTYPE_CODES = {"float32": 0, "class": 1}
+
+RASTER_MEDIA_TYPE = "application/vnd.geofirenet.raster"
+
+
+def decode_field(value, n_cells):
+    """A per-cell field: base64 little-endian float32 bytes or a JSON list."""
+    if isinstance(value, str):
+        arr = np.frombuffer(base64.b64decode(value), dtype="<f4")
+    else:
+        arr = np.asarray(value, dtype=np.float64).ravel()
+    if arr.size != n_cells:
+        raise ValueError(f"Field has {arr.size} cells, expected {n_cells}")
+    return arr.astype(np.float64)
+
+
+def build_feature_matrix(width, height, base=None, fields=None, offsets=None):
+    """
+    Assemble the (height * width, 4) feature matrix for a grid.
+
+    Each feature is taken from `fields` (absolute per-cell values) if given,
+    otherwise from the scalar in `base`, then per-cell `offsets` are added.
+    Values are clamped to the input contract ranges like the API validators;
+    NaN / inf values are rejected with ValueError, as the validators reject them.
+    """
+    n_cells = width * height
+    base = base or {}
+    fields = fields or {}
+    offsets = offsets or {}
+
+    X = np.empty((n_cells, len(FEATURE_NAMES)), dtype=np.float64)
+    for i, name in enumerate(FEATURE_NAMES):
+        if name in fields:
+            X[:, i] = decode_field(fields[name], n_cells)
+        elif name in base:
+            X[:, i] = base[name]
+        else:
+            raise ValueError(f"No base value or field for '{name}'")
+        if name in offsets:
+            X[:, i] += decode_field(offsets[name], n_cells)
+    if not np.isfinite(X).all():
+        bad = [name for name, ok in zip(FEATURE_NAMES, np.isfinite(X).all(axis=0)) if not ok]
+        raise ValueError(f"Non-finite (NaN / inf) values for {', '.join(bad)}")
+    np.clip(X, 0.0, FEATURE_SCALE, out=X)
+    return X
+
+
+def encode_raster(scores, width, height, bbox, fmt="float32"):
+    """Pack risk scores into the binary raster format."""
+    if fmt not in DTYPE_CODES:
+        raise ValueError(f"Unknown raster format '{fmt}'")
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[fmt], 0, width, height, *bbox)
+    if fmt == "class":
+        payload = risk_level_codes(scores).astype(np.uint8)
+    else:
+        payload = scores.astype("<f4")
+    return header + payload.tobytes()
+
+
+def decode_raster(data):
+    """Inverse of encode_raster: returns (header dict, (height, width) array)."""
+    magic, version, dtype_code, _, width, height, *bbox = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a GeoFireNet raster")
+    dtype = np.uint8 if dtype_code == DTYPE_CODES["class"] else np.dtype("<f4")
+    cells = np.frombuffer(data, dtype=dtype, offset=HEADER.size).reshape(height, width)
+    header = {"width": width, "height": height, "bbox": tuple(bbox),
+              "format": "class" if dtype_code == DTYPE_CODES["class"] else "float32"}
+    return header, cells
@@ -0,0 +1,108 @@
+try:
+    import numpy as np
+except ImportError:  # scalar backend only
+    np = None
+
+# The one implementation of the heuristic risk formula.
+#
+#   normalise:   n = clamp(x / scale, 0, 1)       scale = 50, 100, 100, 1
+#   linear:      (40 * nT) + (20 * nW) - (30 * nH) - (30 * nV) + 40   (WEIGHTS, INTERCEPT)
+#   baseline:    clamp(linear, 0, 100)
+#   interaction: nT > 0.8 and nW > 0.7  ->  +20 (Heat+Wind)
+#   fallback:    clamp(baseline + interaction boost, 0, 100)
+#
+# Two backends with identical float64 operations in identical order, so they
+# agree bit for bit (audit_kernel.py checks this, and the API, on large random
+# and edge-case samples):
+#   - scalar (*_row functions): plain Python floats, no dependencies, for
+#     per-row paths and environments without NumPy;
+#   - array (the rest): NumPy over (N, 4) matrices for batch work.
+# Every scorer (API, batch / raster / forecast scoring, prototype dashboard,
+# evaluation and stress scripts) calls into this module.
+
+FEATURE_SCALE_ROW = (50.0, 100.0, 100.0, 1.0)
+WEIGHTS = {"temp": 40, "humidity": -30, "wind": 20, "veg": -30}
+INTERCEPT = 40
+# WEIGHTS in feature order (temp, humidity, wind, veg)
+WEIGHT_ROW = (WEIGHTS["temp"], WEIGHTS["humidity"], WEIGHTS["wind"], WEIGHTS["veg"])
+INTERACTION_TEMP = 0.8
+INTERACTION_WIND = 0.7
+INTERACTION_BOOST = 20
+
+
+# --- Scalar backend ------------------------------------------------------------
+
+def normalize_row(temp, humidity, wind, veg):
+    """(nT, nH, nW, nV) for one row, each clamped to [0, 1]."""
+    return tuple(min(max(v / s, 0.0), 1.0) for v, s in zip((temp, humidity, wind, veg), FEATURE_SCALE_ROW))
+
+
+def linear_row(n):
+    n_temp, n_hum, n_wind, n_veg = n
+    w_temp, w_hum, w_wind, w_veg = WEIGHT_ROW
+    # Summed temp, wind, humidity, veg in both backends (the order is part of bit-identity)
+    return (w_temp * n_temp) + (w_wind * n_wind) + (w_hum * n_hum) + (w_veg * n_veg) + INTERCEPT
+
+
+def baseline_row(n):
+    return max(0.0, min(linear_row(n), 100.0))
+
+
+def interaction_row(n):
+    return n[0] > INTERACTION_TEMP and n[2] > INTERACTION_WIND
+
+
+def boost_row(n):
+    return INTERACTION_BOOST if interaction_row(n) else 0
+
+
+def fallback_row(n, baseline=None):
+    """Heuristic plus the Heat+Wind boost (the no-model 'ML' score)."""
+    baseline = baseline_row(n) if baseline is None else baseline
+    return max(0.0, min(baseline + boost_row(n), 100.0))
+
+
+# --- Array backend -------------------------------------------------------------
+
+if np is not None:
+    FEATURE_SCALE = np.array(FEATURE_SCALE_ROW)
+
+    def normalize(X):
+        """(N, 4) normalised features, clamped to [0, 1] like normalize_row."""
+        return np.clip(np.asarray(X, dtype=np.float64) / FEATURE_SCALE, 0.0, 1.0)
+
+    def linear_scores(n):
+        w_temp, w_hum, w_wind, w_veg = WEIGHT_ROW
+        return (w_temp * n[:, 0]) + (w_wind * n[:, 2]) + (w_hum * n[:, 1]) + (w_veg * n[:, 3]) + INTERCEPT
+
+    def baseline_scores(n):
+        """Linear heuristic baseline, clamped to [0, 100]."""
+        return np.clip(linear_scores(n), 0.0, 100.0)
+
+    def interaction_mask(n):
+        """Rows in the Heat+Wind interaction regime."""
+        return (n[:, 0] > INTERACTION_TEMP) & (n[:, 2] > INTERACTION_WIND)
+
+    def interaction_boost(n):
+        return np.where(interaction_mask(n), INTERACTION_BOOST, 0)
+
+    def fallback_scores(n, baseline=None):
+        """Heuristic plus the Heat+Wind boost, clamped to [0, 100]."""
+        baseline = baseline_scores(n) if baseline is None else baseline
+        return np.clip(baseline + interaction_boost(n), 0.0, 100.0)
+
+
+# --- Dispatch ----------------------------------------------------------------------
+
+def heuristic(rows):
+    """Baseline scores for a (N, 4) matrix or a list of rows, on whichever backend is available."""
+    if np is not None:
+        return baseline_scores(normalize(np.asarray(rows, dtype=np.float64).reshape(-1, 4)))
+    return [baseline_row(normalize_row(*row)) for row in rows]
+
+
+def fallback(rows):
+    """Heuristic + interaction scores for a (N, 4) matrix or a list of rows."""
+    if np is not None:
+        return fallback_scores(normalize(np.asarray(rows, dtype=np.float64).reshape(-1, 4)))
+    return [fallback_row(normalize_row(*row)) for row in rows]
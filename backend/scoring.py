@@ -0,0 +1,91 @@
+import numpy as np
+
+from metrics import MODEL_FALLBACKS, record_fallback
+# Re-exported: callers import the driver table from scoring
+from drivers import (DRIVER_LABELS, NORMAL_CONDITIONS, MAX_DRIVERS, DRIVER_LIST_TABLE,
+                     top_drivers, pack_codes)
+# Re-exported: the heuristic itself lives in risk_kernel.py
+from risk_kernel import (FEATURE_SCALE, normalize, baseline_scores, interaction_mask,
+                         fallback_scores)
+
+# Vectorized version of the per-row scoring in main.py::predict_risk.
+# The heuristic comes from the array backend of risk_kernel, whose scalar
+# backend serves /predict, so each row of a batch is bit-identical to a
+# single /predict (audit_kernel.py).
+
+FEATURE_NAMES = ("temp", "humidity", "wind", "veg_moisture")
+
+RISK_LEVELS = ("Low", "Moderate", "High", "Extreme")
+RISK_THRESHOLDS = np.array([30.0, 50.0, 80.0])
+
+
+def as_feature_matrix(X):
+    """Coerce input rows to a (N, 4) float64 matrix."""
+    X = np.asarray(X, dtype=np.float64)
+    return X.reshape(-1, len(FEATURE_NAMES))
+
+
+def ml_scores(X, model, baseline, n):
+    """Forest scores for a batch, falling back to the heuristic like /predict."""
+    if model:
+        try:
+            raw = np.asarray(model.predict(X), dtype=np.float64)
+            return np.clip(raw, 0.0, 100.0)
+        except Exception as e:
+            record_fallback("exception", e, count=len(baseline))
+            return baseline.copy()
+
+    # Fallback Mock ML logic (Simulates model behavior)
+    MODEL_FALLBACKS.inc("no_model", amount=len(baseline))
+    return fallback_scores(n, baseline)
+
+
+def risk_scores(X, model):
+    """ML risk scores only (no baseline levels or drivers), e.g. for rasters."""
+    X = as_feature_matrix(X)
+    n = normalize(X)
+    return ml_scores(X, model, baseline_scores(n), n)
+
+
+def risk_level_codes(scores):
+    """Index into RISK_LEVELS for each score."""
+    return np.searchsorted(RISK_THRESHOLDS, scores, side="right")
+
+
+def score_batch(X, model):
+    """Score N feature rows in one vectorized pass.
+
+    Returns a dict of arrays: risk_score, risk_level, baseline_score,
+    baseline_level (level codes) and drivers (N x 3 int8 driver codes, see drivers.py).
+    """
+    X = as_feature_matrix(X)
+    n = normalize(X)
+    baseline = baseline_scores(n)
+    ml = ml_scores(X, model, baseline, n)
+    return {
+        "risk_score": ml,
+        "risk_level": risk_level_codes(ml),
+        "baseline_score": baseline,
+        "baseline_level": risk_level_codes(baseline),
+        "drivers": top_drivers(n),
+    }
+
+
+def to_predictions(scores):
+    """Convert score_batch output to RiskPrediction-shaped dicts."""
+    predictions = []
+    for ml, ml_level, base, base_level, packed in zip(
+        scores["risk_score"].tolist(),
+        scores["risk_level"].tolist(),
+        scores["baseline_score"].tolist(),
+        scores["baseline_level"].tolist(),
+        pack_codes(scores["drivers"]).tolist(),
+    ):
+        predictions.append({
+            "risk_score": round(ml, 2),
+            "risk_level": RISK_LEVELS[ml_level],
+            "baseline_score": round(base, 2),
+            "baseline_level": RISK_LEVELS[base_level],
+            "primary_drivers": list(DRIVER_LIST_TABLE[packed]),
+        })
+    return predictions
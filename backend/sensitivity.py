@@ -0,0 +1,251 @@
+import hashlib
+import io
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from eval_core import uniform_samples
+from scoring import FEATURE_NAMES, FEATURE_SCALE, risk_scores
+
+# Sensitivity surfaces: what-if and partial-dependence curves (1-D) and
+# surfaces (2-D) of the risk model over a grid of one or two features.
+#
+#   whatif  risk at each grid point with the other features held at `base`
+#           (one row per grid point, an ICE slice through one scenario)
+#   pd      partial dependence: the mean risk over a fixed background sample
+#           with the grid features overwritten (grid points x background
+#           rows); "std" is the spread across that sample
+#
+# The whole grid is one feature matrix scored in vectorized batches. Large
+# matrices are split into chunks scored on a process pool; the workers load
+# the forest themselves from a small picklable spec (flat forests through the
+# memory-mapped export, so they share its pages) and are kept for the next
+# surface until the model changes. The spec carries the sha256 of the bytes
+# the server loaded, and a worker refuses an artifact on disk that differs
+# (replaced but not swapped in yet, or rejected on reload): the surface is
+# then scored in-process with the served model instead. Results are cached
+# per model version and engine (the caller's engine key identifies a surrogate
+# grid too) in a bounded LRU; a model swap drops the cache and pool.
+
+# Points per grid axis
+DEFAULT_POINTS = 50
+MAX_POINTS = 400
+# Background rows per grid point for partial dependence
+DEFAULT_BACKGROUND_ROWS = 64
+MAX_BACKGROUND_ROWS = 1024
+# Largest feature matrix one surface may score (grid points x background rows)
+MAX_SURFACE_ROWS = 4_000_000
+# Rows per pool task, and the size below which scoring stays in-process.
+# In-process, the forest scores about 60k rows/s per core, so what-if
+# surfaces (one row per grid point, 40k at 200 x 200) stay local; the pool is
+# for partial dependence, e.g. 200 x 200 points x 64 background rows = 2.56M
+# rows, 52 tasks. Pool start-up (spawn, imports, model load) takes a second
+# or two, paid once per model version.
+CHUNK_ROWS = 50_000
+PARALLEL_MIN_ROWS = int(os.environ.get("GEOFIRENET_SENSITIVITY_PARALLEL_MIN_ROWS", "100000"))
+
+WORKERS = int(os.environ.get("GEOFIRENET_SENSITIVITY_WORKERS", str(os.cpu_count() or 1)))
+CACHE_SIZE = int(os.environ.get("GEOFIRENET_SENSITIVITY_CACHE_SIZE", "32"))
+
+
+def feature_grid(name, points=DEFAULT_POINTS, low=None, high=None):
+    """
+    `points` evenly spaced values of feature `name`, by default over its whole
+    contract range; raises ValueError unless low < high once clipped to it.
+    """
+    i = FEATURE_NAMES.index(name)
+    low = 0.0 if low is None else max(low, 0.0)
+    high = FEATURE_SCALE[i].item() if high is None else min(high, FEATURE_SCALE[i].item())
+    if not low < high:
+        raise ValueError(f"{name}: range [{low}, {high}] is empty within the contract range")
+    return np.linspace(low, high, points)
+
+
+def background_sample(rows, seed=0):
+    """Fixed pseudo-random sample of the input space the forest was trained on."""
+    return uniform_samples(rows, np.random.default_rng(seed))
+
+
+def surface_matrix(features, grids, base=None, background=None):
+    """
+    Feature matrix for a surface: one row per grid point (first feature
+    varying slowest) copying `base`, or with `background`, len(background)
+    rows per grid point copying the sample. Grid features are overwritten.
+    """
+    mesh = np.meshgrid(*grids, indexing="ij")
+    n_points = mesh[0].size
+    if background is None:
+        X = np.tile(np.array([base[name] for name in FEATURE_NAMES], dtype=np.float64), (n_points, 1))
+        repeat = 1
+    else:
+        X = np.tile(background, (n_points, 1))
+        repeat = len(background)
+    for name, values in zip(features, mesh):
+        X[:, FEATURE_NAMES.index(name)] = np.repeat(values.ravel(), repeat)
+    return np.clip(X, 0.0, FEATURE_SCALE, out=X)
+
+
+# --- Process pool workers --------------------------------------------------
+
+_worker_model = {}
+
+
+def load_scorer(spec):
+    """
+    Model from a picklable spec: ("flat", model_path, sha256, cache_dir),
+    ("sklearn", model_path, sha256) or ("mock",). Raises ValueError when the
+    artifact on disk is not the one with that sha256.
+    """
+    kind = spec[0]
+    if kind == "mock":
+        return None
+    path, sha = spec[1], spec[2]
+    if kind == "flat":
+        from forest_engine import load_serving_forest
+        model, loaded = load_serving_forest(path, spec[3])
+        # Pool chunks are large: wait for the sklearn half if it is enabled (forest_engine.HybridForest)
+        getattr(model, "wait", lambda: None)()
+    else:
+        import joblib
+        with open(path, "rb") as f:
+            data = f.read()
+        loaded = hashlib.sha256(data).hexdigest()
+        model = joblib.load(io.BytesIO(data)) if loaded == sha else None
+    if loaded != sha:
+        raise ValueError(f"{path} on disk ({loaded[:12]}) is not the served model ({sha[:12]})")
+    return model
+
+
+def _init_worker(spec):
+    _worker_model["model"] = load_scorer(spec)
+
+
+def _score_chunk(X):
+    return risk_scores(X, _worker_model["model"])
+
+
+# --- Engine ------------------------------------------------------------------
+
+class SurfaceEngine:
+    """Computes, parallelises and caches sensitivity surfaces. Thread-safe."""
+
+    def __init__(self, workers=WORKERS, cache_size=CACHE_SIZE, parallel_min_rows=PARALLEL_MIN_ROWS):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.parallel_min_rows = parallel_min_rows
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_key = None
+        self._failed_specs = set()
+        self.hits = 0
+        self.misses = 0
+        self.rows_scored = 0
+        self.parallel_surfaces = 0
+        self.pool_fallbacks = 0
+
+    def _pool_for(self, spec):
+        if self._pool_key != spec:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: never fork the threaded API process
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(spec,))
+            self._pool_key = spec
+        return self._pool
+
+    def score(self, X, model, spec=None):
+        """
+        Risk scores for X: in-process, or over the pool for large matrices
+        when `spec` says how workers load the same model.
+        """
+        if (spec is None or self.workers <= 1 or len(X) < self.parallel_min_rows
+                or spec in self._failed_specs):
+            return risk_scores(X, model)
+        chunks = np.array_split(X, math.ceil(len(X) / CHUNK_ROWS))
+        with self._lock:
+            pool = self._pool_for(spec)
+        try:
+            scores = np.concatenate(list(pool.map(_score_chunk, chunks)))
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Worker start-up failed (e.g. the artifact on disk is not the served
+            # model) or a model swap shut the pool down mid-surface
+            print(f"Warning: sensitivity pool unavailable ({type(e).__name__}: {e}); scoring in-process")
+            with self._lock:
+                self.pool_fallbacks += 1
+                if self._pool is pool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool, self._pool_key = None, None
+                    self._failed_specs.add(spec)
+            return risk_scores(X, model)
+        with self._lock:
+            self.parallel_surfaces += 1
+        return scores
+
+    def surface(self, model, version, engine, features, grids, base=None, kind="whatif",
+                background_rows=DEFAULT_BACKGROUND_ROWS, seed=0, spec=None):
+        """
+        {"values": risk over the grid (points,) or (points_a, points_b),
+        "std" (pd only), "rows_scored", "seconds", "cached"}.
+        """
+        grids = [np.asarray(g, dtype=np.float64) for g in grids]
+        base_key = None if kind == "pd" else tuple(float(base[n]) for n in FEATURE_NAMES)
+        key = (version, engine, kind, tuple(features), tuple(g.tobytes() for g in grids), base_key,
+               (background_rows, seed) if kind == "pd" else None)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return {**result, "cached": True}
+            self.misses += 1
+
+        start = time.perf_counter()
+        shape = tuple(len(g) for g in grids)
+        background = background_sample(background_rows, seed) if kind == "pd" else None
+        X = surface_matrix(features, grids, base, background)
+        scores = self.score(X, model, spec)
+        if kind == "pd":
+            per_point = scores.reshape(-1, background_rows)
+            result = {"values": per_point.mean(axis=1).reshape(shape), "std": per_point.std(axis=1).reshape(shape)}
+        else:
+            result = {"values": scores.reshape(shape)}
+        result.update(rows_scored=len(X), seconds=round(time.perf_counter() - start, 4))
+
+        with self._lock:
+            self.rows_scored += len(X)
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {**result, "cached": False}
+
+    def invalidate(self, version=None):
+        """Model swapped: drop cached surfaces and the pool (its workers hold the old model)."""
+        with self._lock:
+            self._cache.clear()
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool, self._pool_key = None, None
+            self._failed_specs.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "surfaces": len(self._cache),
+                "max_surfaces": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rows_scored": self.rows_scored,
+                "parallel_surfaces": self.parallel_surfaces,
+                "pool_fallbacks": self.pool_fallbacks,
+                "workers": self.workers,
+                "pool_running": self._pool is not None,
+            }
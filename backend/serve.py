@@ -0,0 +1,307 @@
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import numpy as np
+import uvicorn
+
+import main
+from forest_engine import PREFORK_SKLEARN_MIN_ROWS
+from metrics import process_memory
+
+# Preforked multi-worker serving.
+#
+# The parent process imports the API, loads and warms the model once, binds
+# the listening socket and then forks the workers. Each worker runs its own
+# uvicorn event loop on the inherited socket (the kernel spreads connections
+# across them), so throughput scales with cores and one slow forest call only
+# blocks its own worker. Model arrays, zone tables and imported modules are
+# shared copy-on-write with the parent: the heap is gc.freeze()-d before
+# forking so the workers' garbage collector never touches (and so never
+# copies) those pages, and the flat forest is a read-only mmap anyway.
+# State that changes while serving (the tile weather snapshot, zone
+# conditions) lives in files every worker checks on read, so a write to any
+# worker reaches all of them and survives recycling. Metrics stay per worker,
+# labelled by pid.
+#
+# Workers are recycled gracefully: after --max-requests (+ random jitter, so
+# they do not all restart at once) a worker stops accepting, finishes its
+# in-flight requests and exits; the parent forks a replacement, which is
+# ready immediately because the model is already in memory. SIGHUP (or
+# POST /admin/reload on any worker) reloads the artifact in the parent and
+# replaces every worker, new ones first; the parent also watches the artifact
+# like the single-process server does. SIGUSR1 prints a memory report, which
+# is also printed every --memory-interval seconds: RSS and PSS per process
+# (PSS splits shared pages between the processes mapping them, so the PSS
+# total is the real footprint; RSS counts shared pages once per worker).
+#
+# Usage:
+#   python serve.py --workers 4
+#   python serve.py --workers 8 --max-requests 50000 --max-requests-jitter 5000
+#   GEOFIRENET_WORKERS=4 python serve.py --port 8080
+
+WORKERS = int(os.environ.get("GEOFIRENET_WORKERS", str(os.cpu_count() or 1)))
+# Requests before a worker is recycled (0 = never)
+MAX_REQUESTS = int(os.environ.get("GEOFIRENET_WORKER_MAX_REQUESTS", "0"))
+MAX_REQUESTS_JITTER = int(os.environ.get("GEOFIRENET_WORKER_MAX_REQUESTS_JITTER", "0"))
+# Seconds a stopping worker gets to finish in-flight requests
+GRACEFUL_TIMEOUT = float(os.environ.get("GEOFIRENET_GRACEFUL_TIMEOUT", "30"))
+# Large batches go to the sklearn forest, loaded once here and shared copy-on-write
+SKLEARN_MIN_ROWS = int(os.environ.get("GEOFIRENET_SKLEARN_MIN_ROWS", str(PREFORK_SKLEARN_MIN_ROWS)))
+# Seconds between memory reports (0 = only on SIGUSR1)
+MEMORY_REPORT_INTERVAL = float(os.environ.get("GEOFIRENET_MEMORY_REPORT_INTERVAL", "300"))
+# A worker exiting sooner than this after its start is treated as a crash loop
+MIN_WORKER_UPTIME = 1.0
+POLL_INTERVAL = 0.2
+
+
+def bind_socket(host, port, backlog=2048):
+    """Listening socket created once in the parent and inherited by every worker."""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def freeze_heap():
+    """Move every live object to the permanent GC generation before forking."""
+    # A HybridForest still loading its sklearn half on a thread would lose it
+    # in the children (threads do not survive fork); finish it here, once
+    wait = getattr(main.model, "wait", None)
+    if wait is not None:
+        wait()
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock, max_requests, log_level):
+    """Body of a forked worker: serve the inherited socket until told to stop."""
+    # uvicorn installs its own SIGINT / SIGTERM handlers; drop the parent's
+    for sig in (signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    # Forked children start with the parent's RNG state
+    random.seed()
+    np.random.seed()
+    # The parent watches the artifact and recycles workers onto new models
+    main.model_registry.poll_interval = 0
+    config = uvicorn.Config(main.app, log_level=log_level, limit_max_requests=max_requests or None,
+                            timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Worker:
+    def __init__(self, slot, pid, max_requests):
+        self.slot = slot
+        self.pid = pid
+        self.max_requests = max_requests
+        self.started = time.monotonic()
+
+
+class Supervisor:
+    """Forks, reaps, recycles and reports on the worker processes."""
+
+    def __init__(self, sock, workers=WORKERS, max_requests=MAX_REQUESTS, max_requests_jitter=MAX_REQUESTS_JITTER,
+                 memory_interval=MEMORY_REPORT_INTERVAL, log_level="warning"):
+        self.sock = sock
+        self.n_workers = max(1, workers)
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.memory_interval = memory_interval
+        self.log_level = log_level
+        self.workers = {}      # pid -> Worker
+        self.retiring = set()  # pids told to stop; not replaced when they exit
+        self.recycled = 0
+        self.crashed = 0
+        self._stopping = False
+        self._reload_requested = False
+        self._report_requested = False
+
+    # --- Workers ---------------------------------------------------------------
+
+    def spawn(self, slot):
+        max_requests = 0
+        if self.max_requests > 0:
+            max_requests = self.max_requests + random.randint(0, max(self.max_requests_jitter, 0))
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, max_requests, self.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.workers[pid] = Worker(slot, pid, max_requests)
+        return pid
+
+    def reap(self):
+        """Collect exited workers; replace the ones that were not retired on purpose."""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if self._stopping:
+                continue
+            if code == 0:
+                # Reached max requests and drained: graceful recycle
+                self.recycled += 1
+            else:
+                self.crashed += 1
+                print(f"[serve] Worker {worker.slot} (pid {pid}) exited with code {code}, restarting")
+                if time.monotonic() - worker.started < MIN_WORKER_UPTIME:
+                    time.sleep(MIN_WORKER_UPTIME)
+            self.spawn(worker.slot)
+
+    def recycle_all(self):
+        """Rolling restart: fork every replacement first, then let the old workers drain."""
+        old = [w for w in self.workers.values() if w.pid not in self.retiring]
+        for worker in old:
+            self.spawn(worker.slot)
+        for worker in old:
+            self.retiring.add(worker.pid)
+            self._signal(worker.pid, signal.SIGTERM)
+        print(f"[serve] Recycling {len(old)} workers onto model {main.model_version}")
+
+    def reload(self):
+        """Reload the artifact in the parent (if it changed) and move the workers onto it."""
+        main.model_registry.reload()
+        freeze_heap()
+        self.recycle_all()
+
+    # --- Reporting -----------------------------------------------------------------
+
+    def memory_report(self):
+        """[(name, pid, usage bytes)] for the parent and every worker, printed as a table."""
+        rows = [("parent", os.getpid(), process_memory(os.getpid()))]
+        for worker in sorted(self.workers.values(), key=lambda w: (w.slot, w.started)):
+            if worker.pid not in self.retiring:
+                rows.append((f"worker {worker.slot}", worker.pid, process_memory(worker.pid)))
+        mb = lambda usage, key: usage.get(key, 0) / 1e6  # noqa: E731
+        print(f"[serve] {'process':<10} {'pid':>7} {'RSS MB':>8} {'PSS MB':>8} {'shared MB':>10} {'private MB':>11}")
+        for name, pid, usage in rows:
+            shared = mb(usage, "shared_clean") + mb(usage, "shared_dirty")
+            private = mb(usage, "private_clean") + mb(usage, "private_dirty")
+            print(f"[serve] {name:<10} {pid:>7} {mb(usage, 'rss'):>8.1f} {mb(usage, 'pss'):>8.1f} "
+                  f"{shared:>10.1f} {private:>11.1f}")
+        rss = sum(mb(u, "rss") for _, _, u in rows)
+        pss = sum(mb(u, "pss") for _, _, u in rows)
+        print(f"[serve] total RSS {rss:.1f} MB, PSS {pss:.1f} MB "
+              f"({rss - pss:.1f} MB counted more than once in RSS, i.e. shared)")
+        return rows
+
+    # --- Main loop -------------------------------------------------------------------
+
+    def _signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _install_signals(self):
+        def stop(signum, frame):
+            self._stopping = True
+
+        def reload(signum, frame):
+            self._reload_requested = True
+
+        def report(signum, frame):
+            self._report_requested = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+        signal.signal(signal.SIGUSR1, report)
+
+    def run(self):
+        self._install_signals()
+        main.supervisor_pid = os.getpid()
+        freeze_heap()
+        for slot in range(self.n_workers):
+            self.spawn(slot)
+        print(f"[serve] {self.n_workers} workers serving {self.sock.getsockname()} "
+              f"(parent pid {os.getpid()}, model {main.model_version})")
+
+        registry = main.model_registry
+        now = time.monotonic()
+        next_report = now + self.memory_interval if self.memory_interval > 0 else float("inf")
+        next_check = now + registry.poll_interval if registry.poll_interval > 0 else float("inf")
+        while not self._stopping:
+            self.reap()
+            now = time.monotonic()
+            if self._reload_requested:
+                self._reload_requested = False
+                self.reload()
+            elif now >= next_check:
+                next_check = now + registry.poll_interval
+                if registry.check_for_update():
+                    freeze_heap()
+                    self.recycle_all()
+            if self._report_requested or now >= next_report:
+                self._report_requested = False
+                if now >= next_report:
+                    next_report = now + self.memory_interval
+                self.memory_report()
+            time.sleep(POLL_INTERVAL)
+        self.shutdown()
+
+    def shutdown(self):
+        """SIGTERM every worker, wait for them to drain, SIGKILL stragglers."""
+        print(f"[serve] Stopping {len(self.workers)} workers")
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(POLL_INTERVAL)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.workers.pop(pid)
+        self.sock.close()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Preforked multi-worker risk API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS,
+                        help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=MAX_REQUESTS_JITTER,
+                        help="Random extra requests per worker so recycling is staggered")
+    parser.add_argument("--memory-interval", type=float, default=MEMORY_REPORT_INTERVAL,
+                        help="Seconds between RSS/PSS reports (0 = only on SIGUSR1)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args(argv)
+
+    # Everything the workers share is loaded here, before the first fork
+    main.SKLEARN_MIN_ROWS = SKLEARN_MIN_ROWS
+    main.startup()
+    sock = bind_socket(args.host, args.port)
+    Supervisor(sock, args.workers, args.max_requests, args.max_requests_jitter,
+               args.memory_interval, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main_cli()
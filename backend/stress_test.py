@@ -1,27 +1,17 @@
 import os
 import sys
 
-# Pure Python Model Logic (Standalone for Stress Testing)
+import risk_kernel
+
+# Pure Python Model Logic (scalar backend of risk_kernel, no NumPy needed)
 class PurePythonModel:
     def __init__(self):
         print("Initialized Stress Test Model")
 
     def predict(self, temp, hum, wind, veg):
         # Logic mirroring the main model
-        n_temp = min(max(temp / 50.0, 0), 1)
-        n_hum = min(max(hum / 100.0, 0), 1)
-        n_wind = min(max(wind / 100.0, 0), 1)
-        n_veg = min(max(veg, 0), 1)
-        
-        # Linear Score
-        # Score = (40 * nT + 20 * nW - 30 * nH - 30 * nV) + 40
-        score = (40 * n_temp) + (20 * n_wind) - (30 * n_hum) - (30 * n_veg) + 40
-        
-        # Non-linear boosts
-        if n_temp > 0.8 and n_wind > 0.7:
-            score += 20
-            
-        return max(0.0, min(float(score), 100.0))
+        # Score = (40 * nT + 20 * nW - 30 * nH - 30 * nV) + 40, plus the Heat+Wind boost
+        return risk_kernel.fallback_row(risk_kernel.normalize_row(temp, hum, wind, veg))
 
 def run_test(name, inputs):
     model = PurePythonModel()
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from scoring import FEATURE_SCALE
+
+# Lookup-grid surrogate for the forest.
+#
+# The model only sees four bounded inputs (model_input_contract.md), so its
+# output can be tabulated once on a dense 4-D grid and answered afterwards by
+# multilinear interpolation: 16 corner lookups per row, O(1) regardless of
+# forest size, flat latency under load.
+#
+# The grid records the sha256 of the model.pkl it was tabulated from; the
+# API only uses a grid whose source matches the forest it serves, so a
+# retrained model is never answered from a stale table.
+
+BOUNDS_LOW = np.zeros(4)
+BOUNDS_HIGH = FEATURE_SCALE.copy()
+
+# temp, humidity, wind, veg_moisture points per axis (~5.8 MB as float32)
+DEFAULT_RESOLUTION = (41, 41, 41, 21)
+GRID_PATH = os.path.join(os.path.dirname(__file__), "model_grid.npz")
+
+# Rows interpolated per step; bounds the (rows, 16) corner temporaries
+CHUNK_ROWS = 65536
+
+# (16, 4) 0/1 offsets of the hypercube corners around each query point, in
+# C order of a (temp, humidity, wind, veg) 2x2x2x2 block
+CORNER_BITS = np.array([[(c >> (3 - axis)) & 1 for axis in range(4)] for c in range(16)])
+
+
+class GridSurrogate:
+    def __init__(self, values, low=BOUNDS_LOW, high=BOUNDS_HIGH, error_report=None, source_sha256=None):
+        self.values = np.ascontiguousarray(values, dtype=np.float32)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.error_report = error_report or {}
+        # sha256 of the model artifact the grid was built from (None: unknown)
+        self.source_sha256 = source_sha256
+        # Identifies the tabulated values (cache keys of surrogate-scored results)
+        self.fingerprint = hashlib.sha256(self.values.tobytes()).hexdigest()[:16]
+
+        self.resolution = np.array(self.values.shape)
+        self._flat = self.values.ravel()
+        self._strides = np.array([int(np.prod(self.values.shape[i + 1:])) for i in range(4)])
+        self._step = (self.high - self.low) / (self.resolution - 1)
+        self._corner_offsets = CORNER_BITS @ self._strides
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def predict(self, X):
+        """Multilinear interpolation of the tabulated forest output."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, 4)
+        out = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._interpolate(X[start:start + CHUNK_ROWS])
+        return out
+
+    def _interpolate(self, X):
+        pos = (np.clip(X, self.low, self.high) - self.low) / self._step
+        idx = np.minimum(pos.astype(np.int64), self.resolution - 2)
+        frac = pos - idx
+
+        # Gather the 16 hypercube corners, then lerp one axis at a time
+        # (temp, humidity, wind, veg), halving the corner set each step
+        corners = self._flat.take((idx @ self._strides)[:, None] + self._corner_offsets)
+        c = corners.reshape(-1, 2, 2, 2, 2).astype(np.float64)
+        for axis in range(4):
+            f = frac[:, axis].reshape((-1,) + (1,) * (c.ndim - 2))
+            c = c[:, 0] + (c[:, 1] - c[:, 0]) * f
+        return c
+
+    def save(self, path=GRID_PATH):
+        np.savez(path, values=self.values, low=self.low, high=self.high,
+                 error_report=json.dumps(self.error_report), source_sha256=self.source_sha256 or "")
+
+    @classmethod
+    def load(cls, path=GRID_PATH):
+        with np.load(path) as data:
+            # Grids built before the source was recorded load with source_sha256=None
+            source = str(data["source_sha256"]) if "source_sha256" in data.files else ""
+            return cls(data["values"], data["low"], data["high"],
+                       error_report=json.loads(str(data["error_report"])), source_sha256=source or None)
+
+    def built_from(self, sha):
+        """True if the grid was tabulated from the artifact with this sha256."""
+        return sha is not None and self.source_sha256 == sha
+
+
+def grid_axes(resolution=DEFAULT_RESOLUTION):
+    return [np.linspace(lo, hi, r) for lo, hi, r in zip(BOUNDS_LOW, BOUNDS_HIGH, resolution)]
+
+
+def build_grid(model, resolution=DEFAULT_RESOLUTION):
+    """Tabulate model.predict on the grid, one temperature slice at a time."""
+    axes = grid_axes(resolution)
+    values = np.empty(tuple(resolution), dtype=np.float32)
+    rest = np.stack(np.meshgrid(*axes[1:], indexing="ij"), axis=-1).reshape(-1, 3)
+
+    for i, t in enumerate(axes[0]):
+        X = np.column_stack([np.full(len(rest), t), rest])
+        raw = np.asarray(model.predict(X), dtype=np.float64)
+        values[i] = np.clip(raw, 0.0, 100.0).reshape(values.shape[1:])
+    return GridSurrogate(values)
+
+
+def measure_error(surrogate, model, n_samples=20000, seed=0):
+    """Absolute error of the surrogate vs the real model on a uniform holdout."""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(BOUNDS_LOW, BOUNDS_HIGH, size=(n_samples, 4))
+    truth = np.clip(np.asarray(model.predict(X), dtype=np.float64), 0.0, 100.0)
+    err = np.abs(surrogate.predict(X) - truth)
+    return {
+        "holdout_samples": n_samples,
+        "max_abs_error": float(err.max()),
+        "mean_abs_error": float(err.mean()),
+        "p99_abs_error": float(np.percentile(err, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the lookup-grid surrogate from model.pkl")
+    parser.add_argument("--model", default=os.path.join(os.path.dirname(__file__), "model.pkl"))
+    parser.add_argument("--output", default=GRID_PATH)
+    parser.add_argument("--resolution", type=int, nargs=4, default=DEFAULT_RESOLUTION,
+                        metavar=("TEMP", "HUM", "WIND", "VEG"))
+    parser.add_argument("--holdout", type=int, default=20000, help="Holdout rows for the error report")
+    args = parser.parse_args()
+
+    from forest_engine import file_sha256, load_forest
+    forest = load_forest(args.model)
+
+    start = time.perf_counter()
+    surrogate = build_grid(forest, args.resolution)
+    if os.path.isdir(args.model):
+        print("Note: built from a flat export, so the API cannot tie the grid to a model.pkl and will ignore it")
+    else:
+        surrogate.source_sha256 = file_sha256(args.model)
+    print(f"Built {tuple(args.resolution)} grid ({surrogate.nbytes / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    surrogate.error_report = measure_error(surrogate, forest, args.holdout)
+    report = surrogate.error_report
+    print(f"Holdout ({report['holdout_samples']} rows): "
+          f"max abs error {report['max_abs_error']:.2f}, "
+          f"mean abs error {report['mean_abs_error']:.3f}, "
+          f"p99 {report['p99_abs_error']:.2f}")
+
+    surrogate.save(args.output)
+    print(f"Surrogate saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
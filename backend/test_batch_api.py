@@ -0,0 +1,876 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from email.utils import formatdate
+
+import httpx
+import joblib
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestRegressor
+
+import audit_drivers
+import audit_kernel
+import bulk_score
+import columnar
+import load_test
+import main
+import metrics
+import risk_kernel
+import sensitivity
+import tiles
+from forecast import ForecastState, ForecastStore
+from raster import decode_raster
+from surrogate import GridSurrogate, build_grid
+from zones import ZoneRegistry
+
+
+def setUpModule():
+    # Model load + warm-up normally runs in the lifespan startup phase
+    main.startup()
+
+
+def random_rows(n, seed=0):
+    """Random feature rows, including some outside the contract ranges."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        rows.append({
+            "temp": rng.uniform(-10, 60),
+            "humidity": rng.uniform(-10, 110),
+            "wind": rng.uniform(-10, 110),
+            "veg_moisture": rng.uniform(-0.2, 1.2),
+        })
+    # Boundary / tie cases for drivers and risk levels
+    rows += [
+        {"temp": 50, "humidity": 0, "wind": 100, "veg_moisture": 0.0},
+        {"temp": 0, "humidity": 100, "wind": 0, "veg_moisture": 1.0},
+        {"temp": 20, "humidity": 5, "wind": 10, "veg_moisture": 0.05},
+        {"temp": 41, "humidity": 20, "wind": 71, "veg_moisture": 0.2},
+    ]
+    return rows
+
+
+def small_forest():
+    rng = np.random.default_rng(0)
+    X = rng.uniform([0, 0, 0, 0], [50, 100, 100, 1], size=(300, 4))
+    y = np.clip(0.8 * X[:, 0] - 0.3 * X[:, 1] + 0.2 * X[:, 2] - 30 * X[:, 3] + 40, 0, 100)
+    return RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+
+
+class TestBatchPredict(unittest.TestCase):
+    def setUp(self):
+        self.original = (main.model, main.model_version)
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.set_model(*self.original)
+
+    def assert_batch_matches_single(self, rows):
+        batch = self.client.post("/predict/batch", json=rows)
+        self.assertEqual(batch.status_code, 200)
+        batch = batch.json()
+        self.assertEqual(len(batch), len(rows))
+        for row, result in zip(rows, batch):
+            single = self.client.post("/predict", json=row).json()
+            self.assertEqual(single, result, f"Mismatch for {row}")
+
+    def test_batch_matches_single_mock(self):
+        main.set_model(None, "mock")
+        self.assert_batch_matches_single(random_rows(200))
+
+    def test_batch_matches_single_forest(self):
+        main.set_model(small_forest(), "test-forest")
+        self.assert_batch_matches_single(random_rows(200, seed=1))
+
+    def test_empty_batch(self):
+        response = self.client.post("/predict/batch", json=[])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_non_finite_rows_rejected(self):
+        body = '[{"temp": 30, "humidity": 20, "wind": 40, "veg_moisture": 0.3},' \
+               ' {"temp": NaN, "humidity": 20, "wind": 40, "veg_moisture": 0.3}]'
+        headers = {"Content-Type": "application/json"}
+        response = self.client.post("/predict/batch", content=body, headers=headers)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["detail"][0]["loc"], ["body", 1, "temp"])
+        single = '{"temp": 30, "humidity": 20, "wind": Infinity, "veg_moisture": 0.3}'
+        self.assertEqual(self.client.post("/predict", content=single, headers=headers).status_code, 422)
+
+
+
+class TestColumnarBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(main.app)
+        # Include out-of-range values so clamping is exercised
+        self.X = np.random.default_rng(5).uniform([-5, -5, -5, -0.1], [55, 105, 105, 1.1], size=(300, 4))
+        rows = [dict(zip(("temp", "humidity", "wind", "veg_moisture"), r)) for r in self.X.tolist()]
+        self.expected = self.client.post("/predict/batch", json=rows).json()
+
+    def test_columns_in_json_out(self):
+        body = columnar.encode_columns(self.X, dtype_code=1)
+        r = self.client.post("/predict/batch", content=body, headers={"Content-Type": columnar.COLUMNS_MEDIA_TYPE})
+        self.assertEqual(r.json(), self.expected)
+        out_of_range = ((self.X < 0) | (self.X > [50, 100, 100, 1])).sum(axis=0).tolist()
+        self.assertEqual(r.headers["X-Clamp-Counts"],
+                         ",".join(f"{n}={c}" for n, c in zip(("temp", "humidity", "wind", "veg_moisture"), out_of_range)))
+
+    def test_npy_in_npz_out(self):
+        buf = io.BytesIO()
+        np.save(buf, self.X)
+        r = self.client.post("/predict/batch", content=buf.getvalue(),
+                             headers={"Content-Type": "application/x-npy", "Accept": "application/x-npz"})
+        self.assertEqual(r.headers["content-type"], "application/x-npz")
+        with np.load(io.BytesIO(r.content)) as out:
+            np.testing.assert_allclose(out["risk_score"], [p["risk_score"] for p in self.expected], atol=0.005)
+            self.assertEqual([str(out["levels"][c]) for c in out["risk_level"]],
+                             [p["risk_level"] for p in self.expected])
+
+    def test_malformed_body(self):
+        r = self.client.post("/predict/batch", content=b"GFC1", headers={"Content-Type": columnar.COLUMNS_MEDIA_TYPE})
+        self.assertEqual(r.status_code, 422)
+
+        npy, npz = io.BytesIO(), io.BytesIO()
+        np.save(npy, self.X)
+        np.savez_compressed(npz, **{name: self.X[:, i] for i, name in enumerate(columnar.FEATURE_NAMES)})
+        npz = bytearray(npz.getvalue())
+        npz[len(npz) // 2] ^= 0xFF
+        bodies = [("application/x-npy", b""), ("application/x-npy", npy.getvalue()[:40]),
+                  ("application/x-npz", b""), ("application/x-npz", b"PK\x03\x04 not a zip"),
+                  ("application/x-npz", bytes(npz))]
+        for kind, body in bodies:
+            r = self.client.post("/predict/batch", content=body, headers={"Content-Type": kind})
+            self.assertEqual(r.status_code, 422, f"{kind} body of {len(body)} bytes")
+
+class TestRaster(unittest.TestCase):
+    def setUp(self):
+        self.original = (main.model, main.model_version)
+        main.set_model(small_forest(), "test-forest")
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.set_model(*self.original)
+
+    def test_raster_matches_batch_scores(self):
+        base = {"temp": 35.0, "humidity": 20.0, "wind": 30.0, "veg_moisture": 0.3}
+        wind = [0.0, 20.0, 40.0, 60.0, 80.0, 120.0]
+        request = {"bbox": [-123, 38, -121, 39], "width": 3, "height": 2, "base": base,
+                   "fields": {"wind": wind}, "precise": True}
+        response = self.client.post("/raster", json=request)
+        self.assertEqual(response.status_code, 200)
+        header, cells = decode_raster(response.content)
+        self.assertEqual((header["height"], header["width"]), (2, 3))
+
+        rows = [dict(base, wind=w) for w in wind]
+        expected = [p["risk_score"] for p in self.client.post("/predict/batch", json=rows).json()]
+        np.testing.assert_allclose(cells.ravel(), expected, atol=0.01)
+
+        request["format"] = "class"
+        _, classes = decode_raster(self.client.post("/raster", json=request).content)
+        self.assertEqual(classes.dtype, np.uint8)
+
+    def test_field_size_mismatch_is_rejected(self):
+        request = {"bbox": [0, 0, 1, 1], "width": 2, "height": 2,
+                   "base": {"temp": 20, "humidity": 50, "wind": 10, "veg_moisture": 0.5},
+                   "fields": {"temp": [1, 2, 3]}}
+        self.assertEqual(self.client.post("/raster", json=request).status_code, 422)
+        # NaN cells in a base64 float32 field
+        request["fields"] = {"temp": base64.b64encode(np.array([1, np.nan, 3, 4], "<f4").tobytes()).decode()}
+        self.assertEqual(self.client.post("/raster", json=request).status_code, 422)
+
+    def test_surrogate_grid_must_come_from_served_model(self):
+        forest = main.model
+        forest.sha256 = "a" * 64
+        request = {"bbox": [0, 0, 1, 1], "width": 1, "height": 1,
+                   "base": {"temp": 20, "humidity": 50, "wind": 10, "veg_moisture": 0.5}}
+        original_path = main.GRID_PATH
+        with tempfile.TemporaryDirectory() as directory:
+            main.GRID_PATH = os.path.join(directory, "model_grid.npz")
+            try:
+                grid = build_grid(forest, resolution=(3, 3, 3, 2))
+                grid.source_sha256 = forest.sha256
+                grid.save(main.GRID_PATH)
+                r = self.client.post("/raster", json=request)
+                self.assertEqual(r.headers["x-risk-engine"], "surrogate")
+                # Model hot-reloaded: the grid of the previous forest is ignored
+                forest.sha256 = "b" * 64
+                r = self.client.post("/raster", json=request)
+                self.assertEqual(r.headers["x-risk-engine"], "model")
+                # So is a grid that does not record its source
+                grid.source_sha256 = None
+                grid.save(main.GRID_PATH)
+                os.utime(main.GRID_PATH, ns=(0, 0))
+                self.assertIsNone(GridSurrogate.load(main.GRID_PATH).source_sha256)
+                self.assertEqual(self.client.post("/raster", json=request).headers["x-risk-engine"], "model")
+            finally:
+                main.GRID_PATH = original_path
+
+
+class TestPredictionCache(unittest.TestCase):
+    def setUp(self):
+        self.original = (main.model, main.model_version)
+        self.client = TestClient(main.app)
+        main.set_model(None, "mock")
+
+    def tearDown(self):
+        main.set_model(*self.original)
+
+    def test_repeated_rows_hit_cache(self):
+        row = {"temp": 33.3, "humidity": 21.0, "wind": 44.0, "veg_moisture": 0.31}
+        first = self.client.post("/predict", json=row).json()
+        before = main.prediction_cache.stats()
+        again = self.client.post("/predict", json=row).json()
+        after = main.prediction_cache.stats()
+        self.assertEqual(first, again)
+        self.assertEqual(after["hits"], before["hits"] + 1)
+
+    def test_model_change_invalidates(self):
+        row = {"temp": 45, "humidity": 10, "wind": 90, "veg_moisture": 0.1}
+        self.client.post("/predict", json=row)
+        main.set_model(small_forest(), "test-forest")
+        stats = main.prediction_cache.stats()
+        self.assertEqual(stats["size"], 0)
+        self.assertEqual(stats["model_version"], "test-forest")
+        cached = self.client.post("/predict", json=row).json()
+        self.assertEqual(cached, main.score_features(main.WildfireFeatures(**row)))
+
+    def test_lru_eviction_is_bounded(self):
+        cache = main.PredictionCache(maxsize=2, quantum=1e-4)
+        for i in range(5):
+            cache.put(cache.key(i, 0, 0, 0), {"i": i})
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual(cache.evictions, 3)
+        self.assertIsNone(cache.get(cache.key(0, 0, 0, 0)))
+        self.assertEqual(cache.get(cache.key(4, 0, 0, 0)), {"i": 4})
+
+
+class TestMicroBatching(unittest.TestCase):
+    def setUp(self):
+        self.original = (main.model, main.model_version)
+        main.set_model(small_forest(), "test-forest")
+
+    def tearDown(self):
+        main.set_model(*self.original)
+
+    def test_concurrent_requests_are_batched(self):
+        rows = random_rows(100, seed=2)
+        batches_before = main.predict_batcher.batches
+
+        async def fire():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(*[client.post("/predict", json=r) for r in rows])
+            return [r.json() for r in responses]
+
+        results = asyncio.run(fire())
+        for row, result in zip(rows, results):
+            self.assertEqual(result, main.score_features(main.WildfireFeatures(**row)))
+        self.assertLess(main.predict_batcher.batches - batches_before, len(rows))
+
+    def test_non_finite_request_does_not_touch_batch(self):
+        # Cache disabled: every request goes through the micro-batcher
+        original_cache = main.prediction_cache
+        main.prediction_cache = main.PredictionCache(maxsize=0)
+        rows = random_rows(20, seed=3)
+        bad = '{"temp": NaN, "humidity": 20, "wind": 40, "veg_moisture": 0.3}'
+
+        async def fire():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(
+                    client.post("/predict", content=bad, headers={"Content-Type": "application/json"}),
+                    *[client.post("/predict", json=r) for r in rows])
+
+        try:
+            invalid, *responses = asyncio.run(fire())
+        finally:
+            main.prediction_cache = original_cache
+        self.assertEqual(invalid.status_code, 422)
+        for row, response in zip(rows, responses):
+            self.assertEqual(response.json(), main.score_features(main.WildfireFeatures(**row)))
+
+
+
+class TestForecast(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(main.app)
+        rng = np.random.default_rng(3)
+        self.fields = {name: rng.uniform(0, high, size=(5, 72)).tolist()
+                       for name, high in zip(("temp", "humidity", "wind", "veg_moisture"), (50, 100, 100, 1))}
+
+    def post(self, forecast_id, fields):
+        r = self.client.post("/forecast", json={"forecast_id": forecast_id, "zones": 5, "hours": 72,
+                                                "fields": fields})
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def test_incremental_refresh_matches_full(self):
+        first = self.post("feed-a", self.fields)
+        self.assertEqual((first["mode"], first["cells_scored"]), ("full", 360))
+        self.assertEqual(self.post("feed-a", self.fields)["cells_scored"], 0)
+
+        updated = {k: [row[:] for row in v] for k, v in self.fields.items()}
+        updated["temp"][2][10] = 49.0
+        updated["wind"][4][71] = 95.0
+        incremental = self.post("feed-a", updated)
+        self.assertEqual((incremental["mode"], incremental["cells_scored"]), ("incremental", 2))
+        full = self.post("feed-b", updated)
+        for key in ("risk_score", "risk_level", "drivers"):
+            self.assertEqual(incremental[key], full[key])
+
+        # Same values as the per-row API
+        row = {k: updated[k][2][10] for k in updated}
+        single = self.client.post("/predict", json=row).json()
+        self.assertAlmostEqual(full["risk_score"][2][10], single["risk_score"], places=2)
+        self.assertEqual(full["levels"][full["risk_level"][2][10]], single["risk_level"])
+
+    def test_store_bounded_by_bytes(self):
+        X = np.random.default_rng(4).uniform(0, 1, size=(10, 10, 4))
+        one = ForecastState.full(X, None, 0).nbytes
+        store = ForecastStore(maxsize=64, max_bytes=int(2.5 * one))
+        for i in range(4):
+            store.score(f"f{i}", X, None, 0)
+        stats = store.stats()
+        self.assertEqual((stats["forecasts"], stats["bytes"], stats["evictions"]), (2, 2 * one, 2))
+        # A forecast larger than the whole budget is scored but not kept
+        store.score("big", np.zeros((50, 50, 4)), None, 0)
+        self.assertEqual(store.stats()["forecasts"], 0)
+        self.assertEqual(store.stats()["bytes"], 0)
+
+    def test_concurrent_updates_of_one_id_score_once(self):
+        class SlowModel:
+            def predict(self, X):
+                time.sleep(0.2)
+                return np.zeros(len(X))
+
+        X = np.random.default_rng(5).uniform(0, 1, size=(4, 6, 4))
+        store = ForecastStore()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.score("same", X, SlowModel(), 0)[2]))
+                   for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(results), ["full", "incremental"])
+        self.assertEqual(store.cells_scored, 24)
+        self.assertEqual(store._id_locks, {})
+
+
+class TestZones(unittest.TestCase):
+    def test_point_in_polygon(self):
+        square = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]
+        hole = [[1, 1], [3, 1], [3, 3], [1, 3], [1, 1]]
+        registry = ZoneRegistry.from_geojson({"features": [
+            {"properties": {"id": "ring"}, "geometry": {"type": "Polygon", "coordinates": [square, hole]}},
+            {"properties": {"id": "multi"}, "geometry": {"type": "MultiPolygon", "coordinates": [
+                [[[5, 0], [6, 0], [6, 1], [5, 1]]], [[[7, 3], [9, 3], [8, 5]]]]}},
+        ]})
+        lon = [0.5, 2.0, 3.5, 5.5, 8.0, 8.9, 6.5, -1.0]
+        lat = [0.5, 2.0, 2.0, 0.5, 4.0, 4.5, 0.5, 0.0]
+        self.assertEqual(registry.locate(lon, lat).tolist(), [0, -1, 0, 1, 1, -1, -1, -1])
+
+    def test_conditions_are_shared_between_processes(self):
+        doc = {"features": [
+            {"properties": {"id": "a", "temp": 20, "humidity": 60, "wind": 10, "veg_moisture": 0.8},
+             "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1]]]}},
+            {"properties": {"id": "b"}, "geometry": {"type": "Polygon", "coordinates": [[[2, 0], [3, 0], [3, 1], [2, 1]]]}},
+        ]}
+        hot = [45.0, 5.0, 90.0, 0.1]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "conditions.npz")
+            # Two workers, each with its own registry (and risk tables) over one file
+            a, b = (ZoneRegistry.from_geojson(doc, path) for _ in range(2))
+            self.assertEqual(b.lookup([0.5], [0.5], None, "v")["risk_level"], ["Low"])
+            self.assertEqual(a.update_conditions(["a"], [hot]), 1)
+            self.assertEqual(b.lookup([0.5], [0.5], None, "v")["risk_level"], ["Extreme"])
+            self.assertEqual((b.fingerprint(), b.updated), (a.fingerprint(), a.updated))
+            # Updates from different workers are merged, not overwritten
+            b.update_conditions(["b"], [hot])
+            self.assertEqual(a.lookup([0.5, 2.5], [0.5, 0.5], None, "v")["risk_level"], ["Extreme", "Extreme"])
+            # A restarted worker starts from the shared state; other GeoJSON ignores it
+            self.assertEqual(ZoneRegistry.from_geojson(doc, path).fingerprint(), a.fingerprint())
+            doc["features"][1]["properties"]["id"] = "c"
+            other = ZoneRegistry.from_geojson(doc, path)
+            self.assertIsNone(other.lookup([2.5], [0.5], None, "v")["risk_level"][0])
+
+    def test_lookup_api(self):
+        client = TestClient(main.app)
+        # Napa Valley North, Sierra Foothills, open sea
+        points = [[-122.4, 38.4], [-120.7, 38.8], [-125.0, 38.0]]
+        body = client.post("/zones/lookup", json={"points": points}).json()
+        self.assertEqual(body["zone_id"], ["z1", "z3", None])
+        conditions_path = main.zone_registry.conditions_path
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(setattr, main.zone_registry, "conditions_path", conditions_path)
+        main.zone_registry.conditions_path = os.path.join(tmp.name, "conditions.npz")
+        self.assertIsNone(body["risk_score"][2])
+
+        conditions = {"temp": 32, "humidity": 15, "wind": 25, "veg_moisture": 0.2}
+        single = client.post("/predict", json=conditions).json()
+        self.assertEqual(body["risk_level"][0], single["risk_level"])
+        self.assertEqual(body["primary_drivers"][0], single["primary_drivers"])
+
+        hot = {"temp": 49.0, "humidity": 2.0, "wind": 95.0, "veg_moisture": 0.05}
+        r = client.post("/zones/conditions", json=[{"zone_id": "z1", **hot}])
+        self.assertEqual(r.json(), {"updated": 1})
+        after = client.post("/zones/lookup", json={"points": points[:1]}).json()
+        self.assertEqual(after["risk_score"][0], client.post("/predict", json=hot).json()["risk_score"])
+        client.post("/zones/conditions", json=[{"zone_id": "z1", **conditions}])
+        self.assertEqual(client.post("/zones/conditions", json=[{"zone_id": "nope", **hot}]).status_code, 404)
+
+
+class TestLoadGenerator(unittest.TestCase):
+    def test_mixed_routes_out_of_range(self):
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await load_test.run_load(client, duration=0.5, concurrency=4, inputs="out-of-range",
+                                                route="both", batch_size=8, interval=0.25, seed=1)
+
+        windows, summary = asyncio.run(run())
+        self.assertGreater(summary["requests"], 0)
+        self.assertEqual(summary["error_rate"], 0.0)
+        self.assertGreaterEqual(len(windows), 2)
+        self.assertEqual(sum(w["requests"] for w in windows), summary["requests"])
+        self.assertLessEqual(summary["p50_ms"], summary["p99_ms"])
+
+class TestBulkScore(unittest.TestCase):
+    def setUp(self):
+        self.original = (main.model, main.model_version)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.tmp.name, "model.pkl")
+        joblib.dump(small_forest(), self.model_path)
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.set_model(*self.original)
+        self.tmp.cleanup()
+
+    def run_cli(self, rows, *args):
+        source, output = os.path.join(self.tmp.name, "in.csv"), os.path.join(self.tmp.name, "out.csv")
+        with open(source, "w") as f:
+            f.write("station,temp,humidity,wind,veg\n" + "".join(f"{row}\n" for row in rows))
+        done = subprocess.run([sys.executable, "bulk_score.py", source, output, "--model", self.model_path, *args],
+                              cwd=os.path.dirname(os.path.abspath(bulk_score.__file__)),
+                              capture_output=True, text=True, timeout=120)
+        self.assertEqual(done.returncode, 0, done.stderr)
+        return pd.read_csv(output, keep_default_na=False), done.stderr
+
+    def test_cli_scores_finite_rows_and_leaves_bad_rows_unscored(self):
+        rows = ["A1,35,15,25,0.2", "A2,,20,40,0.3", "A3,45,5,90,0.1", "A4,nan,5,90,0.1", "A5,inf,1,1,1",
+                "A6,60,-5,120,0.5"]
+        out, log = self.run_cli(rows, "--chunk-size", "4")
+        self.assertIn("3 unscored", log)
+        self.assertEqual(list(out["station"]), ["A1", "A2", "A3", "A4", "A5", "A6"])
+        for i in (1, 3, 4):
+            self.assertEqual(out.loc[i, ["risk_score", "risk_level", "primary_drivers"]].tolist(), ["", "", ""])
+
+        scorer = bulk_score.load_scoring_model(self.model_path)
+        # Hybrid like the server: chunks go through the sklearn forest
+        self.assertIsNotNone(scorer.model)
+        main.set_model(scorer, "test-forest")
+        good = [{"temp": t, "humidity": h, "wind": w, "veg_moisture": v}
+                for t, h, w, v in ((35, 15, 25, 0.2), (45, 5, 90, 0.1), (60, -5, 120, 0.5))]
+        expected = self.client.post("/predict/batch", json=good).json()
+        for i, result in zip((0, 2, 5), expected):
+            self.assertEqual(float(out.loc[i, "risk_score"]), result["risk_score"])
+            self.assertEqual(out.loc[i, "risk_level"], result["risk_level"])
+            self.assertEqual(out.loc[i, "primary_drivers"].split("|"), result["primary_drivers"])
+
+        parallel, _ = self.run_cli(rows, "--chunk-size", "2", "--workers", "2")
+        pd.testing.assert_frame_equal(parallel, out)
+
+
+class TestTiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original = (main.tile_renderer, main.weather_source)
+        main.tile_renderer = tiles.TileRenderer(tiles.TileCache(self.tmp.name, 1 << 20))
+        main.weather_source = tiles.WeatherSource(os.path.join(self.tmp.name, "weather.npz"))
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.tile_renderer, main.weather_source = self.original
+        self.tmp.cleanup()
+
+    def test_metatile_cache_and_revalidation(self):
+        # z8 tile over the Napa Valley North zone
+        r = self.client.get("/tiles/8/41/98")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers["content-type"], "image/png")
+        self.assertTrue(r.content.startswith(b"\x89PNG"))
+        self.assertEqual(r.headers["x-tile-inputs"], "zones")
+        # Neighbour in the same metatile comes from the disk cache
+        self.assertEqual(self.client.get("/tiles/8/40/99").status_code, 200)
+        self.assertEqual(main.tile_renderer.metatiles_rendered, 1)
+        again = self.client.get("/tiles/8/41/98", headers={"If-None-Match": r.headers["etag"]})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get("/tiles/8/256/0").status_code, 404)
+
+        # New inputs -> new ETag
+        grid = {"bbox": [-125, 32, -114, 42], "width": 11, "height": 10,
+                "base": {"temp": 45, "humidity": 5, "wind": 90, "veg_moisture": 0.1}}
+        self.assertEqual(self.client.post("/tiles/weather", json=grid).status_code, 200)
+        r2 = self.client.get("/tiles/8/41/98", headers={"If-None-Match": r.headers["etag"]})
+        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(r2.headers["x-tile-inputs"], "grid")
+        self.assertNotEqual(r2.headers["etag"], r.headers["etag"])
+
+    def test_cache_is_size_bounded(self):
+        cache = tiles.TileCache(self.tmp.name, 4000)
+        for i in range(10):
+            cache.put_many("k", 3, {(i, 0): bytes(1000)})
+        self.assertLessEqual(cache._scan_size(), 4000)
+        self.assertGreater(cache.evicted, 0)
+        self.assertIsNotNone(cache.get("k", 3, 9, 0))
+
+    def test_last_modified_and_etag_follow_the_scoring_artifact(self):
+        paths = (main.MODEL_PATH, main.GRID_PATH)
+        original = (main.model, main.model_version)
+        main.MODEL_PATH = os.path.join(self.tmp.name, "model.pkl")
+        main.GRID_PATH = os.path.join(self.tmp.name, "model_grid.npz")
+        try:
+            with open(main.MODEL_PATH, "wb") as f:
+                f.write(b"model")
+            os.utime(main.MODEL_PATH, (1_700_000_000, 1_700_000_000))
+            forest = small_forest()
+            forest.sha256 = "a" * 64
+            main.set_model(forest, "v1")
+            r = self.client.get("/tiles/8/41/98")
+            # Zone tiles: the later of the zones' and model.pkl's mtimes, the same in every worker
+            self.assertEqual(r.headers["last-modified"],
+                             formatdate(max(main.zone_registry.updated, 1_700_000_000), usegmt=True))
+            self.assertEqual(tiles.TileRenderer.last_modified(tiles.ZoneInputs(main.zone_registry), main.MODEL_PATH),
+                             max(main.zone_registry.updated, 1_700_000_000))
+
+            # Weather tiles come from the surrogate grid: its mtime and its values key the tiles
+            grid = {"bbox": [-125, 32, -114, 42], "width": 11, "height": 10,
+                    "base": {"temp": 45, "humidity": 5, "wind": 90, "veg_moisture": 0.1}}
+            self.assertEqual(self.client.post("/tiles/weather", json=grid).status_code, 200)
+            surrogate = build_grid(forest, resolution=(3, 3, 3, 2))
+            surrogate.source_sha256 = forest.sha256
+            surrogate.save(main.GRID_PATH)
+            os.utime(main.GRID_PATH, (4_000_000_000, 4_000_000_000))
+            first = self.client.get("/tiles/8/41/98")
+            self.assertEqual(first.headers["last-modified"], formatdate(4_000_000_000, usegmt=True))
+
+            # Rebuilt grid: new ETag, the old one no longer revalidates
+            surrogate.values[:] = 100.0 - surrogate.values
+            GridSurrogate(surrogate.values, source_sha256=forest.sha256).save(main.GRID_PATH)
+            os.utime(main.GRID_PATH, (4_000_000_100, 4_000_000_100))
+            second = self.client.get("/tiles/8/41/98", headers={"If-None-Match": first.headers["etag"]})
+            self.assertEqual(second.status_code, 200)
+            self.assertNotEqual(second.headers["etag"], first.headers["etag"])
+            self.assertNotEqual(second.content, first.content)
+        finally:
+            main.MODEL_PATH, main.GRID_PATH = paths
+            main.set_model(*original)
+
+
+class TestSensitivity(unittest.TestCase):
+    BASE = {"temp": 35.0, "humidity": 15.0, "wind": 25.0, "veg_moisture": 0.2}
+
+    def setUp(self):
+        self.original = main.sensitivity_engine
+        main.sensitivity_engine = sensitivity.SurfaceEngine(workers=1)
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.sensitivity_engine = self.original
+
+    def test_whatif_surface_matches_predict_and_is_cached(self):
+        req = {"features": ["humidity", "wind"], "points": [3, 11], "base": self.BASE}
+        r = self.client.post("/sensitivity", json=req).json()
+        self.assertEqual(np.shape(r["values"]), (3, 11))
+        self.assertFalse(r["cached"])
+        humidity, wind = r["grid"]["humidity"][1], r["grid"]["wind"][7]
+        single = self.client.post("/predict", json={**self.BASE, "humidity": humidity, "wind": wind}).json()
+        self.assertEqual(r["values"][1][7], single["risk_score"])
+        self.assertTrue(self.client.post("/sensitivity", json=req).json()["cached"])
+        # Model swap drops cached surfaces
+        self.assertIn(self.original.invalidate, main.model_listeners)
+        main.sensitivity_engine.invalidate(main.model_version)
+        self.assertFalse(self.client.post("/sensitivity", json=req).json()["cached"])
+
+    def test_rebuilt_surrogate_grid_is_not_served_from_cache(self):
+        original, grid_path = (main.model, main.model_version), main.GRID_PATH
+        forest = small_forest()
+        forest.sha256 = "a" * 64
+        req = {"features": ["temp"], "points": 5, "base": self.BASE}
+        with tempfile.TemporaryDirectory() as directory:
+            main.GRID_PATH = os.path.join(directory, "model_grid.npz")
+            try:
+                main.set_model(forest, "v1")
+                surrogate = build_grid(forest, resolution=(3, 3, 3, 2))
+                GridSurrogate(surrogate.values, source_sha256=forest.sha256).save(main.GRID_PATH)
+                first = self.client.post("/sensitivity", json=req).json()
+                self.assertEqual((first["engine"], first["model_version"]), ("surrogate", "v1"))
+                self.assertTrue(self.client.post("/sensitivity", json=req).json()["cached"])
+
+                # Same model version, new grid: no model listener fires, the key still changes
+                GridSurrogate(100.0 - surrogate.values, source_sha256=forest.sha256).save(main.GRID_PATH)
+                os.utime(main.GRID_PATH, ns=(1, 1))
+                second = self.client.post("/sensitivity", json=req).json()
+                self.assertFalse(second["cached"])
+                self.assertNotEqual(second["values"], first["values"])
+            finally:
+                main.GRID_PATH = grid_path
+                main.set_model(*original)
+
+    def test_partial_dependence_and_limits(self):
+        r = self.client.post("/sensitivity", json={"features": ["wind"], "kind": "pd", "points": 5,
+                                                    "background_rows": 16}).json()
+        self.assertEqual(len(r["values"]), 5)
+        self.assertEqual(len(r["std"]), 5)
+        self.assertEqual(r["rows_scored"], 80)
+        self.assertEqual(self.client.post("/sensitivity", json={"features": ["wind", "wind"],
+                                                                "base": self.BASE}).status_code, 422)
+        self.assertEqual(self.client.post("/sensitivity", json={"features": ["wind", "temp"], "points": 400,
+                                                                "kind": "pd", "background_rows": 1024}).status_code, 413)
+
+    def test_ranges_must_be_finite_and_non_empty(self):
+        headers = {"Content-Type": "application/json"}
+        body = '{"features": ["temp"], "ranges": {"temp": [NaN, 40]}, "base": %s}' % json.dumps(self.BASE)
+        r = self.client.post("/sensitivity", content=body, headers=headers)
+        self.assertEqual(r.status_code, 422)
+        self.assertEqual(r.json()["detail"][0]["loc"], ["body", "ranges", "temp", 0])
+        for ranges in ({"temp": [40, 10]}, {"temp": [60, 70]}, {"wind": [0, 10]}):
+            r = self.client.post("/sensitivity", json={"features": ["temp"], "ranges": ranges, "base": self.BASE})
+            self.assertEqual(r.status_code, 422, ranges)
+        r = self.client.post("/sensitivity", json={"features": ["temp"], "points": 3, "ranges": {"temp": [10, 20]},
+                                                    "base": self.BASE})
+        self.assertEqual(r.json()["grid"]["temp"], [10.0, 15.0, 20.0])
+
+    def test_pool_matches_in_process_and_refuses_other_artifacts(self):
+        grids = [sensitivity.feature_grid("temp", 20), sensitivity.feature_grid("wind", 20)]
+        forest = small_forest()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.pkl")
+            joblib.dump(forest, path)
+            with open(path, "rb") as f:
+                sha = hashlib.sha256(f.read()).hexdigest()
+            serial = sensitivity.SurfaceEngine(workers=1).surface(forest, "v", "model", ["temp", "wind"], grids,
+                                                                  self.BASE)
+            engine = sensitivity.SurfaceEngine(workers=2, parallel_min_rows=100)
+            try:
+                pooled = engine.surface(forest, "v", "model", ["temp", "wind"], grids, self.BASE,
+                                        spec=("sklearn", path, sha))
+                self.assertEqual(engine.parallel_surfaces, 1)
+                np.testing.assert_array_equal(pooled["values"], serial["values"])
+
+                # The artifact on disk is not the served model: scored in-process instead
+                engine.invalidate()
+                stale = engine.surface(forest, "v", "model", ["temp", "wind"], grids, self.BASE,
+                                       spec=("sklearn", path, "0" * 64))
+                self.assertEqual((engine.parallel_surfaces, engine.pool_fallbacks), (1, 1))
+                np.testing.assert_array_equal(stale["values"], serial["values"])
+            finally:
+                engine.invalidate()
+
+
+class TestPreforkServing(unittest.TestCase):
+    def test_workers_share_socket_and_recycle(self):
+        proc, url = load_test.start_server(load_test.free_port(), workers=2,
+                                           extra_env={"GEOFIRENET_WORKER_MAX_REQUESTS": "5"})
+        try:
+            pids = set()
+            row = {"temp": 45.0, "humidity": 10.0, "wind": 90.0, "veg_moisture": 0.1}
+            for _ in range(30):
+                # New connection per request, so the requests spread over workers and recycles
+                self.assertEqual(httpx.post(f"{url}/predict", json=row).status_code, 200)
+                pids.add(httpx.get(f"{url}/readyz").json()["pid"])
+            self.assertGreater(len(pids), 2)
+            self.assertNotIn(proc.pid, pids)
+            self.assertIn("geofirenet_process_memory_bytes", httpx.get(f"{url}/metrics").text)
+        finally:
+            proc.terminate()
+            self.assertEqual(proc.wait(timeout=30), 0)
+
+
+class TestHotReload(unittest.TestCase):
+    def setUp(self):
+        self.original = (main.model, main.model_version)
+        self.paths = (main.MODEL_PATH, main.FLAT_CACHE_DIR, main.FOREST_ENGINE)
+        self.tmp = tempfile.TemporaryDirectory()
+        main.MODEL_PATH = os.path.join(self.tmp.name, "model.pkl")
+        main.FLAT_CACHE_DIR = os.path.join(self.tmp.name, "model_cache")
+        main.FOREST_ENGINE = "flat"
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.MODEL_PATH, main.FLAT_CACHE_DIR, main.FOREST_ENGINE = self.paths
+        main.set_model(*self.original)
+        main.model_registry.version = self.original[1]
+        self.tmp.cleanup()
+
+    def test_reload_swaps_in_new_artifact(self):
+        forest = small_forest()
+        joblib.dump(forest, main.MODEL_PATH)
+        response = self.client.post("/admin/reload").json()
+        self.assertTrue(response["swapped"])
+        self.assertEqual(main.model_version, response["version"])
+
+        row = {"temp": 30.0, "humidity": 20.0, "wind": 40.0, "veg_moisture": 0.3}
+        expected = round(float(forest.predict([[30.0, 20.0, 40.0, 0.3]])[0]), 2)
+        self.assertEqual(self.client.post("/predict", json=row).json()["risk_score"], expected)
+
+    def test_broken_artifact_is_rejected(self):
+        joblib.dump(small_forest(), main.MODEL_PATH)
+        self.client.post("/admin/reload")
+        served = main.model
+
+        with open(main.MODEL_PATH, "wb") as f:
+            f.write(b"not a model")
+        response = self.client.post("/admin/reload").json()
+        self.assertFalse(response["swapped"])
+        self.assertIsNotNone(response["last_error"])
+        self.assertIs(main.model, served)
+
+
+class TestDriverEngine(unittest.TestCase):
+    def test_matches_reference_on_edges_and_ties(self):
+        X = audit_drivers.equivalence_rows(n_random=2000)[::5]
+        self.assertEqual(audit_drivers.check_equivalence(X), 0)
+
+    def test_codes_are_compact(self):
+        codes = main.top_drivers(main.normalize(np.array([[50, 0, 100, 0.0], [20, 60, 10, 0.8]])))
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(main.driver_names(codes), [
+            ["High Temperature", "Low Humidity", "Dry Vegetation"], ["Normal Conditions"]])
+
+
+class TestRiskKernel(unittest.TestCase):
+    def test_backends_and_api_paths_agree(self):
+        X = audit_kernel.equivalence_rows(n_random=2000)[::3]
+        counts = audit_kernel.check_equivalence(X, models=(None, main.model))
+        self.assertEqual(set(counts.values()), {0}, counts)
+
+    def test_linear_scores_follow_weights(self):
+        # Unit vector per feature: the score moves by exactly that feature's weight
+        eye = np.eye(4)
+        expected = [risk_kernel.INTERCEPT + w for w in risk_kernel.WEIGHT_ROW]
+        self.assertEqual(risk_kernel.linear_scores(eye).tolist(), expected)
+        self.assertEqual([risk_kernel.linear_row(tuple(row)) for row in eye.tolist()], expected)
+
+
+class TestStartup(unittest.TestCase):
+    def test_ready_after_startup(self):
+        with TestClient(main.app) as client:
+            self.assertEqual(client.get("/livez").status_code, 200)
+            ready = client.get("/readyz")
+            self.assertEqual(ready.status_code, 200)
+            self.assertEqual(ready.json()["model_version"], main.model_version)
+
+    def test_cold_worker_is_not_ready(self):
+        client = TestClient(main.app)
+        timeout = main.READY_TIMEOUT
+        main._ready.clear()
+        main.READY_TIMEOUT = 0.01
+        try:
+            self.assertEqual(client.get("/livez").status_code, 200)
+            self.assertEqual(client.get("/readyz").status_code, 503)
+            row = {"temp": 30.0, "humidity": 20.0, "wind": 40.0, "veg_moisture": 0.3}
+            self.assertEqual(client.post("/predict", json=row).status_code, 503)
+        finally:
+            main.READY_TIMEOUT = timeout
+            main._ready.set()
+
+    def test_failed_startup_fails_liveness(self):
+        def broken_startup():
+            raise OSError("model.pkl unreadable")
+
+        original = main.startup
+        main._ready.clear()
+        main.startup = broken_startup
+        try:
+            with TestClient(main.app) as client:
+                for _ in range(100):
+                    if main.startup_error is not None:
+                        break
+                    time.sleep(0.02)
+                live = client.get("/livez")
+                self.assertEqual(live.status_code, 503)
+                self.assertIn("model.pkl unreadable", live.json()["error"])
+                self.assertEqual(client.get("/readyz").json()["status"], "failed")
+                row = {"temp": 30.0, "humidity": 20.0, "wind": 40.0, "veg_moisture": 0.3}
+                self.assertEqual(client.post("/predict", json=row).status_code, 503)
+        finally:
+            main.startup = original
+            main.startup_error = None
+            main._ready.set()
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(main.app)
+
+    def test_clamps_levels_and_latency_are_exported(self):
+        before = metrics.CLAMPS.value("wind")
+        row = {"temp": 45.0, "humidity": 5.0, "wind": 250.0, "veg_moisture": 0.1}
+        self.client.post("/predict/batch", json=[row, row])
+        self.assertEqual(metrics.CLAMPS.value("wind"), before + 2)
+
+        text = self.client.get("/metrics").text
+        pid = f'pid="{os.getpid()}"'
+        self.assertIn('geofirenet_input_clamped_total{%s,feature="wind"}' % pid, text)
+        self.assertIn('geofirenet_request_duration_seconds_count{%s,method="POST",route="/predict/batch",'
+                      'status="200"}' % pid, text)
+        self.assertIn('geofirenet_batch_rows_bucket{%s,source="predict_batch",le="+Inf"}' % pid, text)
+        self.assertIn("geofirenet_predictions_total{%s,level=" % pid, text)
+        # Every series names its process, so per-worker scrapes never collide
+        series = [line for line in text.splitlines() if line and not line.startswith("#")]
+        self.assertTrue(all(pid in line for line in series))
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = metrics.Histogram("h", "test", buckets=(1, 10))
+        hist.observe(0.5)
+        hist.observe_many([1, 5, 50])
+        samples = {name + labels: value for name, labels, value in hist.samples()}
+        self.assertEqual(samples['h_bucket{le="1"}'], 2)
+        self.assertEqual(samples['h_bucket{le="10"}'], 3)
+        self.assertEqual(samples['h_bucket{le="+Inf"}'], 4)
+        self.assertEqual(samples["h_count"], 4)
+
+    def test_rate_limited_log_aggregates(self):
+        lines = []
+        log = metrics.RateLimitedLog(interval=3600, emit=lines.append)
+        for v in range(100):
+            log.warn("k", "Clamping wind", v)
+        self.assertEqual(len(lines), 1)
+        log.flush()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("WARNING: Clamping wind x99 in the last"))
+        self.assertTrue(lines[1].endswith("(last: 99)"))
+        log.flush()
+        self.assertEqual(len(lines), 2)
+
+    def test_rate_limited_log_reports_trailing_burst(self):
+        lines = []
+        log = metrics.RateLimitedLog(interval=0.2, emit=lines.append)
+        for v in range(50):
+            log.warn("k", "Clamping wind", v)
+        time.sleep(0.5)
+        self.assertEqual(len(lines), 2)
+        self.assertIn("x49", lines[1])
+        # The window closed: the next event is reported immediately again
+        log.warn("k", "Clamping wind", 1)
+        self.assertEqual(len(lines), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
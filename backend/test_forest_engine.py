@@ -0,0 +1,227 @@
+import os
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from forest_engine import FlatForest, HybridForest, load_forest, load_serving_forest
+from compact_model import choose, compact, to_float32
+from eval_core import binary_metrics, heuristic_scores, truth_scores, uniform_samples
+from eval_stream import ScorerAccumulator, evaluate_sharded
+from model_artifact import read_manifest, verify_artifact, write_artifact
+from surrogate import GridSurrogate, build_grid, measure_error
+from train_model import assemble, file_chunks, synthetic_chunks, train
+
+
+def training_data(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform([0, 0, 0, 0], [50, 100, 100, 1], size=(n, 4))
+    y = (40 * X[:, 0] / 50) + (20 * X[:, 2] / 100) - (30 * X[:, 1] / 100) - (30 * X[:, 3]) + 40
+    return X, np.clip(y + rng.normal(0, 5, n), 0, 100)
+
+
+class TestFlatForest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        X, y = training_data()
+        cls.sk_model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+        cls.forest = FlatForest.from_sklearn(cls.sk_model)
+        # Include out-of-range rows; the engine must still agree with sklearn
+        cls.X_test = np.random.default_rng(1).uniform(
+            [-5, -5, -5, -0.1], [55, 105, 105, 1.1], size=(3000, 4))
+
+    def test_batch_matches_sklearn(self):
+        np.testing.assert_array_equal(self.forest.predict(self.X_test), self.sk_model.predict(self.X_test))
+
+    def test_single_row_matches_sklearn(self):
+        for row in self.X_test[:100]:
+            self.assertEqual(self.forest.predict([row])[0], self.sk_model.predict([row])[0])
+
+    def test_apply_matches_sklearn_leaves(self):
+        leaves = self.forest.apply(self.X_test[:50]) - self.forest.roots[:, None]
+        np.testing.assert_array_equal(leaves, self.sk_model.apply(self.X_test[:50]).T)
+
+    def test_save_and_mmap_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.forest.save(directory)
+            loaded = load_forest(directory, mmap_mode="r")
+            np.testing.assert_array_equal(loaded.predict(self.X_test), self.forest.predict(self.X_test))
+
+    def test_rejects_non_finite_input(self):
+        with self.assertRaises(ValueError):
+            self.forest.predict([[np.nan, 10, 10, 0.5]])
+
+    def test_hybrid_routes_large_batches_to_sklearn(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/model.pkl"
+            joblib.dump(self.sk_model, path)
+            hybrid, _ = load_serving_forest(path, f"{directory}/cache", sklearn_min_rows=1000)
+        self.assertIsInstance(hybrid, HybridForest)
+        hybrid.wait()
+        self.assertIsNotNone(hybrid.model)
+        self.assertEqual(hybrid.n_trees, self.forest.n_trees)
+        np.testing.assert_array_equal(hybrid.predict(self.X_test), self.forest.predict(self.X_test))
+        np.testing.assert_array_equal(hybrid.predict(self.X_test[:10]), self.forest.predict(self.X_test[:10]))
+        X = self.X_test.copy()
+        X[5, 1] = np.nan
+        with self.assertRaises(ValueError):
+            hybrid.predict(X)
+
+    def test_hybrid_is_opt_in_and_refuses_parallel_forests(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/model.pkl"
+            joblib.dump(self.sk_model, path)
+            flat, _ = load_serving_forest(path, f"{directory}/cache")
+            self.assertIsInstance(flat, FlatForest)
+            parallel = RandomForestRegressor(n_estimators=3, random_state=0, n_jobs=2).fit(*training_data())
+            joblib.dump(parallel, path)
+            hybrid, _ = load_serving_forest(path, f"{directory}/cache", sklearn_min_rows=1000)
+        hybrid.wait()
+        self.assertIsNone(hybrid.model)
+
+
+class LinearModel:
+    """Stand-in model that multilinear interpolation reproduces exactly."""
+    def predict(self, X):
+        X = np.asarray(X)
+        return 0.6 * X[:, 0] - 0.2 * X[:, 1] + 0.2 * X[:, 2] - 20 * X[:, 3] + 40
+
+
+class TestGridSurrogate(unittest.TestCase):
+    def test_linear_model_is_reproduced(self):
+        surrogate = build_grid(LinearModel(), resolution=(6, 5, 5, 3))
+        report = measure_error(surrogate, LinearModel(), n_samples=2000)
+        self.assertLess(report["max_abs_error"], 1e-3)
+
+    def test_inputs_are_clamped_to_contract(self):
+        surrogate = build_grid(LinearModel(), resolution=(6, 5, 5, 3))
+        np.testing.assert_allclose(
+            surrogate.predict([[80, -10, 150, 2.0]]), surrogate.predict([[50, 0, 100, 1.0]]))
+
+    def test_save_and_load(self):
+        X, y = training_data()
+        forest = FlatForest.from_sklearn(RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y))
+        surrogate = build_grid(forest, resolution=(6, 5, 5, 3))
+        surrogate.error_report = measure_error(surrogate, forest, n_samples=500)
+        surrogate.source_sha256 = "c" * 64
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/grid.npz"
+            surrogate.save(path)
+            loaded = GridSurrogate.load(path)
+        np.testing.assert_array_equal(loaded.predict(X), surrogate.predict(X))
+        self.assertEqual(loaded.error_report, surrogate.error_report)
+        self.assertTrue(loaded.built_from("c" * 64))
+        self.assertFalse(loaded.built_from("d" * 64))
+
+
+class TestCompaction(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        X, y = training_data()
+        cls.sk_model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+        cls.forest = FlatForest.from_sklearn(cls.sk_model)
+        cls.X_test = np.random.default_rng(2).uniform([0, 0, 0, 0], [50, 100, 100, 1], size=(2000, 4))
+
+    def test_float32_keeps_every_split(self):
+        compact32 = to_float32(self.forest)
+        self.assertEqual(compact32.threshold.dtype, np.float32)
+        np.testing.assert_array_equal(compact32.apply(self.X_test), self.forest.apply(self.X_test))
+        np.testing.assert_allclose(compact32.predict(self.X_test), self.forest.predict(self.X_test), atol=1e-4)
+
+    def test_depth_cap_and_tree_subset(self):
+        small = compact(self.forest, max_depth=4, n_trees=5)
+        self.assertEqual((small.n_trees, small.max_depth), (5, 4))
+        self.assertLess(small.n_nodes, self.forest.n_nodes)
+
+        first5 = compact(self.forest, n_trees=5)
+        expected = np.mean([t.predict(self.X_test.astype(np.float32)) for t in self.sk_model.estimators_[:5]], axis=0)
+        np.testing.assert_allclose(first5.predict(self.X_test), expected, rtol=1e-12)
+
+    def test_choose_smallest_within_budget(self):
+        results = [{"size_mb": 1.0, "single_us": 5, "mae_vs_original": 0.9},
+                   {"size_mb": 2.0, "single_us": 5, "mae_vs_original": 0.2},
+                   {"size_mb": 3.0, "single_us": 5, "mae_vs_original": 0.0}]
+        self.assertEqual(choose(results, 0.5)["size_mb"], 2.0)
+        self.assertIsNone(choose(results, -1))
+
+
+class TestTrainingPipeline(unittest.TestCase):
+    def test_chunked_generator_is_deterministic_and_float32(self):
+        X1, y1 = assemble(synthetic_chunks(10_000, 7, chunk_rows=3000), 10_000)
+        X2, y2 = assemble(synthetic_chunks(10_000, 7, chunk_rows=3000))
+        self.assertEqual(X1.dtype, np.float32)
+        np.testing.assert_array_equal(X1, X2)
+        np.testing.assert_array_equal(y1, y2)
+
+    def test_file_chunks_read_only_training_columns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/archive.csv"
+            with open(path, "w") as f:
+                f.write("station,temp,humidity,wind,veg_moisture,risk\n"
+                        "A1,35.5,15,25,0.2,61.123456789012\n"
+                        "B2,12,80,5,0.9,8.5\n"
+                        "C3,44,9,70,0.1,97.25\n")
+            X, y = assemble(file_chunks(path, "risk", chunk_rows=2))
+            self.assertEqual(X.dtype, np.float32)
+            np.testing.assert_array_equal(X[0], np.float32([35.5, 15, 25, 0.2]))
+            self.assertEqual(y[0], 61.123456789012)
+
+            os.mkdir(f"{tmp}/npy")
+            np.save(f"{tmp}/npy/X.npy", X)
+            np.save(f"{tmp}/npy/y.npy", y)
+            X2, y2 = assemble(file_chunks(f"{tmp}/npy", "risk", chunk_rows=2))
+            np.testing.assert_array_equal(X2, X)
+            np.testing.assert_array_equal(y2, y)
+
+            with self.assertRaises(ValueError):
+                list(file_chunks(path, "label"))
+
+    def test_artifact_is_referenced_by_hash(self):
+        X, y = assemble(synthetic_chunks(500, 0), 500)
+        model = train(X, y, n_estimators=5, n_jobs=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/model.pkl"
+            sha = write_artifact(model, path, {"rows": 500})
+            self.assertEqual(read_manifest(path)["sha256"], sha)
+            self.assertEqual(verify_artifact(path)["rows"], 500)
+
+            with open(path, "ab") as f:
+                f.write(b"tampered")
+            with self.assertRaises(ValueError):
+                verify_artifact(path)
+
+
+
+class TestStreamingEvaluation(unittest.TestCase):
+    def test_chunks_merge_to_full_batch(self):
+        X = uniform_samples(5000, np.random.default_rng(4))
+        truth = truth_scores(X)
+        labels, scores = truth > 50, heuristic_scores(X)
+        parts = []
+        for chunk in np.array_split(np.arange(len(X)), 7):
+            acc = ScorerAccumulator(50)
+            acc.update(scores[chunk], truth[chunk], labels[chunk])
+            parts.append(acc)
+        merged = parts[0]
+        for part in parts[1:]:
+            merged.merge(part)
+        self.assertEqual(merged.confusion.metrics(), binary_metrics(scores, labels, 50))
+        self.assertEqual(merged.histogram.counts.sum(), len(X))
+        histogram = merged.histogram.metrics()
+        expected, _ = np.histogram(scores[~labels], bins=histogram["bin_edges"])
+        self.assertEqual(histogram["negatives"], expected.tolist())
+        self.assertEqual(sum(histogram["positives"]), int(labels.sum()))
+        self.assertAlmostEqual(merged.errors.metrics()["mae"], np.mean(np.abs(scores - truth)))
+
+    def test_sharded_runs_are_deterministic(self):
+        serial, _ = evaluate_sharded(30_000, 50, seed=5, shards=3, workers=1, chunk_rows=4096)
+        parallel, _ = evaluate_sharded(30_000, 50, seed=5, shards=3, workers=3, chunk_rows=10_000)
+        for name in ("model", "heuristic"):
+            self.assertEqual(serial[name].confusion.metrics(), parallel[name].confusion.metrics())
+            np.testing.assert_array_equal(serial[name].calibration.count, parallel[name].calibration.count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,385 @@
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+
+from scoring import FEATURE_NAMES, RISK_LEVELS, risk_level_codes, risk_scores
+
+# XYZ (slippy-map) risk tiles.
+#
+# Tiles are 256 x 256 palette PNGs in Web Mercator, one colour per risk level
+# and transparent where there is no input. Inputs come from one of two
+# sources, each mapping a tile pixel to an input "cell":
+#   - GridInputs: a gridded weather snapshot over a lon/lat bbox (posted to
+#     /tiles/weather), nearest cell per pixel;
+#   - ZoneInputs: the zone registry's current conditions, the zone
+#     containing the pixel.
+# Risk is scored once per cell for each (model version, inputs), so
+# rendering a tile is an index gather plus PNG encoding. A missing tile
+# renders its whole METATILE x METATILE block in one batch and every tile of
+# the block goes to the disk cache, so panning to a neighbour is a file read.
+#
+# TileCache keeps PNGs under <root>/<key>/<z>/<x>/<y>.png, where the key
+# hashes the model version, scoring engine (with the surrogate grid's
+# fingerprint), inputs fingerprint and TILE_FORMAT. Files are written
+# atomically (rename), so preforked workers can share one cache. When the
+# total size passes max_bytes the least recently used files (by mtime,
+# refreshed on hits) are deleted down to LOW_WATERMARK.
+# A tile's ETag is derived from its key and coordinates alone, so a
+# revalidation is answered with 304 without touching the disk. Last-Modified
+# is the later of the inputs' and the scoring artifact's (model.pkl or
+# model_grid.npz) mtimes, so every worker (and a restarted one) sends the
+# same value for the same ETag.
+
+TILE_SIZE = 256
+# Tiles per side rendered together on a miss
+METATILE = 4
+MAX_ZOOM = 18
+# Bump when the rendering changes: part of every cache key and ETag
+TILE_FORMAT = 1
+
+NO_DATA = len(RISK_LEVELS)
+# Level colours (as in the dashboards), then NO_DATA
+PALETTE = ((0x22, 0xC5, 0x5E), (0xEA, 0xB3, 0x08), (0xF9, 0x73, 0x16), (0xEF, 0x44, 0x44), (0, 0, 0))
+ALPHA = (170, 170, 170, 170, 0)
+
+LOW_WATERMARK = 0.8
+# Hits refresh a tile's mtime (its LRU position) at most this often
+TOUCH_INTERVAL = 60.0
+
+
+# --- PNG ---------------------------------------------------------------------
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+_PNG_HEADER = (b"\x89PNG\r\n\x1a\n"
+               + _chunk(b"IHDR", struct.pack(">IIBBBBB", TILE_SIZE, TILE_SIZE, 8, 3, 0, 0, 0))
+               + _chunk(b"PLTE", bytes(v for rgb in PALETTE for v in rgb))
+               + _chunk(b"tRNS", bytes(ALPHA)))
+_PNG_END = _chunk(b"IEND", b"")
+
+
+def encode_png(indexed):
+    """(TILE_SIZE, TILE_SIZE) uint8 palette indices -> PNG bytes."""
+    rows = np.zeros((TILE_SIZE, TILE_SIZE + 1), dtype=np.uint8)  # filter byte 0 per row
+    rows[:, 1:] = indexed
+    return _PNG_HEADER + _chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)) + _PNG_END
+
+
+# --- Tile geometry -------------------------------------------------------------
+
+def pixel_lon(x0, n_tiles, z):
+    """Longitude of each pixel-column centre of tiles x0 .. x0 + n_tiles - 1."""
+    px = np.arange(x0 * TILE_SIZE, (x0 + n_tiles) * TILE_SIZE) + 0.5
+    return px / (TILE_SIZE * 2 ** z) * 360.0 - 180.0
+
+
+def pixel_lat(y0, n_tiles, z):
+    """Latitude of each pixel-row centre of tiles y0 .. y0 + n_tiles - 1 (north first)."""
+    py = np.arange(y0 * TILE_SIZE, (y0 + n_tiles) * TILE_SIZE) + 0.5
+    return np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * py / (TILE_SIZE * 2 ** z)))))
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def not_modified(headers, etag, last_modified):
+    """Whether a conditional GET can be answered with 304 (If-None-Match wins over If-Modified-Since)."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# --- Inputs --------------------------------------------------------------------
+
+class GridInputs:
+    """Gridded weather snapshot: (height * width, 4) features over bbox, row 0 = north."""
+
+    kind = "grid"
+
+    def __init__(self, X, width, height, bbox, updated=None):
+        self.X = np.asarray(X, dtype=np.float64).reshape(height * width, len(FEATURE_NAMES))
+        self.width, self.height = width, height
+        self.bbox = tuple(float(v) for v in bbox)
+        self.updated = time.time() if updated is None else updated
+        digest = hashlib.sha256(struct.pack("<4d2I", *self.bbox, width, height))
+        digest.update(self.X.tobytes())
+        self.key = f"grid-{digest.hexdigest()[:16]}"
+
+    def cells(self, lon, lat):
+        """(len(lat), len(lon)) cell index per pixel, -1 outside the bbox (axis-separable)."""
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        col = np.floor((lon - min_lon) / (max_lon - min_lon) * self.width).astype(np.intp)
+        row = np.floor((max_lat - lat) / (max_lat - min_lat) * self.height).astype(np.intp)
+        col = np.where((col >= 0) & (col < self.width), col, -1)
+        row = np.where((row >= 0) & (row < self.height), row, -1)
+        cell = row[:, None] * self.width + col[None, :]
+        return np.where((row[:, None] >= 0) & (col[None, :] >= 0), cell, -1)
+
+    def level_codes(self, model, version):
+        return risk_level_codes(risk_scores(self.X, model))
+
+    def save(self, path):
+        """Write atomically, so other workers never read a partial snapshot."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, X=self.X, shape=np.array([self.width, self.height]), bbox=np.array(self.bbox))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            width, height = data["shape"].tolist()
+            return cls(data["X"], width, height, data["bbox"].tolist(), updated=os.stat(path).st_mtime)
+
+
+class ZoneInputs:
+    """Current zone conditions: a pixel takes the conditions of the zone containing it."""
+
+    kind = "zones"
+
+    def __init__(self, registry):
+        self.registry = registry
+        # fingerprint() first: it picks up conditions other workers wrote
+        self.key = f"zones-{registry.fingerprint()}"
+        self.updated = registry.updated
+
+    def cells(self, lon, lat):
+        lon_grid, lat_grid = np.meshgrid(lon, lat)
+        return self.registry.locate(lon_grid, lat_grid).reshape(len(lat), len(lon))
+
+    def level_codes(self, model, version):
+        return self.registry.risk(model, version)["risk_level"]
+
+
+class WeatherSource:
+    """The current GridInputs on disk, reloaded when the file changes (by any worker)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._signature = None
+        self._grid = None
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def current(self):
+        """GridInputs, or None when no weather grid has been set."""
+        signature = self._stat()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._grid = GridInputs.load(self.path) if signature else None
+                    self._signature = signature
+        return self._grid
+
+    def set(self, grid):
+        grid.save(self.path)
+        return self.current()
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return self.current()
+
+
+# --- Disk cache ------------------------------------------------------------------
+
+class TileCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._bytes = None  # estimate, recounted on every prune
+        self._lock = threading.Lock()
+
+    def path(self, key, z, x, y):
+        return os.path.join(self.root, key, str(z), str(x), f"{y}.png")
+
+    def get(self, key, z, x, y, count=True):
+        path = self.path(key, z, x, y)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += count
+            return None
+        with self._lock:
+            self.hits += count
+        return data
+
+    def put_many(self, key, z, tiles):
+        """Store {(x, y): png} atomically; prune if over the size bound."""
+        written = 0
+        for (x, y), data in tiles.items():
+            path = self.path(key, z, x, y)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            written += len(data)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_size()
+            else:
+                self._bytes += written
+            if self._bytes > self.max_bytes:
+                self.prune()
+
+    def _files(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".png"):
+                    path = os.path.join(directory, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def prune(self):
+        """Delete least recently used tiles down to LOW_WATERMARK * max_bytes."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * LOW_WATERMARK
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evicted += 1
+        self._bytes = total
+        # Drop directories emptied by the eviction (e.g. old model versions)
+        for directory, subdirs, names in os.walk(self.root, topdown=False):
+            if directory != self.root and not subdirs and not names:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                    "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+# --- Rendering -------------------------------------------------------------------
+
+class TileRenderer:
+    """Metatile rendering on top of a TileCache, with per-cell risk cached per key."""
+
+    def __init__(self, cache, metatile=METATILE):
+        self.cache = cache
+        self.metatile = metatile
+        self.metatiles_rendered = 0
+        self.render_seconds = 0.0
+        self._codes = (None, None)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(version, engine, inputs):
+        raw = f"{version}|{engine}|{inputs.key}|{TILE_FORMAT}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+    @staticmethod
+    def etag(key, z, x, y):
+        return f'"{key}-{z}-{x}-{y}"'
+
+    def invalidate(self, version=None):
+        """Model swapped: drop the in-memory cell risk (disk entries are keyed by version)."""
+        self._codes = (None, None)
+
+    def _palette_codes(self, key, inputs, model, version):
+        """Palette index per input cell, with NO_DATA appended so that cell -1 maps to it."""
+        cached_key, codes = self._codes
+        if cached_key != key:
+            levels = np.asarray(inputs.level_codes(model, version))
+            codes = np.append(np.where(levels >= 0, levels, NO_DATA), NO_DATA).astype(np.uint8)
+            self._codes = (key, codes)
+        return codes
+
+    def render_metatile(self, key, inputs, model, version, z, x0, y0, n_x, n_y):
+        """{(x, y): png} for the n_x x n_y block of tiles starting at (x0, y0)."""
+        codes = self._palette_codes(key, inputs, model, version)
+        pixels = codes[inputs.cells(pixel_lon(x0, n_x, z), pixel_lat(y0, n_y, z))]
+        tiles = {}
+        for j in range(n_y):
+            for i in range(n_x):
+                block = pixels[j * TILE_SIZE:(j + 1) * TILE_SIZE, i * TILE_SIZE:(i + 1) * TILE_SIZE]
+                tiles[(x0 + i, y0 + j)] = encode_png(block)
+        return tiles
+
+    def tile(self, key, inputs, model, version, z, x, y):
+        """PNG for tile (z, x, y): from the disk cache, or rendered with its metatile."""
+        data = self.cache.get(key, z, x, y)
+        if data is not None:
+            return data
+        m = min(self.metatile, 2 ** z)
+        x0, y0 = x - x % m, y - y % m
+        block = (key, z, x0, y0)
+        with self._lock:
+            lock = self._locks.setdefault(block, threading.Lock())
+        # Concurrent misses in one metatile wait for a single render
+        with lock:
+            data = self.cache.get(key, z, x, y, count=False)
+            if data is None:
+                start = time.perf_counter()
+                tiles = self.render_metatile(key, inputs, model, version, z, x0, y0, m, m)
+                with self._lock:
+                    self.render_seconds += time.perf_counter() - start
+                    self.metatiles_rendered += 1
+                self.cache.put_many(key, z, tiles)
+                data = tiles[(x, y)]
+        with self._lock:
+            self._locks.pop(block, None)
+        return data
+
+    @staticmethod
+    def last_modified(inputs, artifact_path):
+        """Later of the inputs' and the scoring artifact's mtimes (0 if there is no artifact)."""
+        try:
+            artifact_updated = os.stat(artifact_path).st_mtime
+        except OSError:
+            artifact_updated = 0.0
+        return max(inputs.updated, artifact_updated)
+
+    def stats(self):
+        return {**self.cache.stats(), "metatiles_rendered": self.metatiles_rendered,
+                "render_seconds": round(self.render_seconds, 4), "metatile": self.metatile}
@@ -1,61 +1,247 @@
-import pandas as pd
+import argparse
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-import joblib
-import os
+
+from model_artifact import DEFAULT_ARTIFACT, write_artifact
 
 # FROZEN: Reference Implementation v1.0-RC
 # This script generates the standard model artifact used in the final system.
-print("Training final wildfire risk model...")
-
-# 1. Generate Synthetic Training Data (Representing CA Climate)
-np.random.seed(42)
-n_samples = 2000
-
-# Features
-# Temperature (0-50 C) - High temp is bad
-temp = np.random.uniform(0, 50, n_samples)
-# Humidity (0-100 %) - Low humidity is bad
-humidity = np.random.uniform(0, 100, n_samples)
-# Wind Speed (0-100 km/h) - High wind is bad
-wind = np.random.uniform(0, 100, n_samples)
-# Vegetation Moisture (0-1 index) - Low moisture is bad
-veg = np.random.uniform(0, 1, n_samples)
-
-X = pd.DataFrame({
-    'temp': temp,
-    'humidity': humidity,
-    'wind': wind,
-    'veg': veg
-})
-
-# Target: Risk Score (0-100)
-# Formula: Base weights (normalized features)
-# Score = (40 * nT + 20 * nW - 30 * nH - 30 * nV) + Intercept
-# Added interaction: High Temp (nT > 0.8) + High Wind (nW > 0.7) -> Additional +15 risk
-nT = temp / 50.0
-nH = humidity / 100.0
-nW = wind / 100.0
-nV = veg
-
-score = (40 * nT) + (20 * nW) - (30 * nH) - (30 * nV) + 40
-
-# Add non-linear interactions (e.g. Extreme Heat + Wind = Exponential Risk)
-score += 20 * (nT * nW) 
-
-# Add random noise and clip to 0-100
-y = np.clip(score + np.random.normal(0, 5, n_samples), 0, 100)
-
-# 2. Train Model
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X, y)
-
-# 3. Save Model Artifact
-output_path = os.path.join(os.path.dirname(__file__), "model.pkl")
-joblib.dump(model, output_path)
-print(f"Model saved to: {output_path}")
-
-# Also copy to prototype_app for direct loading
-proto_path = os.path.join(os.path.dirname(__file__), "../prototype_app/model.pkl")
-joblib.dump(model, proto_path)
-print(f"Model copied to: {proto_path}")
+#
+# `python train_model.py` with no arguments reproduces the v1.0-RC dataset
+# (2000 samples drawn with np.random.seed(42)) and model parameters. Larger
+# runs use a chunked generator or loader that keeps features as float32
+# (the dtype the forest trains on anyway), fit on all cores and report wall
+# time and peak memory per phase. The artifact is written once, to
+# backend/model.pkl, with its SHA-256 in model_manifest.json.
+#
+# Usage:
+#   python train_model.py                                # frozen reference model
+#   python train_model.py --samples 5000000 --n-jobs -1  # synthetic, all cores
+#   python train_model.py --data archive.csv --target risk
+
+FEATURES = ("temp", "humidity", "wind", "veg")
+FEATURE_LOW = np.array([0.0, 0.0, 0.0, 0.0])
+FEATURE_HIGH = np.array([50.0, 100.0, 100.0, 1.0])
+# Input column aliases (the API names veg "veg_moisture")
+COLUMN_ALIASES = {"veg_moisture": "veg"}
+
+REFERENCE_SAMPLES = 2000
+REFERENCE_SEED = 42
+CHUNK_ROWS = 1_000_000
+
+
+# --- Data --------------------------------------------------------------------
+
+def synthetic_target(temp, humidity, wind, veg, noise):
+    """
+    Target: Risk Score (0-100)
+    Score = (40 * nT + 20 * nW - 30 * nH - 30 * nV) + Intercept, plus a
+    non-linear interaction (Extreme Heat + Wind = Exponential Risk) and noise.
+    """
+    nT = temp / 50.0
+    nH = humidity / 100.0
+    nW = wind / 100.0
+    nV = veg
+
+    score = (40 * nT) + (20 * nW) - (30 * nH) - (30 * nV) + 40
+    score += 20 * (nT * nW)
+    return np.clip(score + noise, 0, 100)
+
+
+def reference_dataset(n_samples=REFERENCE_SAMPLES, seed=REFERENCE_SEED):
+    """The v1.0-RC dataset: same global-RandomState draw order as the original script."""
+    rs = np.random.RandomState(seed)
+    temp = rs.uniform(0, 50, n_samples)
+    humidity = rs.uniform(0, 100, n_samples)
+    wind = rs.uniform(0, 100, n_samples)
+    veg = rs.uniform(0, 1, n_samples)
+    y = synthetic_target(temp, humidity, wind, veg, rs.normal(0, 5, n_samples))
+    X = np.column_stack([temp, humidity, wind, veg]).astype(np.float32)
+    return X, y
+
+
+def synthetic_chunks(n_samples, seed, chunk_rows=CHUNK_ROWS):
+    """
+    Yield (X float32, y float64) chunks of synthetic data.
+
+    Chunk k draws from its own SeedSequence child, so the data only depends
+    on (seed, chunk_rows) and chunks could be produced in any order.
+    """
+    for k, start in enumerate(range(0, n_samples, chunk_rows)):
+        m = min(chunk_rows, n_samples - start)
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(k,)))
+        X = rng.uniform(FEATURE_LOW, FEATURE_HIGH, size=(m, len(FEATURES)))
+        y = synthetic_target(X[:, 0], X[:, 1], X[:, 2], X[:, 3], rng.normal(0, 5, m))
+        yield X.astype(np.float32), y
+
+
+def file_chunks(path, target, chunk_rows=CHUNK_ROWS):
+    """
+    Yield (X float32, y float64) chunks from a CSV archive, a directory with
+    X.npy / y.npy, or an .npz with X / y arrays.
+
+    The .npy directory is memory-mapped and read one chunk at a time. Members
+    of an .npz cannot be mapped: each array is read into memory whole on
+    first access, so large datasets should use the directory form. CSV files
+    are parsed for the feature and target columns only (other columns, e.g.
+    station names, are skipped), features as float32 and the target as
+    float64.
+    """
+    if os.path.isdir(path) or path.endswith(".npz"):
+        if os.path.isdir(path):
+            X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+            y = np.load(os.path.join(path, "y.npy"), mmap_mode="r")
+        else:
+            with np.load(path) as data:
+                X, y = data["X"], data["y"]
+        for start in range(0, len(y), chunk_rows):
+            yield (np.asarray(X[start:start + chunk_rows], dtype=np.float32),
+                   np.asarray(y[start:start + chunk_rows], dtype=np.float64))
+        return
+
+    import pandas as pd
+    # Training column name -> column name in the file (first match wins)
+    found = {}
+    for column in pd.read_csv(path, nrows=0).columns:
+        found.setdefault(COLUMN_ALIASES.get(column, column), column)
+    missing = [c for c in (*FEATURES, target) if c not in found]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {missing}")
+    dtypes = {found[c]: np.float32 for c in FEATURES}
+    dtypes[found[target]] = np.float64
+    reader = pd.read_csv(path, chunksize=chunk_rows, usecols=list(dtypes), dtype=dtypes)
+    for chunk in reader:
+        yield (chunk[[found[c] for c in FEATURES]].to_numpy(dtype=np.float32),
+               chunk[found[target]].to_numpy(dtype=np.float64))
+
+
+def assemble(chunks, n_rows=None):
+    """Stack chunks into one (X, y); preallocated when the row count is known."""
+    if n_rows is None:
+        parts = list(chunks)
+        return (np.concatenate([p[0] for p in parts]) if parts else np.empty((0, len(FEATURES)), np.float32),
+                np.concatenate([p[1] for p in parts]) if parts else np.empty(0))
+    X = np.empty((n_rows, len(FEATURES)), dtype=np.float32)
+    y = np.empty(n_rows, dtype=np.float64)
+    pos = 0
+    for X_chunk, y_chunk in chunks:
+        X[pos:pos + len(y_chunk)] = X_chunk
+        y[pos:pos + len(y_chunk)] = y_chunk
+        pos += len(y_chunk)
+    return X[:pos], y[:pos]
+
+
+# --- Phase reporting -----------------------------------------------------------
+
+def current_rss():
+    """Resident set size in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PhaseReport:
+    """Wall time and peak RSS per named phase, sampled by a background thread."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        peak = [current_rss()]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(self.interval):
+                peak[0] = max(peak[0], current_rss())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            done.set()
+            sampler.join()
+            peak[0] = max(peak[0], current_rss())
+            self.phases.append({"phase": name, "wall_s": round(wall, 3),
+                                "peak_rss_mb": round(peak[0] / 2**20, 1)})
+            print(f"[{name}] {wall:.2f}s, peak RSS {peak[0] / 2**20:.0f} MB")
+
+
+# --- Training ------------------------------------------------------------------
+
+def train(X, y, n_estimators=100, n_jobs=-1, random_state=REFERENCE_SEED, max_depth=None):
+    # Trees are independent, so fitting parallelises across cores; per-tree
+    # seeds are drawn up front, so results don't depend on n_jobs
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state,
+                                  max_depth=max_depth, n_jobs=n_jobs)
+    model.fit(X, y)
+    # Serve single-threaded: per-request joblib dispatch costs more than it saves
+    model.n_jobs = None
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the wildfire risk model")
+    parser.add_argument("--samples", type=int, default=REFERENCE_SAMPLES,
+                        help="Synthetic samples (default: the frozen 2000-sample reference set)")
+    parser.add_argument("--seed", type=int, default=REFERENCE_SEED)
+    parser.add_argument("--data", help="Train on a CSV archive, a directory with X.npy / y.npy or an .npz (X, y) "
+                                       "instead of synthetic data")
+    parser.add_argument("--target", default="risk", help="Target column for --data CSV files")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Cores used for fitting (-1 = all)")
+    parser.add_argument("--output", default=DEFAULT_ARTIFACT)
+    args = parser.parse_args(argv)
+
+    print("Training final wildfire risk model...")
+    report = PhaseReport()
+
+    # 1. Generate / load training data
+    with report.phase("data"):
+        if args.data:
+            X, y = assemble(file_chunks(args.data, args.target, args.chunk_rows))
+            source = os.path.basename(args.data)
+        elif args.samples == REFERENCE_SAMPLES and args.seed == REFERENCE_SEED:
+            X, y = reference_dataset()
+            source = "synthetic:reference-v1.0-RC"
+        else:
+            X, y = assemble(synthetic_chunks(args.samples, args.seed, args.chunk_rows), args.samples)
+            source = f"synthetic:seed={args.seed}"
+    print(f"Training rows: {len(y):,} ({X.nbytes / 2**20:.1f} MB features, {X.dtype})")
+
+    # 2. Train Model
+    with report.phase("fit"):
+        model = train(X, y, args.n_estimators, args.n_jobs, args.seed, args.max_depth)
+
+    # 3. Save Model Artifact (written once; consumers reference it by hash)
+    metadata = {
+        "data_source": source,
+        "rows": int(len(y)),
+        "features": list(FEATURES),
+        "params": {"n_estimators": args.n_estimators, "max_depth": args.max_depth,
+                   "random_state": args.seed},
+    }
+    with report.phase("save"):
+        sha = write_artifact(model, args.output, {**metadata, "phases": report.phases})
+    print(f"Model saved to: {args.output} (sha256 {sha})")
+    return sha
+
+
+if __name__ == "__main__":
+    main()
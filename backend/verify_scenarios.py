@@ -1,6 +1,8 @@
 import math
 import os
 
+import risk_kernel
+
 MODEL_PATH = "model.pkl"
 
 def get_risk_level(score):
@@ -22,17 +24,8 @@ def predict_risk(temp, hum, wind, veg):
     except Exception as e:
         print(f"Model Error: {e}. Using Fallback.")
 
-    # Tuned Fallback Logic (Matches model.py)
-    n_temp = min(temp / 50.0, 1.0)
-    n_hum = min(hum / 100.0, 1.0)
-    n_wind = min(wind / 100.0, 1.0)
-    n_veg = min(veg, 1.0)
-    
-    score = (40 * n_temp) + (20 * n_wind) - (30 * n_hum) - (30 * n_veg) + 40
-    if n_temp > 0.8 and n_wind > 0.7:
-        score += 20
-        
-    return max(0.0, min(score, 100.0))
+    # Tuned Fallback Logic (shared risk kernel, scalar backend)
+    return risk_kernel.fallback_row(risk_kernel.normalize_row(temp, hum, wind, veg))
 
 def run_scenario(name, inputs):
     print(f"\n--- Scenario: {name} ---")
@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no preforked workers to coordinate with
+    fcntl = None
+
+from scoring import FEATURE_NAMES, FEATURE_SCALE, RISK_LEVELS, DRIVER_LIST_TABLE, score_batch, pack_codes
+
+# Zone registry: management-zone polygons loaded from GeoJSON, a uniform grid
+# index over them and batched point -> zone lookup.
+#
+# Every polygon ring is flattened into one edge table (x0, y0, x1, y1) with
+# per-zone offsets. The index splits the registry's bounding box into square
+# cells and lists, per cell, the zones whose bounding box overlaps it (CSR
+# arrays). A lookup for N points
+#   1. maps each point to its grid cell,
+#   2. expands (point, candidate zone) pairs from the cell lists and drops
+#      pairs failing the zone bounding-box test,
+#   3. runs an even-odd ray-casting test in one vectorized pass (holes and
+#      MultiPolygons fall out of even-odd). Each zone's bbox is cut into
+#      EDGE_SLABS horizontal slabs listing the edges overlapping them, and a
+#      point only tests the edges of its slab: any edge a horizontal ray at
+#      the point's latitude can cross overlaps that slab.
+# A point inside several overlapping zones resolves to the first in file order.
+#
+# Zones may carry current conditions (temp, humidity, wind, veg_moisture
+# properties, or updated later); their risk is scored once per model version
+# and per update, so lookups only index into precomputed arrays.
+#
+# With a conditions_path, updates are shared between processes (preforked
+# workers, recycled or restarted ones): update_conditions rewrites that .npz
+# atomically under an exclusive flock, and every registry picks up a newer
+# file on its next read (one stat) and rescores only the zones that changed.
+# The file records which GeoJSON it applies to and is ignored for any other.
+
+ZONES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zones.geojson")
+
+NO_ZONE = -1
+# Target zones per index cell (by bounding-box area), bounds the pair expansion
+ZONES_PER_CELL = 2.0
+MAX_GRID_CELLS = 1 << 20
+# Horizontal edge buckets per zone
+EDGE_SLABS = 16
+
+
+def _polygons(geometry):
+    """Rings of a Polygon / MultiPolygon geometry as a list of polygons (lists of rings)."""
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    raise ValueError(f"Unsupported geometry type '{geometry['type']}'")
+
+
+def _ring_edges(ring):
+    pts = np.asarray(ring, dtype=np.float64)[:, :2]
+    if len(pts) and not np.array_equal(pts[0], pts[-1]):
+        pts = np.vstack([pts, pts[:1]])
+    return np.hstack([pts[:-1], pts[1:]])
+
+
+class ZoneRegistry:
+    def __init__(self, features=(), conditions_path=None):
+        self.ids, self.names, edges, counts, bboxes = [], [], [], [], []
+        conditions = []
+        for i, feature in enumerate(features):
+            props = feature.get("properties") or {}
+            rings = [_ring_edges(r) for poly in _polygons(feature["geometry"]) for r in poly]
+            zone_edges = np.vstack(rings) if rings else np.empty((0, 4))
+            self.ids.append(str(props.get("id", feature.get("id", i))))
+            self.names.append(props.get("name", self.ids[-1]))
+            edges.append(zone_edges)
+            counts.append(len(zone_edges))
+            xs, ys = zone_edges[:, [0, 2]], zone_edges[:, [1, 3]]
+            bboxes.append((xs.min(), ys.min(), xs.max(), ys.max()) if len(zone_edges) else (np.inf,) * 2 + (-np.inf,) * 2)
+            conditions.append([props.get(name, np.nan) for name in FEATURE_NAMES])
+
+        self.index_of = {zone_id: i for i, zone_id in enumerate(self.ids)}
+        self.edges = np.vstack(edges) if edges else np.empty((0, 4))
+        self.edge_count = np.array(counts, dtype=np.intp)
+        self.bbox = np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+        # Clamped to the input contract like the API validators (NaN = unknown)
+        self.conditions = np.clip(np.array(conditions, dtype=np.float64).reshape(-1, len(FEATURE_NAMES)),
+                                  0.0, FEATURE_SCALE)
+        self._build_grid()
+        self._build_slabs()
+
+        self._lock = threading.Lock()
+        self._risk = None
+        self._risk_version = None
+        self._risk_model = None
+        self._tables = None
+        self._fingerprint = None
+        # Source file mtime (set by load), then that of the shared conditions
+        self.updated = 0.0
+
+        # Identifies the GeoJSON (geometry and initial conditions) in the shared file
+        digest = hashlib.sha256("\n".join(self.ids).encode())
+        digest.update(self.edges.tobytes())
+        digest.update(self.conditions.tobytes())
+        self.source_key = digest.hexdigest()[:16]
+        self.conditions_path = conditions_path
+        self._conditions_signature = None
+
+    @classmethod
+    def from_geojson(cls, source, conditions_path=None):
+        """Registry from a GeoJSON FeatureCollection (path or parsed dict)."""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source) as f:
+                source = json.load(f)
+        registry = cls(source.get("features", []), conditions_path)
+        registry.sync()
+        return registry
+
+    @classmethod
+    def load(cls, path=ZONES_PATH, conditions_path=None):
+        """Registry from `path`; empty if the file does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        registry = cls.from_geojson(path, conditions_path)
+        registry.updated = max(registry.updated, os.stat(path).st_mtime)
+        print(f"Loaded {len(registry)} zones from {path} "
+              f"({registry.grid_shape[0]}x{registry.grid_shape[1]} index cells)")
+        return registry
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- Spatial index --------------------------------------------------------
+
+    def _build_grid(self):
+        finite = np.isfinite(self.bbox).all(axis=1)
+        if not finite.any():
+            self.origin, self.cell_size, self.grid_shape = np.zeros(2), 1.0, (1, 1)
+            self.cell_start, self.cell_zones = np.zeros(2, dtype=np.intp), np.empty(0, dtype=np.intp)
+            return
+        boxes = self.bbox[finite]
+        lo, hi = boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)
+        extent = np.maximum(hi - lo, 1e-9)
+        # Cell area ~ ZONES_PER_CELL mean zone areas, capped at MAX_GRID_CELLS cells
+        mean_area = max(float(np.mean(np.prod(boxes[:, 2:] - boxes[:, :2], axis=1))), 1e-12)
+        cell_size = max(np.sqrt(mean_area * ZONES_PER_CELL), np.sqrt(np.prod(extent) / MAX_GRID_CELLS))
+        nx, ny = (np.floor(extent / cell_size).astype(int) + 1).tolist()
+        self.origin, self.cell_size, self.grid_shape = lo, cell_size, (ny, nx)
+
+        # Cell ranges covered by each zone's bbox, then CSR lists per cell
+        zone_ids = np.flatnonzero(finite)
+        c0 = np.floor((boxes[:, :2] - lo) / cell_size).astype(np.intp)
+        c1 = np.floor((boxes[:, 2:] - lo) / cell_size).astype(np.intp)
+        cells, owners = [], []
+        for z, (x0, y0), (x1, y1) in zip(zone_ids, c0, c1):
+            gx, gy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+            cells.append((gy * nx + gx).ravel())
+            owners.append(np.full(gx.size, z, dtype=np.intp))
+        cells, owners = np.concatenate(cells), np.concatenate(owners)
+        order = np.lexsort((owners, cells))
+        self.cell_zones = owners[order]
+        self.cell_start = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength=nx * ny))]).astype(np.intp)
+
+    def _build_slabs(self):
+        zone = np.repeat(np.arange(len(self)), self.edge_count)
+        e_lo = np.minimum(self.edges[:, 1], self.edges[:, 3])
+        e_hi = np.maximum(self.edges[:, 1], self.edges[:, 3])
+        s0, s1 = self._slab(zone, e_lo), self._slab(zone, e_hi)
+        n = s1 - s0 + 1
+        edge = np.repeat(np.arange(len(self.edges)), n)
+        key = zone[edge] * EDGE_SLABS + s0[edge] + (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n))
+        order = np.argsort(key, kind="stable")
+        self.slab_edges = edge[order]
+        self.slab_start = np.concatenate(
+            [[0], np.cumsum(np.bincount(key, minlength=len(self) * EDGE_SLABS))]).astype(np.intp)
+
+    def _slab(self, zone, y):
+        """Slab of latitude `y` within each zone's bbox (clipped to [0, EDGE_SLABS))."""
+        y_lo, y_hi = self.bbox[zone, 1], self.bbox[zone, 3]
+        height = np.where(y_hi > y_lo, y_hi - y_lo, 1.0)
+        s = np.floor((y - y_lo) / height * EDGE_SLABS)
+        return np.clip(s, 0, EDGE_SLABS - 1).astype(np.intp)
+
+    def _cells(self, lon, lat):
+        """Grid cell of each point; -1 outside the indexed extent."""
+        ny, nx = self.grid_shape
+        gx = np.floor((lon - self.origin[0]) / self.cell_size)
+        gy = np.floor((lat - self.origin[1]) / self.cell_size)
+        inside = (gx >= 0) & (gx < nx) & (gy >= 0) & (gy < ny)
+        return np.where(inside, gy * nx + gx, -1).astype(np.intp)
+
+    def locate(self, lon, lat):
+        """Zone index for each (lon, lat) point, NO_ZONE where none contains it."""
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        result = np.full(lon.shape, NO_ZONE, dtype=np.intp)
+        if not len(self):
+            return result
+
+        # 1-2. Candidate (point, zone) pairs from the grid, bbox-filtered
+        cell = self._cells(lon, lat)
+        hit = np.flatnonzero(cell >= 0)
+        starts, ends = self.cell_start[cell[hit]], self.cell_start[cell[hit] + 1]
+        n_cand = ends - starts
+        point = np.repeat(hit, n_cand)
+        offset = np.arange(n_cand.sum()) - np.repeat(np.cumsum(n_cand) - n_cand, n_cand)
+        zone = self.cell_zones[np.repeat(starts, n_cand) + offset]
+        box = self.bbox[zone]
+        px, py = lon[point], lat[point]
+        keep = (px >= box[:, 0]) & (px <= box[:, 2]) & (py >= box[:, 1]) & (py <= box[:, 3])
+        point, zone, px, py = point[keep], zone[keep], px[keep], py[keep]
+        if not len(point):
+            return result
+
+        # 3. Even-odd crossings of a ray towards +x, over the edges of each pair's slab
+        key = zone * EDGE_SLABS + self._slab(zone, py)
+        starts = self.slab_start[key]
+        n_edges = self.slab_start[key + 1] - starts
+        pair = np.repeat(np.arange(len(zone)), n_edges)
+        edge = self.slab_edges[np.repeat(starts, n_edges) + (
+            np.arange(n_edges.sum()) - np.repeat(np.cumsum(n_edges) - n_edges, n_edges))]
+        x0, y0, x1, y1 = self.edges[edge].T
+        ex, ey = px[pair], py[pair]
+        spans = (y0 > ey) != (y1 > ey)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x0 + (ey - y0) * (x1 - x0) / (y1 - y0)
+        crossings = np.bincount(pair, weights=spans & (ex < x_cross), minlength=len(zone))
+        inside = (crossings.astype(np.int64) & 1).astype(bool)
+
+        # First containing zone per point (pairs are sorted by zone within a point)
+        point, zone = point[inside], zone[inside]
+        first = np.ones(len(point), dtype=bool)
+        first[1:] = point[1:] != point[:-1]
+        result[point[first]] = zone[first]
+        return result
+
+    # --- Zone risk ------------------------------------------------------------
+
+    def _apply(self, idx, X, updated):
+        """Set conditions[idx] = X and rescore those zones (self._lock held)."""
+        self.conditions[idx] = X
+        self._fingerprint = None
+        self.updated = updated
+        if self._risk is not None and len(idx):
+            if np.isnan(X).any():
+                self._risk = None  # zones lost their conditions: full rescore on next read
+            else:
+                fresh = score_batch(X, self._risk_model)
+                for k in self._risk:
+                    self._risk[k][idx] = fresh[k]
+            self._tables = None
+
+    def _stat_conditions(self):
+        try:
+            st = os.stat(self.conditions_path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _sync(self):
+        """Apply the shared conditions file if it changed since the last read (self._lock held)."""
+        if self.conditions_path is None:
+            return
+        signature = self._stat_conditions()
+        if signature is None or signature == self._conditions_signature:
+            return
+        self._conditions_signature = signature
+        with np.load(self.conditions_path) as data:
+            if str(data["source_key"]) != self.source_key:
+                return
+            shared = data["conditions"]
+        same = (shared == self.conditions) | (np.isnan(shared) & np.isnan(self.conditions))
+        idx = np.flatnonzero(~same.all(axis=1))
+        self._apply(idx, shared[idx], signature[1] / 1e9)
+
+    def sync(self):
+        """Pick up conditions written by other processes."""
+        with self._lock:
+            self._sync()
+
+    def _write_conditions(self, conditions):
+        directory = os.path.dirname(self.conditions_path) or "."
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, conditions=conditions, source_key=self.source_key)
+        os.replace(tmp, self.conditions_path)
+
+    def update_conditions(self, zone_ids, X):
+        """Set current conditions (N, 4) for the given zone ids; rescores only those zones."""
+        idx = np.array([self.index_of[z] for z in zone_ids], dtype=np.intp)
+        X = np.clip(np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURE_NAMES)), 0.0, FEATURE_SCALE)
+        with self._lock:
+            if self.conditions_path is None:
+                self._apply(idx, X, time.time())
+                return len(idx)
+            os.makedirs(os.path.dirname(self.conditions_path) or ".", exist_ok=True)
+            with open(self.conditions_path + ".lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # Read-modify-write of the latest shared state: concurrent
+                # updates from other workers are kept, not overwritten
+                self._sync()
+                conditions = self.conditions.copy()
+                conditions[idx] = X
+                self._write_conditions(conditions)
+                self._sync()
+        return len(idx)
+
+    def fingerprint(self):
+        """Content hash of the geometry and current conditions (same in every process)."""
+        with self._lock:
+            self._sync()
+            if self._fingerprint is None:
+                digest = hashlib.sha256(self.edges.tobytes())
+                digest.update(self.edge_count.tobytes())
+                digest.update(self.conditions.tobytes())
+                self._fingerprint = digest.hexdigest()[:16]
+            return self._fingerprint
+
+    def risk(self, model, version):
+        """
+        score_batch arrays for every zone under `model` (rows without
+        conditions are NaN / -1); recomputed only when the model version changes.
+        """
+        with self._lock:
+            self._sync()
+            if self._risk is None or self._risk_version != version:
+                known = ~np.isnan(self.conditions).any(axis=1)
+                risk = {
+                    "risk_score": np.full(len(self), np.nan),
+                    "risk_level": np.full(len(self), -1, dtype=np.intp),
+                    "drivers": np.full((len(self), 3), -1, dtype=np.int8),
+                }
+                if known.any():
+                    scores = score_batch(self.conditions[known], model)
+                    for k in risk:
+                        risk[k][known] = scores[k]
+                self._risk, self._risk_version, self._risk_model = risk, version, model
+                self._tables = None
+            return self._risk
+
+    def _json_tables(self, model, version):
+        """
+        Per-zone JSON values (id, name, score, level, drivers), each list
+        ending in None so that NO_ZONE (-1) indexes to None.
+        """
+        risk = self.risk(model, version)
+        with self._lock:
+            if self._tables is None:
+                known = (risk["risk_level"] >= 0).tolist()
+                scores = np.round(risk["risk_score"], 2).tolist()
+                levels = risk["risk_level"].tolist()
+                drivers = pack_codes(risk["drivers"]).tolist()
+                self._tables = (
+                    self.ids + [None],
+                    self.names + [None],
+                    [s if k else None for s, k in zip(scores, known)] + [None],
+                    [RISK_LEVELS[c] if k else None for c, k in zip(levels, known)] + [None],
+                    [DRIVER_LIST_TABLE[p] if k else None for p, k in zip(drivers, known)] + [None],
+                )
+            return self._tables
+
+    def lookup(self, lon, lat, model, version):
+        """JSON edge: zone and current risk for each point, as parallel lists (None = no zone)."""
+        idx = self.locate(lon, lat).tolist()
+        ids, names, scores, levels, drivers = self._json_tables(model, version)
+        return {
+            "zone_id": [ids[i] for i in idx],
+            "zone_name": [names[i] for i in idx],
+            "risk_score": [scores[i] for i in idx],
+            "risk_level": [levels[i] for i in idx],
+            "primary_drivers": [list(drivers[i]) if drivers[i] else None for i in idx],
+        }
@@ -9,20 +9,23 @@ const DashboardOverview: React.FC = () => {
     const [metrics, setMetrics] = useState<RiskMetric[]>([]);
     const [alerts, setAlerts] = useState<Alert[]>([]);
     const [chartData, setChartData] = useState<RiskChartData | undefined>(undefined);
+    const [sensitivityData, setSensitivityData] = useState<RiskChartData | undefined>(undefined);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
         const fetchData = async () => {
             try {
-                const [metricsData, alertsData, trendData] = await Promise.all([
+                const [metricsData, alertsData, trendData, sensitivity] = await Promise.all([
                     RiskService.getMetrics(),
                     RiskService.getAlerts(),
-                    RiskService.getRiskTrend()
+                    RiskService.getRiskTrend(),
+                    RiskService.getWindSensitivity()
                 ]);
 
                 setMetrics(metricsData);
                 setAlerts(alertsData);
                 setChartData(trendData);
+                setSensitivityData(sensitivity);
             } catch (error) {
                 console.error("Failed to fetch dashboard data", error);
             } finally {
@@ -65,6 +68,13 @@ const DashboardOverview: React.FC = () => {
                     <RiskChart data={chartData} />
                 </div>
 
+                <div className="chart-section card">
+                    <div className="section-header">
+                        <h3>Risk vs Wind Speed</h3>
+                    </div>
+                    <RiskChart data={sensitivityData} />
+                </div>
+
                 <div className="alerts-section card">
                     <div className="section-header">
                         <h3>Recent Alerts</h3>
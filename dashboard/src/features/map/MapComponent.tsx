@@ -59,6 +59,14 @@ const MapComponent: React.FC = () => {
                     noWrap={true}
                 />
 
+                {/* Risk overlay rendered by the API (backend/tiles.py) */}
+                <TileLayer
+                    url="http://localhost:8000/tiles/{z}/{x}/{y}"
+                    opacity={0.7}
+                    maxNativeZoom={18}
+                    noWrap={true}
+                />
+
                 {riskZones && (
                     <GeoJSON
                         data={riskZones as any}
@@ -80,6 +80,28 @@ const calculateFallbackRisk = (temp: number, humidity: number, wind: number, veg
     return Math.max(0, Math.min(score, 100));
 };
 
+// Sensitivity API Response Type (2-D what-if surface: first feature along rows)
+interface ApiSensitivityResponse {
+    features: string[];
+    grid: Record<string, number[]>;
+    values: number[][];
+}
+
+// Wind sweep at a few humidity levels, other conditions held at currentConditions
+const SENSITIVITY_HUMIDITY = [15, 45, 75];
+const SENSITIVITY_WIND_POINTS = 21;
+const sensitivityColors = ['#ef4444', '#f59e0b', '#3b82f6'];
+
+const toSensitivityChart = (humidity: number[], wind: number[], values: number[][]): RiskChartData => ({
+    labels: wind.map(w => `${Math.round(w)}`),
+    datasets: humidity.map((h, i) => ({
+        label: `Humidity ${Math.round(h)}%`,
+        data: values[i],
+        fill: false,
+        borderColor: sensitivityColors[i % sensitivityColors.length],
+    })),
+});
+
 const getRiskStatus = (score: number): 'low' | 'moderate' | 'high' | 'extreme' => {
     if (score < 30) return 'low';
     if (score < 50) return 'moderate';
@@ -155,6 +177,31 @@ export const RiskService = {
     getAlerts: async (): Promise<Alert[]> => {
         return new Promise((resolve) => setTimeout(() => resolve(mockAlerts), 500));
     },
+    getWindSensitivity: async (): Promise<RiskChartData> => {
+        try {
+            const response = await fetch('http://localhost:8000/sensitivity', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    features: ['humidity', 'wind'],
+                    points: [SENSITIVITY_HUMIDITY.length, SENSITIVITY_WIND_POINTS],
+                    ranges: { humidity: [SENSITIVITY_HUMIDITY[0], SENSITIVITY_HUMIDITY[SENSITIVITY_HUMIDITY.length - 1]] },
+                    base: currentConditions,
+                })
+            });
+
+            if (!response.ok) throw new Error('API Error');
+
+            const data: ApiSensitivityResponse = await response.json();
+            return toSensitivityChart(data.grid.humidity, data.grid.wind, data.values);
+        } catch (error) {
+            console.warn("Sensitivity API unreachable. Using fallback logic.", error);
+            const wind = Array.from({ length: SENSITIVITY_WIND_POINTS }, (_, i) => i * 100 / (SENSITIVITY_WIND_POINTS - 1));
+            const values = SENSITIVITY_HUMIDITY.map(h => wind.map(w =>
+                calculateFallbackRisk(currentConditions.temp, h, w, currentConditions.veg_moisture)));
+            return toSensitivityChart(SENSITIVITY_HUMIDITY, wind, values);
+        }
+    },
     getRiskTrend: async (): Promise<RiskChartData> => {
         return new Promise((resolve) => setTimeout(() => resolve(mockChartData), 800));
     }
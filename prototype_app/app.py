@@ -3,7 +3,7 @@ import pandas as pd
 import numpy as np
 import folium
 from streamlit_folium import st_folium
-from model import WildfireModel
+from model import WildfireModel, DEFAULT_ARTIFACT
 from datetime import datetime
 
 # Page Config
@@ -12,10 +12,81 @@ st.set_page_config(page_title="GeoFireNet Risk Dashboard", page_icon="🔥", lay
 # Initialize Model
 @st.cache_resource
 def load_model():
-    return WildfireModel()
+    # The single artifact written by backend/train_model.py
+    return WildfireModel(model_path=DEFAULT_ARTIFACT or "model.pkl")
 
 model = load_model()
 
+# Define Mock Regions (GeoJSON)
+REGIONS = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "properties": {"name": "North Napa", "id": "1", "temp_offset": 2},
+            "geometry": {"type": "Polygon", "coordinates": [[[-122.5, 38.6], [-122.3, 38.6], [-122.3, 38.4], [-122.5, 38.4], [-122.5, 38.6]]]}
+        },
+        {
+            "type": "Feature",
+            "properties": {"name": "Sonoma East", "id": "2", "temp_offset": -3},
+            "geometry": {"type": "Polygon", "coordinates": [[[-122.8, 38.5], [-122.6, 38.5], [-122.6, 38.3], [-122.8, 38.3], [-122.8, 38.5]]]}
+        },
+        {
+            "type": "Feature",
+            "properties": {"name": "Central Valley", "id": "3", "temp_offset": 5},
+            "geometry": {"type": "Polygon", "coordinates": [[[-122.2, 38.7], [-121.8, 38.7], [-121.8, 38.3], [-122.2, 38.3], [-122.2, 38.7]]]}
+        }
+    ]
+}
+TEMP_OFFSETS = {f["properties"]["name"]: f["properties"].get("temp_offset", 0) for f in REGIONS["features"]}
+
+# Bounded caches: each entry is one (view, inputs) combination
+SCORE_CACHE_ENTRIES = 256
+MAP_CACHE_ENTRIES = 32
+
+def visible_regions(selected_region):
+    """Names of the regions shown for the sidebar selection."""
+    if selected_region == "All Regions":
+        return tuple(TEMP_OFFSETS)
+    return tuple(name for name in TEMP_OFFSETS if name == selected_region)
+
+@st.cache_data(max_entries=SCORE_CACHE_ENTRIES, show_spinner=False)
+def score_regions(names, temp, humidity, wind, veg_moisture):
+    """ML + heuristic scores for all `names` in one batched call each."""
+    local_temp = temp + np.array([TEMP_OFFSETS[n] for n in names], dtype=np.float64)
+    ml = model.predict_batch(local_temp, humidity, wind, veg_moisture)
+    levels, colors = model.get_risk_levels(ml)
+    return {
+        "ml": ml,
+        "baseline": model.predict_heuristic_batch(local_temp, humidity, wind, veg_moisture),
+        "levels": levels,
+        "colors": colors,
+    }
+
+def style_function(feature):
+    return {"fillColor": feature["properties"]["color"], "color": "black", "weight": 1, "fillOpacity": 0.6}
+
+@st.cache_resource(max_entries=MAP_CACHE_ENTRIES, show_spinner=False)
+def build_map(selected_region, temp, humidity, wind, veg_moisture, center, zoom):
+    """Folium map with the scored regions; rebuilt only when the view or inputs change."""
+    names = visible_regions(selected_region)
+    scores = score_regions(names, temp, humidity, wind, veg_moisture)
+    by_name = {f["properties"]["name"]: f for f in REGIONS["features"]}
+    features = []
+    for name, risk_prob, risk_level, color in zip(names, scores["ml"].tolist(), scores["levels"], scores["colors"]):
+        feature = by_name[name]
+        props = {**feature["properties"], "risk_prob": risk_prob, "risk_level": risk_level, "color": color}
+        features.append({**feature, "properties": props})
+
+    # Dynamic center based on session state (Preserves zoom/pan on slider update)
+    m = folium.Map(location=list(center), zoom_start=zoom, tiles="OpenStreetMap")
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        style_function=style_function,
+        tooltip=folium.GeoJsonTooltip(fields=["name", "risk_prob", "risk_level"], localize=True)
+    ).add_to(m)
+    return m
+
 # Sidebar: User Inputs
 st.sidebar.header("🔥 Wildfire Risk Parameters")
 
@@ -69,55 +140,8 @@ with col1:
         st.session_state.map_zoom = region_view["zoom"]
         st.session_state.last_region = selected_region
 
-    # Dynamic center based on session state (Preserves zoom/pan on slider update)
-    m = folium.Map(
-        location=st.session_state.map_center, 
-        zoom_start=st.session_state.map_zoom, 
-        tiles="OpenStreetMap"
-    )
-
-    # Define Mock Regions (GeoJSON) - Same as before
-    mock_regions = {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "properties": {"name": "North Napa", "id": "1", "temp_offset": 2},
-                "geometry": {"type": "Polygon", "coordinates": [[[-122.5, 38.6], [-122.3, 38.6], [-122.3, 38.4], [-122.5, 38.4], [-122.5, 38.6]]]}
-            },
-            {
-                "type": "Feature",
-                "properties": {"name": "Sonoma East", "id": "2", "temp_offset": -3},
-                "geometry": {"type": "Polygon", "coordinates": [[[-122.8, 38.5], [-122.6, 38.5], [-122.6, 38.3], [-122.8, 38.3], [-122.8, 38.5]]]}
-            },
-            {
-                "type": "Feature",
-                "properties": {"name": "Central Valley", "id": "3", "temp_offset": 5},
-                "geometry": {"type": "Polygon", "coordinates": [[[-122.2, 38.7], [-121.8, 38.7], [-121.8, 38.3], [-122.2, 38.3], [-122.2, 38.7]]]}
-            }
-        ]
-    }
-
-    # Filter regions if specific one selected
-    if selected_region != "All Regions":
-        mock_regions["features"] = [f for f in mock_regions["features"] if f["properties"]["name"] == selected_region]
-
-    # Calculate Risk per Region
-    for feature in mock_regions["features"]:
-        props = feature["properties"]
-        local_temp = temp + props.get("temp_offset", 0)
-        risk_prob = model.predict(local_temp, humidity, wind, veg_moisture)
-        risk_level, color = model.get_risk_level(risk_prob)
-        props.update({"risk_prob": risk_prob, "risk_level": risk_level, "color": color})
-
-    def style_function(feature):
-        return {"fillColor": feature["properties"]["color"], "color": "black", "weight": 1, "fillOpacity": 0.6}
-
-    folium.GeoJson(
-        mock_regions,
-        style_function=style_function,
-        tooltip=folium.GeoJsonTooltip(fields=["name", "risk_prob", "risk_level"], localize=True)
-    ).add_to(m)
+    m = build_map(selected_region, temp, humidity, wind, veg_moisture,
+                  tuple(st.session_state.map_center), st.session_state.map_zoom)
 
     # Capture map state to persist zoom/pan on sidebar changes
     map_data = st_folium(
@@ -139,19 +163,13 @@ with col1:
 with col2:
     st.subheader("Regional Analytics")
     
-    # Calculate visible region scores
-    ml_scores = [f["properties"]["risk_prob"] for f in mock_regions["features"]]
-    avg_ml = sum(ml_scores) / len(ml_scores) if ml_scores else 0
+    # Calculate visible region scores (ML and heuristic baseline, one cached batch)
+    scores = score_regions(visible_regions(selected_region), temp, humidity, wind, veg_moisture)
+    ml_scores, base_scores = scores["ml"], scores["baseline"]
+    avg_ml = float(ml_scores.mean()) if len(ml_scores) else 0
     avg_ml_level, _ = model.get_risk_level(avg_ml)
     
-    # Calculate Heuristic Baselines for same regions
-    base_scores = []
-    for f in mock_regions["features"]:
-        props = f["properties"]
-        l_temp = temp + props.get("temp_offset", 0)
-        base_scores.append(model.predict_heuristic(l_temp, humidity, wind, veg_moisture))
-    
-    avg_base = sum(base_scores) / len(base_scores) if base_scores else 0
+    avg_base = float(base_scores.mean()) if len(base_scores) else 0
     avg_base_level, _ = model.get_risk_level(avg_base)
 
     # Side-by-Side Metrics
@@ -1,12 +1,27 @@
 import numpy as np
 import os
+import sys
+
+# Flat-array forest engine and the risk kernel live in backend/ (shared with the API)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import risk_kernel
+try:
+    from forest_engine import FlatForest
+except ImportError:
+    FlatForest = None
+try:
+    from model_artifact import DEFAULT_ARTIFACT, verify_artifact
+except ImportError:
+    DEFAULT_ARTIFACT, verify_artifact = None, None
 
 class WildfireModel:
-    def __init__(self, model_path="model.pkl"):
+    def __init__(self, model_path="model.pkl", engine="flat"):
         """
         Wildfire risk prediction model.
         Attempts to load a trained model from `model_path`.
         Falls back to Mock Logic if file not found or joblib missing.
+        With engine="flat" the forest is evaluated by the backend FlatForest
+        engine instead of sklearn (same outputs, far lower per-call overhead).
         """
         self.model = None
         self.is_mock = True
@@ -14,73 +29,105 @@ class WildfireModel:
         try:
             import joblib
             if os.path.exists(model_path):
+                if verify_artifact is not None:
+                    # Raises if the file doesn't match the hash train_model.py recorded
+                    manifest = verify_artifact(model_path)
+                    if manifest:
+                        print(f"Model artifact sha256 {manifest['sha256'][:12]} verified")
                 self.model = joblib.load(model_path)
+                if engine == "flat" and FlatForest is not None:
+                    self.model = FlatForest.from_sklearn(self.model)
                 self.is_mock = False
                 print(f"Loaded trained model from {model_path}")
         except Exception as e:
             print(f"Error loading model (using fallback): {e}")
         
-        # Mock Coefficients (Fallback) - Syncing with train_model.py weights
-        self.coef_temp = 40.0
-        self.coef_humidity = -30.0
-        self.coef_wind = 20.0
-        self.coef_veg = -30.0
-        self.intercept = 40.0
+        # Mock Coefficients (Fallback) - from the shared risk kernel
+        self.coef_temp = float(risk_kernel.WEIGHTS["temp"])
+        self.coef_humidity = float(risk_kernel.WEIGHTS["humidity"])
+        self.coef_wind = float(risk_kernel.WEIGHTS["wind"])
+        self.coef_veg = float(risk_kernel.WEIGHTS["veg"])
+        self.intercept = float(risk_kernel.INTERCEPT)
 
-    def predict_heuristic(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
-        """
-        Baseline heuristic formula calculation (0-100).
-        This is a linear model used as a comparative baseline.
-        """
-        # Contract Enforcement: Log Warnings
-        if not (0 <= temp_c <= 50): print(f"WARNING: Clamping temp {temp_c} to [0, 50]")
-        if not (0 <= humidity_pct <= 100): print(f"WARNING: Clamping humidity {humidity_pct} to [0, 100]")
-        if not (0 <= wind_kmh <= 100): print(f"WARNING: Clamping wind {wind_kmh} to [0, 100]")
-        if not (0 <= veg_moisture <= 1): print(f"WARNING: Clamping veg {veg_moisture} to [0, 1]")
+    # Input contract: (name, low, high) per feature, in argument order
+    FEATURE_RANGES = (("temp", 0, 50), ("humidity", 0, 100), ("wind", 0, 100), ("veg", 0, 1))
+    RISK_BINS = (30, 50, 80)
+    RISK_LEVELS = (("Low", "#22c55e"), ("Moderate", "#eab308"), ("High", "#f97316"), ("Extreme", "#ef4444"))
 
-        n_temp = np.clip(temp_c / 50.0, 0, 1)
-        n_hum = np.clip(humidity_pct / 100.0, 0, 1)
-        n_wind = np.clip(wind_kmh / 100.0, 0, 1)
-        n_veg = np.clip(veg_moisture, 0, 1)
-        
+    def _columns(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
+        """Broadcast the four inputs to float arrays of one shape; warn once per clamped feature."""
+        cols = np.broadcast_arrays(*(np.asarray(c, dtype=np.float64)
+                                     for c in (temp_c, humidity_pct, wind_kmh, veg_moisture)))
+        for values, (name, low, high) in zip(cols, self.FEATURE_RANGES):
+            out = (values < low) | (values > high)
+            if not out.any():
+                continue
+            if values.size == 1:
+                print(f"WARNING: Clamping {name} {values.item()} to [{low}, {high}]")
+            else:
+                print(f"WARNING: Clamping {name} to [{low}, {high}] in {int(out.sum())} of {values.size} rows")
+        return cols
+
+    def predict_heuristic_batch(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
+        """Heuristic baseline (0-100) for arrays of inputs in one pass."""
+        return self._heuristic(*self._columns(temp_c, humidity_pct, wind_kmh, veg_moisture))
+
+    def _normalized(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
+        """(N, 4) normalised rows for broadcast input columns (risk_kernel.normalize)."""
+        return risk_kernel.normalize(np.column_stack([np.ravel(c) for c in
+                                                      (temp_c, humidity_pct, wind_kmh, veg_moisture)]))
+
+    def _heuristic(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
         # Linear Score = (40 * nT + 20 * nW - 30 * nH - 30 * nV) + 40
-        score = (40 * n_temp) + \
-                (20 * n_wind) - \
-                (30 * n_hum) - \
-                (30 * n_veg) + \
-                40
-                
-        return np.clip(score, 0.0, 100.0)
+        n = self._normalized(temp_c, humidity_pct, wind_kmh, veg_moisture)
+        return risk_kernel.baseline_scores(n).reshape(np.shape(temp_c))
 
-    def predict(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
+    def predict_batch(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
         """
-        Predicts wildfire risk using the trained ML model (if available).
-        Includes non-linear interaction logic.
+        ML risk (0-100) for arrays of inputs: one forest call for all rows.
+        The fallback draws its noise for all rows at once.
         """
+        cols = self._columns(temp_c, humidity_pct, wind_kmh, veg_moisture)
         if not self.is_mock and self.model:
-            input_vector = [[temp_c, humidity_pct, wind_kmh, veg_moisture]]
             try:
                 # Direct model prediction (Regressor 0-100)
-                score = float(self.model.predict(input_vector)[0])
-                return np.clip(score, 0.0, 100.0)
+                X = np.column_stack([c.ravel() for c in cols])
+                scores = np.asarray(self.model.predict(X), dtype=np.float64).reshape(cols[0].shape)
+                return np.clip(scores, 0.0, 100.0)
             except Exception as e:
                 print(f"Prediction error: {e}, falling back to heuristic.")
-        
+
         # Mock/Fallback Logic
         # Used when model.pkl is missing or failed
-        n_temp = np.clip(temp_c / 50.0, 0, 1)
-        n_wind = np.clip(wind_kmh / 100.0, 0, 1)
-        
-        score = self.predict_heuristic(temp_c, humidity_pct, wind_kmh, veg_moisture)
-        
+        n = self._normalized(*cols)
+        score = risk_kernel.baseline_scores(n)
+
         # Simulate ML Non-linear comparison
-        if n_temp > 0.8 and n_wind > 0.7:
-            score += 20
-            
-        noise = np.random.normal(0, 2)
-        score += noise
+        score = (score + risk_kernel.interaction_boost(n)).reshape(cols[0].shape)
+
+        score = score + np.random.normal(0, 2, size=score.shape)
         return np.clip(score, 0.0, 100.0)
 
+    def predict_heuristic(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
+        """
+        Baseline heuristic formula calculation (0-100).
+        This is a linear model used as a comparative baseline.
+        """
+        return self.predict_heuristic_batch(temp_c, humidity_pct, wind_kmh, veg_moisture)[()]
+
+    def predict(self, temp_c, humidity_pct, wind_kmh, veg_moisture):
+        """
+        Predicts wildfire risk using the trained ML model (if available).
+        Includes non-linear interaction logic.
+        """
+        return self.predict_batch(temp_c, humidity_pct, wind_kmh, veg_moisture)[()]
+
+    def get_risk_levels(self, scores):
+        """Vectorized get_risk_level: (levels, colors) lists for an array of scores."""
+        idx = np.searchsorted(self.RISK_BINS, np.asarray(scores, dtype=np.float64), side="right")
+        return ([self.RISK_LEVELS[i][0] for i in idx.ravel().tolist()],
+                [self.RISK_LEVELS[i][1] for i in idx.ravel().tolist()])
+
     def get_risk_level(self, score):
         """Returns categorical risk level based on 0-100 score."""
         if score < 30:
@@ -57,5 +57,19 @@ class TestWildfireSystem(unittest.TestCase):
         self.assertTrue(0 <= risk_b <= 1.0)
         print(f"Regional Variance: RegionA={risk_a:.2f}, RegionB={risk_b:.2f} -> PASS")
 
+    def test_batch_matches_scalar(self):
+        """Verify batched scoring agrees with the per-region calls."""
+        temps = [20, 35, 45, 55]
+        base = self.model.predict_heuristic_batch(temps, 30, 60, 0.3)
+        self.assertEqual(base.tolist(), [self.model.predict_heuristic(t, 30, 60, 0.3) for t in temps])
+
+        ml = self.model.predict_batch(temps, 30, 60, 0.3)
+        self.assertEqual(ml.shape, (4,))
+        self.assertTrue(((ml >= 0) & (ml <= 100)).all())
+
+        scores = [0, 29, 30, 55, 80]
+        levels, _ = self.model.get_risk_levels(scores)
+        self.assertEqual(levels, [self.model.get_risk_level(s)[0] for s in scores])
+
 if __name__ == '__main__':
     unittest.main()